@@ -40,9 +40,9 @@ import csm_dataface, csm_notation
 
 if __name__ == '__main__':
    
-   oDataFace = csm_dataface.DataFace()
+   oDataFace = csm_dataface.get_shared()
    # if sCsmPath was appended above, then replace previous line with:
-   # oDataFace = csm_dataface.DataFace(sCsmPath)
+   # oDataFace = csm_dataface.get_shared(sCsmPath)
    
    sNotation = "CCCCn1cn(C)cc1{!re=+}.{NTf2(1-)}" 
    oNotation = csm_notation.Notation(oDataFace)
@@ -12,6 +12,9 @@
    notation is turned into a work notation.
    The central method is compnt_notation(self, sAlias)
    to get the component notation for an alias.
+   Run python csm_aliases.py to compile all alias dictionaries into
+   the snapshot file aliases.snp, which is then loaded instead of the
+   alias modules, as long as these are unchanged.
 
    Copyright (C) 2010  Axel Drefahl
 
@@ -31,7 +34,47 @@
    along with the CurlySMILES package.
    If not, see <http://www.gnu.org/licenses/>.   
 """
-import sys, os
+import sys, os, marshal
+
+"""
+   sSnapshotFile: name of snapshot file with the alias dictionaries of
+                  all alias modules, in the CurlySMILES directory (see
+   build_snapshot)
+   nSnapshotVersion: format version of the snapshot file
+   bUseSnapshot: if 0, the snapshot file is ignored
+"""
+sSnapshotFile    = 'aliases.snp'
+nSnapshotVersion = 2
+bUseSnapshot     = 1
+
+class AliasGroups:
+   """
+      AliasGroups: read-only dictionary {sAliasGroup: dictGroup}, which
+                   loads the dictionary of an alias group on first
+      access by calling its loader function (without arguments);
+      groups are iterated in the order of lstGroups
+   """
+   def __init__(self,lstGroups,dictLoaders):
+      self.lstGroups   = lstGroups   # group names in look-up order
+      self.dictLoaders = dictLoaders # {sAliasGroup: fnLoad}
+      self.dictGroups  = {}          # {sAliasGroup: dictGroup} loaded
+
+   def __getitem__(self,sGroup):
+      dictGroup = self.dictGroups.get(sGroup)
+      if dictGroup == None:
+         dictGroup = self.dictLoaders[sGroup]()
+         self.dictGroups[sGroup] = dictGroup
+      return dictGroup
+
+   def __contains__(self,sGroup):  return self.dictLoaders.has_key(sGroup)
+   def __iter__(self):             return iter(self.lstGroups)
+   def __len__(self):              return len(self.lstGroups)
+   def has_key(self,sGroup):       return self.dictLoaders.has_key(sGroup)
+   def keys(self):                 return self.lstGroups[:]
+   def numof_loaded(self):         return len(self.dictGroups)
+
+   def items(self):
+      return map(lambda sGroup: (sGroup,self[sGroup]), self.lstGroups)
 
 class AliasNotations:
     
@@ -46,10 +89,21 @@ class AliasNotations:
       self.sCsmpyDir = sCsmpyDir
       self.dictPrimAliases = None
       self.dictSecAliases = None
+
+      # flat alias index, made or unmarshalled on first look-up (see
+      # alias_index)
+      self.dictIndex = None # {sAlias: (sCompntNotation,sGroupId,
+                            #           sPrimAlias),...}
+      self.dictSecShadowed = None # same for sec. aliases that are
+                                  # also prim. aliases
+      self.lstAmbig = None  # ambiguity report (see build_index)
+      self.sIndexData = None # marshalled index from snapshot file
       if assignDict == 1:
          self.initDict()
 
    def initDict(self):
+       if bUseSnapshot and self.load_snapshot():
+          return
        self.dictPrimAliases = self.load_prim_aliases()
        self.dictSecAliases  = self.load_sec_aliases()
 
@@ -67,28 +121,24 @@ class AliasNotations:
                                      cation1p, anion1p, etc., equal to
                                      module name in directory aliases;
                  dictGroup = {sPrimAlias:sSmiles,...}              
+              as AliasGroups object, which imports a module on first
+              access to its group
    """
    def load_prim_aliases(self):
             
       (sDirAliases,lstPyMod) = self.get_module_paths('aliases')
       
-      # get all dictionaries with primary aliases
-      dictPrimAliases = {}
-      code0 = "sys.path.append('%s')" % sDirAliases
-      exec code0
+      # get loaders of all dictionaries with primary aliases
+      dictLoaders = {}
       for sPyMod in lstPyMod:
          lstParts = sPyMod.split(os.sep) 
          sAliasGroup = lstParts[-1][0:-3]
-         code1 = "import %s" % sAliasGroup 
-         exec code1
          sClassName = sAliasGroup[0].upper() + sAliasGroup[1:]
          sClassName = 'Alias' + sClassName
-         code2 = "oDict = %s.%s()" % (sAliasGroup,sClassName)
-         exec code2         
-         dictPrimAliases[sAliasGroup] = oDict.getDict()
-         del oDict        
+         dictLoaders[sAliasGroup] = \
+            self.module_loader(sDirAliases,sAliasGroup,sClassName)
 
-      return dictPrimAliases
+      return AliasGroups(dictLoaders.keys(),dictLoaders)
 
    """------------------------------------------------------------------
       load_sec_aliases:
@@ -101,15 +151,15 @@ class AliasNotations:
                                      cation1p, anion1p, etc., equal to
                                      module name in directory aliases;
                  dictGroup = {sSecAlias:sPrimAlias,...}              
+              as AliasGroups object, which imports a module on first
+              access to its group
    """
    def load_sec_aliases(self):
             
       (sDirAliases,lstPyMod) = self.get_module_paths('secalia')
       
-      # get all dictionaries with secondary aliases
-      dictSecAliases = {}
-      code0 = "sys.path.append('%s')" % sDirAliases
-      exec code0
+      # get loaders of all dictionaries with secondary aliases
+      dictLoaders = {}
       for sPyMod in lstPyMod:
          lstParts = sPyMod.split(os.sep) 
          sAliasGroup = lstParts[-1][0:-3]
@@ -120,16 +170,25 @@ class AliasNotations:
          else:
             continue
          
-         code1 = "import sec_%s" % sAliasGroup 
-         exec code1
          sClassName = sAliasGroup[0].upper() + sAliasGroup[1:]
          sClassName = 'Alias' + sClassName
-         code2 = "oDict = sec_%s.%s()" % (sAliasGroup,sClassName)
-         exec code2         
-         dictSecAliases[sAliasGroup] = oDict.getDict()
-         del oDict        
+         dictLoaders[sAliasGroup] = \
+            self.module_loader(sDirAliases,'sec_'+sAliasGroup,sClassName)
 
-      return dictSecAliases
+      return AliasGroups(dictLoaders.keys(),dictLoaders)
+
+   """------------------------------------------------------------------
+      module_loader: loader function for an AliasGroups object, which
+                     imports module sModule from directory sDir and
+      returns the dictionary of an instance of its class sClassName
+   """
+   def module_loader(self,sDir,sModule,sClassName):
+      def load():
+         if sDir not in sys.path:
+            sys.path.append(sDir)
+         oModule = __import__(sModule)
+         return getattr(oModule,sClassName)().getDict()
+      return load
 
    """------------------------------------------------------------------
       get_module_paths: find and list absolute path for
@@ -157,6 +216,69 @@ class AliasNotations:
             lstPyMod.append(sCompletePath)
 
       return (sDirAliases,lstPyMod)
+
+   #===================================================================#
+   # SNAPSHOT of alias dictionaries                                    #
+   #===================================================================#
+   """------------------------------------------------------------------
+      module_stamps: size and modification time of each alias module
+      return: {sPyMod: (nSize, fMtime),...} with sPyMod = absolute path
+   """
+   def module_stamps(self):
+      dictStamps = {}
+      for sSubdir in ['aliases','secalia']:
+         (sDirAliases,lstPyMod) = self.get_module_paths(sSubdir)
+         for sPyMod in lstPyMod:
+            oStat = os.stat(sPyMod)
+            dictStamps[sPyMod] = (oStat.st_size,oStat.st_mtime)
+      return dictStamps
+
+   """------------------------------------------------------------------
+      load_snapshot: assign self.dictPrimAliases and self.dictSecAliases
+                     from the snapshot file (see build_snapshot) in
+      one read, unless it is missing, of another format or Python
+      version, or stale (alias modules added, removed or modified
+      since it was made); the dictionary of an alias group is
+      unmarshalled on first access, the alias index on first look-up
+      return: 1 if loaded, else 0
+   """
+   def load_snapshot(self):
+      sPath = self.sCsmpyDir + os.sep + sSnapshotFile
+      try:
+         oFile = open(sPath,'rb')
+         sData = oFile.read()
+         oFile.close()
+         tplSnapshot = marshal.loads(sData)
+      except (IOError,EOFError,ValueError,TypeError):
+         return 0
+      if not isinstance(tplSnapshot,tuple) or len(tplSnapshot) != 8 or \
+         tplSnapshot[0] != nSnapshotVersion or \
+         tplSnapshot[1] != sys.version[:3]:
+         return 0
+      (nVersion,sPyVersion,dictStamps,lstPrimGroups,dictPrimData,
+       lstSecGroups,dictSecData,sIndexData) = tplSnapshot
+      if dictStamps != self.module_stamps():
+         return 0
+
+      self.dictPrimAliases = AliasGroups(lstPrimGroups,
+                                         self.data_loaders(dictPrimData))
+      self.dictSecAliases  = AliasGroups(lstSecGroups,
+                                         self.data_loaders(dictSecData))
+      self.sIndexData = sIndexData
+      return 1
+
+   """------------------------------------------------------------------
+      data_loaders: loader functions for an AliasGroups object, which
+                    unmarshal the group dictionaries in dictData
+      return: {sAliasGroup: fnLoad,...}
+   """
+   def data_loaders(self,dictData):
+      dictLoaders = {}
+      for sAliasGroup in dictData.keys():
+         sGroupData = dictData[sAliasGroup]
+         dictLoaders[sAliasGroup] = \
+            lambda sGroupData=sGroupData: marshal.loads(sGroupData)
+      return dictLoaders
   
    #===================================================================#
    # LOOK-UP alias (and group-id)                                      #
@@ -180,17 +302,12 @@ class AliasNotations:
                            anion1p,etc.
    """
    def compnt_notation_and_groupid(self,sAlias):
-      sCompntNotation = None
-      sGroupId = None
-
-      # Primary alias first ...
-      (sCompntNotation,sGroupId) = self.lookup_as_prim_alias(sAlias)
-      # ... if not found ...
-      if sCompntNotation == None: # look up as secondary alias
-         (sPrimAlias,sCompntNotation,sGroupId) = \
-            self.lookup_as_sec_alias(sAlias)                           
 
-      return (sCompntNotation,sGroupId)
+      # Primary alias first, then secondary alias (see build_index)
+      tplEntry = self.alias_index().get(sAlias)
+      if tplEntry == None:
+         return (None,None)
+      return (tplEntry[0],tplEntry[1])
 
    """------------------------------------------------------------------
       lookup_as_prim_alias:
@@ -198,11 +315,10 @@ class AliasNotations:
               (None,None) if not found
    """      
    def lookup_as_prim_alias(self,sPrimAlias):
-      for sGroupId in self.dictPrimAliases:
-         dict = self.dictPrimAliases[sGroupId]
-         if dict.has_key(sPrimAlias):
-            return (dict[sPrimAlias],sGroupId)
-      return (None,None)
+      tplEntry = self.alias_index().get(sPrimAlias)
+      if tplEntry == None or tplEntry[2] != sPrimAlias:
+         return (None,None)
+      return (tplEntry[0],tplEntry[1])
 
    """------------------------------------------------------------------
       lookup_as_prim_alias_by_groupid:
@@ -222,15 +338,127 @@ class AliasNotations:
               or (None,None,None) if not found
    """      
    def lookup_as_sec_alias(self,sSecAlias):
+      tplEntry = self.alias_index().get(sSecAlias)
+      if tplEntry == None or tplEntry[2] == sSecAlias:
+         tplEntry = self.dictSecShadowed.get(sSecAlias)
+      if tplEntry == None:
+         return (None,None,None)
+      return (tplEntry[2],tplEntry[0],tplEntry[1])
+
+   #===================================================================#
+   # INDEX of primary and secondary aliases                            #
+   #===================================================================#
+   """------------------------------------------------------------------
+      alias_index: flat alias index, unmarshalled from the snapshot
+                   file or made by build_index on first call
+      return: self.dictIndex
+   """
+   def alias_index(self):
+      if self.dictIndex == None:
+         if self.sIndexData != None:
+            (self.dictIndex,self.dictSecShadowed,self.lstAmbig) = \
+               marshal.loads(self.sIndexData)
+            self.sIndexData = None
+         else:
+            self.build_index()
+      return self.dictIndex
+
+   """------------------------------------------------------------------
+      build_index: make flat alias index self.dictIndex with one entry
+                   (sCompntNotation,sGroupId,sPrimAlias) per primary
+      and secondary alias, with the entry a look-up by group used to
+      give: a primary alias (sPrimAlias == sAlias) from the first
+      group that has it, otherwise a secondary alias from the first
+      group in which its primary alias is found; secondary aliases
+      which are also primary aliases go to self.dictSecShadowed.
+      The ambiguity report (multiply used or unresolved alias names,
+      see makeAliasDict) goes to self.lstAmbig.
+   """
+   def build_index(self):
+      dictIndex = {}
+      dictSecShadowed = {}
+      lstAmbig = []
+
+      # primary aliases
+      for sGroupId in self.dictPrimAliases:
+         dictPrim = self.dictPrimAliases[sGroupId]
+         for sPrimAlias in dictPrim:
+            if dictIndex.has_key(sPrimAlias):
+               sLine = '"%s" with two group ids: "%s" and "%s"' % \
+                 (sPrimAlias,sGroupId,dictIndex[sPrimAlias][1])
+               sLine += ' (both for primary alias)'
+               lstAmbig.append(sLine)
+            else:
+               dictIndex[sPrimAlias] = \
+                  (dictPrim[sPrimAlias],sGroupId,sPrimAlias)
+
+      # secondary aliases
+      dictSecGroupId = {} # dict with first consistent group id
       for sGroupId in self.dictSecAliases:
-         dict = self.dictSecAliases[sGroupId]
-         if dict.has_key(sSecAlias):
-            sPrimAlias = dict[sSecAlias]
-            sCompntNotation = \
-               self.lookup_as_prim_alias_by_groupid(sPrimAlias,sGroupId)
+         dictSec = self.dictSecAliases[sGroupId]
+         dictPrim = {}
+         if self.dictPrimAliases.has_key(sGroupId):
+            dictPrim = self.dictPrimAliases[sGroupId]
+         for sSecAlias in dictSec:
+            sPrimAlias = dictSec[sSecAlias]
+
+            # index entry, with primary alias of same group
+            sCompntNotation = dictPrim.get(sPrimAlias)
+            tplEntry = dictIndex.get(sSecAlias)
             if sCompntNotation != None:
-               return (sPrimAlias,sCompntNotation,sGroupId)
-      return (None,None,None)
+               if tplEntry == None:
+                  dictIndex[sSecAlias] = \
+                     (sCompntNotation,sGroupId,sPrimAlias)
+               elif tplEntry[2] == sSecAlias and \
+                    not dictSecShadowed.has_key(sSecAlias):
+                  dictSecShadowed[sSecAlias] = \
+                     (sCompntNotation,sGroupId,sPrimAlias)
+
+            # ambiguity report
+            tplPrim = dictIndex.get(sPrimAlias)
+            if tplEntry != None and tplEntry[2] == sSecAlias:
+               sLine  = 'sec. alias "%s" ' % sSecAlias
+               sLine += 'with group id "%s" conflicts ' % sGroupId
+               sLine += 'with same-name prim. alias of group "%s"' % \
+                        tplEntry[1]
+               lstAmbig.append(sLine)
+            elif tplPrim == None or tplPrim[2] != sPrimAlias:
+               sLine  = 'sec. alias "%s" ' % sSecAlias
+               sLine += 'with group id "%s" ' % sGroupId
+               sLine += 'has no corresponding prim. alias '
+               sLine += 'named "%s"' % sPrimAlias
+               lstAmbig.append(sLine)
+            elif cmp(sGroupId,tplPrim[1]) != 0:
+               sLine  = 'group id mismatch for sec. alias '
+               sLine += '"%s" in group "%s": ' % (sSecAlias,sGroupId)
+               sLine += 'corresp. prim. alias "%s" ' % sPrimAlias
+               sLine += 'is in group "%s"' % tplPrim[1]
+               lstAmbig.append(sLine)
+            elif dictSecGroupId.has_key(sSecAlias):
+               sLine = '"%s" with two group ids: "%s" and "%s"' % \
+                 (sSecAlias,sGroupId,dictSecGroupId[sSecAlias])
+               sLine += ' (both for secondary alias)'
+               lstAmbig.append(sLine)
+            else:
+               dictSecGroupId[sSecAlias] = sGroupId
+
+      self.dictIndex = dictIndex
+      self.dictSecShadowed = dictSecShadowed
+      self.lstAmbig = lstAmbig
+
+   """------------------------------------------------------------------
+      ambiguity_report: list of lines, each reporting an ambiguity
+                        (see build_index), empty if none
+   """
+   def ambiguity_report(self):
+      self.alias_index()
+      return self.lstAmbig
+
+   """------------------------------------------------------------------
+      numof_aliases: number of primary and secondary aliases in index
+   """
+   def numof_aliases(self):
+      return len(self.alias_index())
 
    #===================================================================#
    # MAKE alias dictionary containing primary and secondary aliases    #
@@ -253,71 +481,60 @@ class AliasNotations:
                               sAlias = primary or secondary alias
                               sPrimAlias = primary alias corresponding
                                            to sAlias
-       Note: client aliases are not considered here         
+       Note: client aliases are not considered here; with
+             ambiguities, dictAliases may differ in secondary
+             aliases used in several groups
    """
    def makeAliasDict(self):
-      lstAmbig = []
+      dictIndex = self.alias_index()
       dictAliases = {}
+      for (sAlias,tplEntry) in dictIndex.items():
+         (sCompntNotation,sGroupId,sPrimAlias) = tplEntry
+         if sPrimAlias == sAlias:
+            dictAliases[sAlias] = sAlias
+         elif cmp(dictIndex[sPrimAlias][1],sGroupId) == 0:
+            dictAliases[sAlias] = sPrimAlias
+      return (self.lstAmbig,dictAliases)
 
-      # primary aliases
-      dictPrimGroupId = {} # dict with first encountered group id
-      for sPrimGroupId in self.dictPrimAliases:
-         dictPrim = self.dictPrimAliases[sPrimGroupId]
-         for sPrimAlias in dictPrim:
-            if dictAliases.has_key(sPrimAlias):
-               sLine = '"%s" with two group ids: "%s" and "%s"' % \
-                 (sPrimAlias,sPrimGroupId, dictPrimGroupId[sPrimAlias])
-               sLine += ' (both for primary alias)'
-               lstAmbig.append(sLine)
-            else:
-               dictPrimGroupId[sPrimAlias] = sPrimGroupId 
-               dictAliases[sPrimAlias] = sPrimAlias
+"""
+   build_snapshot: compile the alias dictionaries of all modules in
+                   the directories aliases and secalia of CurlySMILES
+   directory sCsmpyDir (current working directory if None) into the
+   snapshot file sSnapshotFile (to be run again after alias modules
+   have been changed, otherwise they are loaded from the modules)
+   return: path of snapshot file
+"""
+def build_snapshot(sCsmpyDir=None):
+   if sCsmpyDir == None:
+      sCsmpyDir = os.getcwd()
+   oAliases = AliasNotations(sCsmpyDir,0)
+   dictStamps = oAliases.module_stamps()
+   oAliases.dictPrimAliases = oAliases.load_prim_aliases()
+   oAliases.dictSecAliases  = oAliases.load_sec_aliases()
+   lstSnapshot = [nSnapshotVersion,sys.version[:3],dictStamps]
+   for dictAliases in [oAliases.dictPrimAliases,oAliases.dictSecAliases]:
+      dictData = {}
+      for (sAliasGroup,dictGroup) in dictAliases.items():
+         dictData[sAliasGroup] = marshal.dumps(dictGroup)
+      lstSnapshot += [dictAliases.keys(),dictData]
+   oAliases.build_index()
+   lstSnapshot.append(marshal.dumps((oAliases.dictIndex,
+                                     oAliases.dictSecShadowed,
+                                     oAliases.lstAmbig)))
 
-      # secondary aliases   
-      dictSecGroupId = {} # dict with first encountered group id
-      for sSecGroupId in self.dictSecAliases:
-         dictSec = self.dictSecAliases[sSecGroupId]
-         for sSecAlias in dictSec:
-            sPrimAliasCorresp = dictSec[sSecAlias]
+   # write to temporary file first, so that readers never see a
+   # partly written snapshot
+   sPath = sCsmpyDir + os.sep + sSnapshotFile
+   sTempPath = sPath + '.tmp'
+   oFile = open(sTempPath,'wb')
+   oFile.write(marshal.dumps(tuple(lstSnapshot)))
+   oFile.close()
+   try:
+      os.rename(sTempPath,sPath)
+   except OSError: # target exists (Windows)
+      os.remove(sPath)
+      os.rename(sTempPath,sPath)
+   return sPath
 
-            # first, check if sec. alias was already used as prim. alias       
-            if dictAliases.has_key(sSecAlias):
-               sLine  = 'sec. alias "%s" ' % sSecAlias
-               sLine += 'with group id "%s" conflicts ' % sSecGroupId
-               sLine += 'with same-name prim. alias of group "%s"' % \
-                     dictPrimGroupId[sSecAlias]  
-               lstAmbig.append(sLine)
-               continue
-            # also make sure the corresp. prim. alias exists
-            elif not dictAliases.has_key(sPrimAliasCorresp):
-               sLine  = 'sec. alias "%s" ' % sSecAlias
-               sLine += 'with group id "%s" ' % sSecGroupId               
-               sLine += 'has no corresponding prim. alias '
-               sLine += 'named "%s"' % sPrimAliasCorresp
-               lstAmbig.append(sLine)
-               continue
-            else:
-               # also make sure prim. and sec. share same group id 
-               (sSmiles,sGroupIdCorresp) = \
-                  self.lookupAsPrimAlias(sPrimAliasCorresp)
-               if cmp(sSecGroupId,sGroupIdCorresp) != 0:
-                  sLine  = 'group id mismatch for sec. alias '
-                  sLine += '"%s" in group "%s": ' % \
-                           (sSecAlias,sSecGroupId)  
-                  sLine += 'corresp. prim. alias "%s" ' % \
-                           sPrimAliasCorresp
-                  sLine += 'is in group "%s"' % sGroupIdCorresp
-                  lstAmbig.append(sLine)
-                  continue
-
-            # check if sec. alias is used twice   
-            if dictSecGroupId.has_key(sSecAlias):
-               sLine = '"%s" with two group ids: "%s" and "%s"' % \
-                 (sSecAlias,sSecGroupId, dictSecGroupId[sPrimAlias])
-               sLine += ' (both for secondary alias)'
-               lstAmbig.append(sLine)
-            else:
-               dictSecGroupId[sSecAlias] = sSecGroupId 
-               dictAliases[sSecAlias] = sPrimAliasCorresp
-            
-      return (lstAmbig,dictAliases)
+if __name__ == '__main__':
+   print 'alias snapshot written: %s' % build_snapshot()
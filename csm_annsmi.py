@@ -29,22 +29,88 @@
    along with the CurlySMILES package.
    If not, see <http://www.gnu.org/licenses/>.
 """
-import csm_dataface, csm_curlyann, csm_molform
+import csm_dataface, csm_curlyann, csm_molform, csm_pool
+import array, math, re
+
+# NumPy is optional: needed only for the 'numpy' matrix backend
+try:
+   import numpy
+except ImportError:
+   numpy = None
+
+"""
+   bond codes used in CSR graph: index of bond symbol in sBondSymbols
+   (single, double, triple, quadruple, aromatic, unspecified bond)
+"""
+sBondSymbols  = '-=#$:~'
+dictBondCodes = {'-': 0, '=': 1, '#': 2, '$': 3, ':': 4, '~': 5}
+
+"""
+   valence-count values per bond code, doubled to avoid floating point
+   numbers for aromatic bonds; None for unspecified bond
+"""
+lstBondValence2 = [2, 4, 6, 8, 3, None]
+
+"""
+   matrix backend for new AnnotatedSmiles objects (see
+   set_matrix_backend): 'array' or 'numpy'
+"""
+sMatrixBackend = 'array'
+
+"""
+   token patterns for AnnotatedSmiles.iter_tokens, one group per kind:
+   (1) aromatic atomic symbol, (2) upper-case atomic symbol, possibly
+   followed by lower-case letter, (3) ring closure(s), (4) (, (5) ),
+   (6) bond symbol, (7) * or ~, (8) curly annotation without nested
+   braces, (9) any other {, (10) square bracket notation, (11) [ not
+   closed, (12) any other lower-case letter, (13) any other character
+   (skipped)
+"""
+reSmilesToken = re.compile(r"""([bcnos])|([A-Z][a-z]?)|([%0-9]+)|(\()|(\))
+                               |([=#$])|([*~])|(\{[^{}]*\})|(\{)
+                               |(\[[^\]]*\])|(\[)|([a-z])|(.)""",
+                           re.S | re.X)
+reCurlyBrace = re.compile(r'[{}]')
+
+"""
+   value ranges of the typed AtomTable columns: charge and H-count
+   are stored as 2-byte ('h'), isotope labels as 4-byte ('i') integers;
+   nUnassigned marks isotope labels and H-counts not (yet) assigned
+   (H-counts derived by the valence rule may be negative)
+"""
+nMaxAtomCount = 32767
+nMaxAtomLabel = 2147483647
+nUnassigned   = -32768
 
 class AnnotatedSmiles:
     
-   def __init__(self,oDataFace=None,sAnnSmi=None):
+   def __init__(self,oDataFace=None,sAnnSmi=None,bLazy=0):
 
       self.oDataFace = oDataFace
 
       # CurlySMILES notation (component of a work notation)
       self.sAnnSmi   = sAnnSmi 
 
-      # variables assigned during preparsing
+      # matrix backend: 'array' (TriangularMatrix objects) or 'numpy'
+      # (dmat() and adj_matrix() return dense ndarrays)
+      self.sBackend = sMatrixBackend
+
+      # lazy mode: if 1, topological matrices and rings are not made
+      # by parse(), but on first access (see ensure_adj_mat,
+      # ensure_dist_mat and ensure_rings)
+      self.bLazy = bLazy
+
+      # path counts: if 1, make_dist_mat also makes lstPathCountMat in
+      # the same breadth-first searches (see set_path_counts)
+      self.bPathCounts = 0
+
+      # variables assigned during preparsing (or on request, see
+      # ensure_tokens; parse() takes tokens from iter_tokens directly)
       self.lstTokens = None
       self.lstTokTyp = None
       self.lstDepth  = None
       self.maxDepth  = None
+      self.bTokenErrDone = 0 # 1 if tokenizer errors are in lstErrors
 
       # variables assigned during parsing
       #   (1) counts
@@ -60,28 +126,35 @@ class AnnotatedSmiles:
 
       #   (2) attributes of nodes in molecular graph
       #       (node = atom with atomic symbol occurring in notation; notice that
-      #               hydrogen atoms can be suppressed)
-      self.lstAtSymb    = None # list of str with atomic symbols
-      self.lstAtNumb    = None # list of int with atomic number
-      self.lstAtLabel   = None # list of int with isotope label
-      self.lstAtCharge  = None # list of int with charge value
-      self.lstAtDepth   = None # list of int with nesting depth    
-      self.lstAromat    = None # list of boolean (1=aromatic-ring atom, 0 otherwise)
-      self.lstAaaEntr   = None # list of list with CurlyAnnotation objects
-                               # for atom-anchored annotations (AAA)
-                               # (empty list for non-annotated atoms)
-      self.lstHcount    = None # list of int with number of adjacent non-node H-atoms
-      self.lstNbors     = None # list of int with number of neighbor nodes      
-      self.lstNvbors    = None # list of int with number of valence bonds to
-                               # neighbor nodes    
-      self.lstRingMap   = None # list of indices indicating rings of an atom
-                               # is a member 
+      #               hydrogen atoms can be suppressed), one row per node
+      #       in an AtomTable with columns for atomic symbol, atomic
+      #       number, isotope label, charge, nesting depth, aromatic flag,
+      #       number of adjacent non-node H-atoms, number of neighbor
+      #       nodes, number of valence bonds to neighbor nodes, atom-
+      #       anchored annotations (AAA) and indices of rings the atom
+      #       is a member of
+      self.oAtomTable   = None
       self.lstCaaEntr   = None # list of list with CurlyAnnotation objects
                                # for component-anchored annotations (CAA)
       self.lstAtf0      = None # atom fragments (level 0: central atom plus
                                # adjacent non-node H-atoms plus dangling bonds)
 
-      #   (3) connectivity
+      #   (3) connectivity, as graph in compressed sparse row (CSR)
+      #       format (see make_graph_csr and graph()):
+      self.arrOffset   = None # neighbors of node idxAt are found at
+                              #    arrNbor[arrOffset[idxAt]:
+                              #            arrOffset[idxAt+1]]
+      self.arrNbor     = None # indexes of neighbor nodes
+      self.arrBond     = None # bond codes parallel to arrNbor:
+                              #    index of bond symbol in sBondSymbols
+      self.arrDegree   = None # number of neighbor nodes per node
+      self.arrEdge     = None # bonds as atom index pairs, in the order
+      self.arrEdgeBond = None #    entered, with bond codes (input for
+                              #    make_graph_csr; dropped after that)
+
+      #   (3a) connectivity as dictionaries, made from CSR graph on
+      #        first access with get_dictNbors, get_dictBonds and
+      #        get_dictPairs:
       self.dictNbors   = None # dictionary with neigbors:
                               #    {idxAt:[i0,i1,...],...}
                               #    idxAt   = index of atom;
@@ -105,6 +178,18 @@ class AnnotatedSmiles:
       self.lstIdxMat  = None
       self.lstAdjMat  = None
       self.lstDistMat = None
+      self.lstPathCountMat = None # number of shortest paths per pair
+
+      #   (5') dense topological matrices (numpy backend only)
+      self.matAdj  = None
+      self.matDist = None
+
+      #   (5a) status of (lazily made) topology data
+      self.bTopoReady   = 0    # 1 if molecular graph is complete
+      self.bAdjMat      = 0    # 1 if lstIdxMat and lstAdjMat are made
+      self.bDistMat     = 0    # 1 if lstDistMat is made
+      self.bPathCountMat = 0   # 1 if lstPathCountMat is made
+      self.bRings       = 0    # 1 if ring data are made
 
       #   (6) molecular formula
       self.oMf  = None
@@ -127,23 +212,27 @@ class AnnotatedSmiles:
       self.nLocal = 0      
       self.nDeloc = 0
 
-      self.lstAtSymb    = []
-      self.lstAtNumb    = []
-      self.lstAtLabel   = []
-      self.lstAtCharge  = []
-      self.lstAtDepth   = []     
-      self.lstAromat    = []
-      self.lstAaaEntr   = []      
+      # (at most one node per two characters in most notations; the
+      #  table grows if needed and is trimmed by make_graph; an empty
+      #  table left by reset is reused)
+      nCapacity = 16
+      if self.sAnnSmi != None:
+         nCapacity = max(nCapacity,len(self.sAnnSmi)/2)
+      if self.oAtomTable == None or len(self.oAtomTable) > 0:
+         self.oAtomTable = AtomTable(nCapacity)
       self.lstCaaEntr   = []
       self.lstAtf0      = []
-      self.lstHcount    = []
-      self.lstNbors     = []      
-      self.lstNvbors    = []     
-      self.lstRingMap   = []
 
-      self.dictNbors = {}
-      self.dictBonds = {}
-      self.dictPairs = {}
+      self.arrOffset   = array.array('i',[0])
+      self.arrNbor     = array.array('i')
+      self.arrBond     = array.array('b')
+      self.arrDegree   = array.array('i')
+      self.arrEdge     = array.array('i')
+      self.arrEdgeBond = array.array('b')
+
+      self.dictNbors = None
+      self.dictBonds = None
+      self.dictPairs = None
 
       self.lstRingLength = []
       self.lstRingAromat = []
@@ -153,24 +242,79 @@ class AnnotatedSmiles:
       self.lstIdxMat  = []
       self.lstAdjMat  = []
       self.lstDistMat = []
+      self.lstPathCountMat = []
+
+      self.matAdj  = None
+      self.matDist = None
+
+      self.bTopoReady   = 0
+      self.bAdjMat      = 0
+      self.bDistMat     = 0
+      self.bPathCountMat = 0
+      self.bRings       = 0
 
    #===================================================================#
    # RESET                                                             #
    #===================================================================#
    """------------------------------------------------------------------     
       reset: set new CurlySMILES notation and set parameters to
-             initial (unassigned) values
+             initial (unassigned) values, as done by the constructor
              (a following call of parse() should assigns parameters for
-              this new notation)
+              this new notation);
+      the atom table and error list are emptied and reused, the
+      CurlyAnnotation and MolecularFormula objects go back to their
+      pools (see csm_pool), so that nothing handed out before may be
+      used any longer
    """    
-   def reset(sAnnSmi):
-      self.sAnnSmi  = sAnnSmi
+   def reset(self,oDataFace=None,sAnnSmi=None,bLazy=0):
+      if self.oAtomTable != None:
+         for lstAaa in self.oAtomTable.lstAaaEntr:
+            for oCurly in lstAaa:
+               csm_pool.oCurlyPool.release(oCurly)
+         self.oAtomTable.clear()
+      if self.lstCaaEntr != None:
+         for oCurly in self.lstCaaEntr:
+            csm_pool.oCurlyPool.release(oCurly)
+      if self.oMf != None:
+         csm_pool.oMfPool.release(self.oMf)
+
+      self.oDataFace = oDataFace
+      self.sAnnSmi   = sAnnSmi
+      self.sBackend  = sMatrixBackend
+      self.bLazy     = bLazy
+      self.bPathCounts = 0
       self.lstTokens = None
       self.lstTokTyp = None
       self.lstDepth  = None
       self.maxDepth  = None       
-      self.init_struct_param()
-      self.lstErrors = []
+      self.bTokenErrDone = 0
+
+      self.nNodes = self.nAtoms = self.nHterm = self.nAhold = None
+      self.nRings = self.nLocal = self.nDeloc = None
+      self.lstCaaEntr = self.lstAtf0 = None
+      self.arrOffset = self.arrNbor = self.arrBond = self.arrDegree = None
+      self.arrEdge = self.arrEdgeBond = None
+      self.dictNbors = self.dictBonds = self.dictPairs = None
+      self.lstRingLength = self.lstRingAromat = None
+      self.lstRingCharge = self.lstRings = None
+      self.lstIdxMat = self.lstAdjMat = None
+      self.lstDistMat = self.lstPathCountMat = None
+      self.matAdj = self.matDist = None
+      self.bTopoReady = self.bAdjMat = self.bDistMat = 0
+      self.bPathCountMat = self.bRings = 0
+      self.oMf = None
+      del self.lstErrors[:]
+
+   #===================================================================#
+   # SET options                                                       #
+   #===================================================================#
+   """------------------------------------------------------------------
+      set_path_counts: if bPathCounts is 1, count the shortest paths
+                       between all node pairs while making the
+      distance matrix (see make_dist_mat); access with pcmat()
+   """
+   def set_path_counts(self,bPathCounts):
+      self.bPathCounts = bPathCounts
 
    #===================================================================#
    # PREPARSE                                                          #
@@ -192,148 +336,171 @@ class AnnotatedSmiles:
           self.lstDepth  = [ 0,  0,  0,  1,  1,   1,  0,  0,  0,  0 ]
           self.maxDepth  = 1 
 
+       argument: lstErrors, list to report errors to (self.lstErrors
+                 if None)
        return: 1 if successful, 0 otherwise with message in lstErrors
    """
-   def preparse(self):
+   def preparse(self,lstErrors=None):
+
+      if lstErrors == None:
+         lstErrors = self.lstErrors
+      nErrors = len(lstErrors)
 
       self.lstTokens = []
       self.lstTokTyp = []
       self.lstDepth  = []
-      self.maxDepth  = 0
-
-      cTokTyp = '?'
-      nDepth  = 0     # nesting depth
-      nCurlyDepth = 0 # curly depth
-      bInsideSqb  = 0 # inside square brackets
-      sToken  = ''
-      iChar = 0
-      bSkip = 0
-      for cChar in self.sAnnSmi:
-         iChar += 1
-
-         if bSkip != 0:
-            bSkip = 0
-            continue
-         
-         cLookAhead = '0'         
-         if iChar < len(self.sAnnSmi):
-            cLookAhead = self.sAnnSmi[iChar]
-         
-         if cTokTyp != '?':
-            if (cTokTyp == 'c' and cChar == '}' and nCurlyDepth == 1)\
-               or (cTokTyp == 'q' and cChar == ']'):
-               self.lstTokens.append(sToken)
-               self.lstTokTyp.append(cTokTyp)
-               self.lstDepth.append(nDepth)      
-               cTokTyp = '?'
-               sToken  = ''
-               nCurlyDepth = 0
-               if cChar == ']':
-                  bInsideSqb = 0
-               continue # with next cChar
-            elif cTokTyp == 'r':
-               if cChar == '%' or cChar.isdigit():               
-                  sToken += cChar
-                  continue # with next cChar
-               else:                    # done with ring closure(s)
-                  self.lstTokens.append(sToken)
-                  self.lstTokTyp.append(cTokTyp)
-                  self.lstDepth.append(nDepth)      
-                  cTokTyp = '?'
-                  sToken  = ''
-                  # continue with current cChar
-            else:
-               sToken += cChar
-               if cChar == '{':
-                  nCurlyDepth += 1
-               elif cChar == '}':
-                  nCurlyDepth -= 1                 
-               continue # with next cChar
-
-         if cChar == '{':
-            cTokTyp = 'c'
-            nCurlyDepth += 1
-         elif cChar == '[':
-            cTokTyp = 'q'
-            bInsideSqb = 1
-         elif cChar == '%' or cChar.isdigit():
-            cTokTyp = 'r'
-            sToken = cChar
-         elif cChar == '(':
-            nDepth += 1
-            if nDepth > self.maxDepth:
-               self.maxDepth = nDepth
-            self.lstTokens.append(cChar)
-            self.lstTokTyp.append(cChar)
-            self.lstDepth.append(nDepth)
-         elif cChar == ')':           
-            self.lstTokens.append(cChar)
-            self.lstTokTyp.append(cChar)
-            self.lstDepth.append(nDepth)
-            nDepth -= 1           
-         elif cChar == '=' or cChar == '#' or cChar == '$':
-            self.lstTokens.append(cChar)
-            self.lstTokTyp.append('b')
-            self.lstDepth.append(nDepth)            
-         elif cChar == '*' or  cChar == '~':
-            self.lstTokens.append(cChar)
-            self.lstTokTyp.append(cChar)
-            self.lstDepth.append(nDepth)                      
-         elif cChar.isalpha():
-            
-            # check one-letter lower-case symbol (aromatic symbol)
-            if cChar in ['b','c','n','o','s']:
-               self.lstTokens.append(cChar) # one-letter, aromatic
-               self.lstTokTyp.append('a')
-               self.lstDepth.append(nDepth)
-               continue
-            elif not cChar.isupper():
-               sMsg  = 'csm_subnotation.preparse: unxepected' 
-               sMsg += ' lower-case letter near idx="%d"' % iChar
-               self.lstErrors.append(sMsg)                           
-               return 0
+      for (sToken,sTokTyp,nDepth) in self.iter_tokens(lstErrors):
+         self.lstTokens.append(sToken)
+         self.lstTokTyp.append(sTokTyp)
+         self.lstDepth.append(nDepth)
+      self.bTokenErrDone = 1
+
+      if len(lstErrors) > nErrors:
+         return 0
+      return 1
 
-            # check upper-case symbol   
-            if cLookAhead.isalpha() and cLookAhead.islower():
-               sSymb2l = cChar + cLookAhead  # two-letter symbol ?
-               if self.oDataFace.is_valid_symbol(sSymb2l) and \
-                      self.is_2ch_atsymb(bInsideSqb,sSymb2l):
-                  self.lstTokens.append(sSymb2l)
-                  bSkip = 1 # skip next cChar in loop
+   """------------------------------------------------------------------     
+       ensure_tokens: make self.lstTokens, self.lstTokTyp and
+                      self.lstDepth unless already made (errors are
+                      not reported twice)
+   """
+   def ensure_tokens(self):
+      if self.lstTokens != None:
+         return
+      if self.bTokenErrDone:
+         self.preparse([])
+      else:
+         self.preparse()
+
+   """------------------------------------------------------------------     
+       iter_tokens: tokenize self.sAnnSmi, generating one triple
+                    (sToken,sTokTyp,nDepth) per token (see preparse),
+       by dispatching on the groups of the matches of reSmilesToken;
+       annotations in curly braces and square bracket notations are
+       cut out as a whole (nested curly braces are matched by
+       counting, and scanning resumes after the closing brace);
+       characters of other kinds outside of curly braces and square
+       brackets (such as -, /, @ and .) are skipped. The generator
+       stops at the first error, reported to lstErrors
+       (self.lstErrors if None).
+       assign: self.maxDepth
+   """
+   def iter_tokens(self,lstErrors=None):
+
+      if lstErrors == None:
+         lstErrors = self.lstErrors
+      sAnnSmi = self.sAnnSmi
+      dictSymbols = {} # {upper-case match: symbol token or None}
+      nDepth = 0
+      self.maxDepth = 0
+      iPos = 0         # scan (again) from here, after nested {...}
+      while iPos >= 0:
+         iStart = iPos
+         iPos = -1
+         for oMatch in reSmilesToken.finditer(sAnnSmi,iStart):
+            iGroup = oMatch.lastindex
+            sToken = oMatch.group(iGroup)
+
+            if iGroup == 1:                     # aromatic symbol
+               yield (sToken,'a',nDepth)
+            elif iGroup == 2:                   # atomic symbol
+               if dictSymbols.has_key(sToken):
+                  sSymbol = dictSymbols[sToken]
                else:
-                  self.lstTokens.append(cChar)
-               self.lstTokTyp.append('n')
-               self.lstDepth.append(nDepth)               
-            elif self.oDataFace.is_valid_symbol(cChar): 
-               self.lstTokens.append(cChar)
-               self.lstTokTyp.append('n')
-               self.lstDepth.append(nDepth)                       
-            else:
-               sMsg  = "preparse: invalid atomic " 
-               sMsg += "symbol near iChar=%d" % iChar
-               self.lstErrors.append(sMsg)               
-               return 0
+                  sSymbol = self.symbol_token(sToken)
+                  dictSymbols[sToken] = sSymbol
+               if sSymbol == None:
+                  sMsg  = "preparse: invalid atomic " 
+                  sMsg += "symbol near iChar=%d" % (oMatch.start()+1)
+                  lstErrors.append(sMsg)               
+                  return
+               yield (sSymbol,'n',nDepth)
+               if sSymbol != sToken:           # second letter on its own
+                  if sToken[1] in 'bcnos':
+                     yield (sToken[1],'a',nDepth)
+                  else:
+                     sMsg  = 'csm_subnotation.preparse: unxepected' 
+                     sMsg += ' lower-case letter near idx="%d"' % \
+                             (oMatch.start()+2)
+                     lstErrors.append(sMsg)                           
+                     return
+            elif iGroup == 3:                   # ring closure(s)
+               yield (sToken,'r',nDepth)
+            elif iGroup == 4:                   # (
+               nDepth += 1
+               if nDepth > self.maxDepth:
+                  self.maxDepth = nDepth
+               yield (sToken,sToken,nDepth)
+            elif iGroup == 5:                   # )
+               yield (sToken,sToken,nDepth)
+               nDepth -= 1
+            elif iGroup == 6:                   # bond symbol
+               yield (sToken,'b',nDepth)
+            elif iGroup == 7:                   # * or ~
+               yield (sToken,sToken,nDepth)
+            elif iGroup == 8:                   # {...}
+               yield (sToken[1:-1],'c',nDepth)
+            elif iGroup == 9:                   # { with nested {...}
+               iStart = oMatch.start()
+               iEnd = self.find_curly_end(iStart)
+               if iEnd < 0:
+                  sMsg  = "preparse: cTokTyp='c'"
+                  sMsg += " instead of '?' (unbalanced brackets?)"
+                  lstErrors.append(sMsg)
+                  return
+               yield (sAnnSmi[iStart+1:iEnd],'c',nDepth)
+               iPos = iEnd + 1
+               break
+            elif iGroup == 10:                  # [...]
+               yield (sToken[1:-1],'q',nDepth)
+            elif iGroup == 11:                  # [ not closed
+               sMsg  = "preparse: cTokTyp='q'"
+               sMsg += " instead of '?' (unbalanced brackets?)"
+               lstErrors.append(sMsg)
+               return
+            elif iGroup == 12:                  # other lower-case letter
+               sMsg  = 'csm_subnotation.preparse: unxepected' 
+               sMsg += ' lower-case letter near idx="%d"' % \
+                       (oMatch.start()+1)
+               lstErrors.append(sMsg)                           
+               return
 
-      # check if undone ring closure
-      if cTokTyp == 'r':              
-         self.lstTokens.append(sToken)
-         self.lstTokTyp.append(cTokTyp)
-         self.lstDepth.append(nDepth)      
-         cTokTyp = '?'
-
-      # final check on success, that is, consistency
-      if cTokTyp != '?':
-         sMsg  = "preparse: cTokTyp='%s'" % cTokTyp
-         sMsg += " instead of '?' (unbalanced brackets?)"
-         self.lstErrors.append(sMsg)
-         return 0      
-      elif nDepth != 0:
-         sMsg  = "preparse: nDepth='%s'" % cTokTyp
+      if nDepth != 0:
+         sMsg  = "preparse: nDepth='?'"
          sMsg += " instead of '0' (unbalanced parenthesis?)"
-         self.lstErrors.append(sMsg)
-         return 0
-      else: 
-         return 1        
+         lstErrors.append(sMsg)
+
+   """
+       symbol_token: symbol token for the (up to two) letters sLetters
+                     that start with an upper-case letter
+       return: two-letter symbol if valid and allowed outside of
+               square brackets, first letter if followed by another
+       letter or a valid one-letter symbol, None otherwise
+   """
+   def symbol_token(self,sLetters):
+      if len(sLetters) == 2:
+         if self.oDataFace.is_valid_symbol(sLetters) and \
+            self.is_2ch_atsymb(0,sLetters):
+            return sLetters
+         return sLetters[0]
+      elif self.oDataFace.is_valid_symbol(sLetters):
+         return sLetters
+      return None
+
+   """
+       find_curly_end: index of the '}' matching the '{' at iStart in
+                       self.sAnnSmi, -1 if there is none
+   """
+   def find_curly_end(self,iStart):
+      nCurlyDepth = 0
+      for oBrace in reCurlyBrace.finditer(self.sAnnSmi,iStart):
+         if oBrace.group() == '{':
+            nCurlyDepth += 1
+         else:
+            nCurlyDepth -= 1
+            if nCurlyDepth == 0:
+               return oBrace.start()
+      return -1
 
    """
        is_2ch_atsymb: check if a 2-char atomic symbol, which is not
@@ -363,26 +530,106 @@ class AnnotatedSmiles:
    """
    def parse(self):
 
+      # molecular graph with node atoms, bonds and annotations
+      if not self.make_graph():
+         return self.lstErrors
+
+      # apply valence rule and derive count of non-node H-atoms
+      self.count_tonode_valence_bonds()
+      self.count_non_node_hatoms()
+      self.nAtoms += self.nHterm
+
+      # molecular graph complete: topology can be derived from here on
+      self.bTopoReady = 1
+
+      # make adjacency matrix, distance matrix and rings now, unless
+      # postponed until first access (lazy mode)
+      if not self.bLazy:
+         self.ensure_dist_mat()
+         self.ensure_rings()
+
+      # sum charges
+      self.sum_local_charges()      
+      self.sum_deloc_charges()
+
+      # make molecular formula
+      self.make_mf()
+
+      # make atom fragments
+      self.make_atf0()
+
+      return self.lstErrors
+
+   """------------------------------------------------------------------     
+      parse_formula: parse only as far as needed for the molecular
+                     formula: node atoms with labels and charges,
+      CSR graph (for the valence rule), annotations and implicit
+      H-atoms; topological matrices, rings and atom fragments are not
+      made (their access methods return empty lists)
+      return: self.lstErrors
+   """
+   def parse_formula(self):
+
+      if not self.make_graph():
+         return self.lstErrors
+
+      self.count_tonode_valence_bonds()
+      self.count_non_node_hatoms()
+      self.nAtoms += self.nHterm
+
+      self.sum_local_charges()      
+      self.sum_deloc_charges()
+      self.make_mf()
+
+      return self.lstErrors
+
+   """------------------------------------------------------------------     
+      make_graph: evaluate tokens (from self.lstTokens if preparsed,
+                  otherwise straight from iter_tokens), assign
+      node-atom lists and annotations, and make CSR graph from bonds
+      entered with connect_new_atom; tokenizer errors are listed ahead
+      of any error found in evaluating the tokens
+      return: 1 if successful, 0 otherwise with message in lstErrors
+   """
+   def make_graph(self):
+
+      lstTokErrors = []
       if self.lstTokens == None:
-         self.preparse()
+         iterTokens = self.iter_tokens(lstTokErrors)
+      else:
+         iterTokens = iter(zip(self.lstTokens,self.lstTokTyp,self.lstDepth))
+      nErrors = len(self.lstErrors)
       self.init_struct_param()
-      
-      iToken = 0
+
+      bSuccess = self.connect_tokens(iterTokens)
+      self.oAtomTable.trim()
+
+      # complete tokenizing (for its error messages) if stopped early
+      for tplToken in iterTokens:
+         pass
+      self.lstErrors[nErrors:nErrors] = lstTokErrors
+      self.bTokenErrDone = 1
+
+      if bSuccess:
+         self.make_graph_csr()
+      return bSuccess
+
+   """------------------------------------------------------------------     
+      connect_tokens: evaluate triples (sToken,sTokTyp,nDepth) from
+                      iterTokens (see make_graph)
+      return: 1 if successful, 0 otherwise with message in lstErrors
+   """
+   def connect_tokens(self,iterTokens):
+
       idxCurly = 0
       lstBrnchPnts  = [] # list of indexes of current branch point atoms,
                          # nDepth is index in lstBranchPoint
       dictOpenRings = {} # keeps track if open rings:
-                         # key = ring id, value = [idx,lstBrnchPnts]
-                         #                         of waiting atom
-      dictRingData  = {} # {sAtPair: [lstBrnchPnts1,lstBrnchPnts2],...}
-                         #  sAtPair = 'i,j' with i and j indexes of
-                         #            ring closure atoms, i < j
-                         #  lstBrnchPnts1 = branch points for atom i
-                         #  lstBrnchPnts2 = branch points for atom j
+                         # key = ring id, value = idx of waiting atom
       sWaitingBond = None                    
-      for sToken in self.lstTokens:
-         sTokTyp = self.lstTokTyp[iToken]
-         nDepth  = self.lstDepth[iToken]    
+      oAtomTable = self.oAtomTable
+      fnAtNumb = self.oDataFace.atnumb_lookup()
+      for (sToken,sTokTyp,nDepth) in iterTokens:
 
          if sTokTyp == '(':
             pass
@@ -391,51 +638,51 @@ class AnnotatedSmiles:
          elif sTokTyp in ['b','~']: 
             sWaitingBond = sToken   
          elif sTokTyp == 'c': # annotation in curly braces
-            oCurly = csm_curlyann.CurlyAnnotation(self.oDataFace,sToken)
+            oCurly = csm_pool.oCurlyPool.acquire(self.oDataFace,sToken)
             lstErrorsCurly = oCurly.parse()
             if len(lstErrorsCurly) > 0:
                for sMfErr in lstErrorsCurly:
                   sMsg = 'AnnotatedSmiles.parse: oCurly.%s' % sMfErr
                   self.lstErrors.append(sMsg)
-            sAM = oCurly.annotation_marker()
-            if self.oDataFace.is_aaa(sAM):  # if atom-anchored annotation
-               (self.lstAaaEntr[self.nAtoms-1]).append(oCurly)              
-            elif self.oDataFace.is_caa(sAM):  # if component-anchored annotation
+            tplProps = oCurly.marker_props()
+            sAnchor = None
+            if tplProps != None:
+               sAnchor = tplProps[csm_dataface.MP_ANCHOR]
+            if sAnchor == 'AAA':  # if atom-anchored annotation
+               (oAtomTable.lstAaaEntr[self.nAtoms-1]).append(oCurly)              
+            elif sAnchor == 'CAA':  # if component-anchored annotation
                self.lstCaaEntr.append(oCurly)   
             else:
+               sAM = oCurly.annotation_marker()
                sMsg = "AnnotatedSmiles.parse: unknown descriptor/annotation marker '%s'" % sAM
                self.lstErrors.append(sMsg)               
+               csm_pool.oCurlyPool.release(oCurly)
          elif sTokTyp == 'r':
             (lstRid,sErr) = self.parse_ring_closure(sToken)
+            if sErr == None and self.nAtoms == 0:
+               sErr = 'ring closure "%s" without preceding atom' % sToken
             if sErr != None:
                sMsg  = 'AnnotatedSmiles.parse: %s' % sErr
                self.lstErrors.append(sMsg)             
-               return  self.lstErrors
+               return 0
             else:
                for nRid in lstRid:
                   idxAt2 = self.nAtoms - 1                 
                   if dictOpenRings.has_key(nRid):
-                     lstRingData = dictOpenRings[nRid]
-                     idxAt1 = lstRingData[0]
+                     idxAt1 = dictOpenRings[nRid]
                      sBond = '-'
-                     if self.lstAromat[idxAt1] and self.lstAromat[idxAt2]:
+                     if oAtomTable.arrAromat[idxAt1] and \
+                        oAtomTable.arrAromat[idxAt2]:
                         sBond = ':'
                      del dictOpenRings[nRid]       
                      self.connect_new_atom(idxAt1,idxAt2,sBond)
-                     # keep ring data for later evaluation
-                     sAtPair = '%d,%d' % (idxAt1,idxAt2) 
-                     lstBrnchPnts1 = lstRingData[1]
-                     dictRingData[sAtPair] = [lstBrnchPnts1,lstBrnchPnts[:]]   
                   else:
-                     dictOpenRings[nRid] = [idxAt2,lstBrnchPnts[:]]               
+                     dictOpenRings[nRid] = idxAt2
          elif sTokTyp in ['a','n','q','*']:
             self.nNodes += 1
-            self.lstAaaEntr.append([])
-            self.lstRingMap.append([])            
             idxCurly = 0            
             if sTokTyp == 'n' or sTokTyp == '*':
-               self.lstAtSymb.append(sToken)
-               nAtNumb = self.oDataFace.atnumb_as_int(sToken)
+               nAtNumb = fnAtNumb(sToken)
                if sToken == '*':
                   self.Ahold += 1
                if nAtNumb == None:
@@ -443,28 +690,17 @@ class AnnotatedSmiles:
                           (self.nAtoms+1)
                   sMsg += ' "%s",without atomic number' % sToken
                   self.lstErrors.append(sMsg)             
-                  return  self.lstErrors
-               self.lstAtNumb.append(nAtNumb)
-               self.lstAtLabel.append(None)
-               self.lstAtCharge.append(0)
-               self.lstAtDepth.append(self.lstDepth[iToken])     
-               self.lstAromat.append(0)
-               self.lstHcount.append(None)  
+                  return 0
+               oAtomTable.add_atom(sToken,nAtNumb,None,0,nDepth,0,None)
             elif sTokTyp == 'a':
                sUpper = sToken.upper() 
-               self.lstAtSymb.append(sUpper)
-               nAtNumb = self.oDataFace.atnumb_as_int(sUpper)
+               nAtNumb = fnAtNumb(sUpper)
                if nAtNumb == None:
                   sMsg  = 'AnnotatedSmiles.parse: %d.atomic' % self.nAtoms
                   sMsg += ' symbol, "%s",without atomic number' % sToken
                   self.lstErrors.append(sMsg)             
-                  return  self.lstErrors
-               self.lstAtNumb.append(nAtNumb)
-               self.lstAtLabel.append(None)
-               self.lstAtCharge.append(0)
-               self.lstAtDepth.append(self.lstDepth[iToken])     
-               self.lstAromat.append(1)
-               self.lstHcount.append(None)                
+                  return 0
+               oAtomTable.add_atom(sUpper,nAtNumb,None,0,nDepth,1,None)
             else:
                (nLabel,sAtSymb,bArom,nHAt,sCharge,sErr) = \
                         self.parse_square_bracket_notation(sToken)               
@@ -473,28 +709,20 @@ class AnnotatedSmiles:
                           (self.nAtoms + 1)
                   sMsg += ' < %s' % sErr
                   self.lstErrors.append(sMsg)             
-                  return  self.lstErrors
-               self.lstAtSymb.append(sAtSymb)
-               nAtNumb = self.oDataFace.atnumb_as_int(sAtSymb)               
-               self.lstAtNumb.append(nAtNumb)
-               self.lstAtLabel.append(nLabel)
-               self.lstAtCharge.append(int(sCharge))
-               self.lstAtDepth.append(self.lstDepth[iToken])     
-               self.lstAromat.append(bArom)
-               self.lstHcount.append(nHAt)
+                  return 0
+               nAtNumb = fnAtNumb(sAtSymb)
+               oAtomTable.add_atom(sAtSymb,nAtNumb,nLabel,int(sCharge),
+                                   nDepth,bArom,nHAt)
 
             # connect current atom to left-side neighbor atom, idxNbor
-            if self.nAtoms < 1:
-               self.dictNbors[0] = []
-               self.dictBonds[0] = []
-            else:   
+            if self.nAtoms > 0:
                sBond = '-'
                idxNbor = lstBrnchPnts[len(lstBrnchPnts)-1]
                if sWaitingBond != None:
                   sBond = sWaitingBond
                   sWaitingBond = None
-               elif self.lstAromat[self.nAtoms] and \
-                    self.lstAromat[idxNbor]:
+               elif oAtomTable.arrAromat[self.nAtoms] and \
+                    oAtomTable.arrAromat[idxNbor]:
                   sBond = ':'
                self.connect_new_atom(self.nAtoms,idxNbor,sBond)
             
@@ -508,41 +736,9 @@ class AnnotatedSmiles:
             sMsg  = 'AnnotatedSmiles.parse: unknown token type ' 
             sMsg += '"%s" for token "%s",' % (sTokTyp,sToken)
             self.lstErrors.append(sMsg)             
-            return self.lstErrors         
-
-         iToken += 1
-
-      # apply valence rule and derive count of non-node H-atoms
-      self.count_tonode_valence_bonds()
-      self.count_non_node_hatoms()
-      self.nAtoms += self.nHterm
-
-      # make adjacency matrix
-      self.make_adj_mat()
+            return 0
 
-      # make distance matrix
-      self.make_dist_mat()
-
-      # derive rings with member atoms
-      self.make_rings(dictRingData)
-
-      # shorten rings
-      self.shorten_rings()
-
-      # revisit rings to assign remaining ring data
-      self.revisit_rings()
-
-      # sum charges
-      self.sum_local_charges()      
-      self.sum_deloc_charges()
-
-      # make molecular formula
-      self.make_mf()
-
-      # make atom fragments
-      self.make_atf0()
-
-      return self.lstErrors
+      return 1
 
    """------------------------------------------------------------------   
       parseSquareBracketNotation: parse sStr with notation from square
@@ -695,6 +891,17 @@ class AnnotatedSmiles:
                sErr += 'syntax error after H'        
       else:
          nHAt = 0
+
+      # check ranges of values stored in AtomTable   
+      if sErr == None and (abs(int(sCharge)) > nMaxAtomCount or \
+                           nHAt > nMaxAtomCount):
+         sErr  = "parse_square_bracket_notation(%s):" %\
+                sStr         
+         sErr += 'charge or H-count out of range'
+      elif sErr == None and nLabel != None and nLabel > nMaxAtomLabel:
+         sErr  = "parse_square_bracket_notation(%s):" %\
+                sStr         
+         sErr += 'isotope label out of range'
       
       return (nLabel,sAtSymb,bArom,nHAt,sCharge,sErr)
 
@@ -755,37 +962,115 @@ class AnnotatedSmiles:
    """------------------------------------------------------------------    
       connect_new_atom: connect a new atom (idxAt1) with a previously
                         entered atom (idxAt2) by bond given with sBond
-      update: self.dictNbors, self.dictBons                   
+      update: self.arrEdge, self.arrEdgeBond                   
    """
    def connect_new_atom(self,idxAt1,idxAt2,sBond):
+      self.arrEdge.append(idxAt1)
+      self.arrEdge.append(idxAt2)
+      self.arrEdgeBond.append(dictBondCodes[sBond])
 
-      if self.dictNbors.has_key(idxAt1):
-         lst = self.dictNbors[idxAt1]
-         lst.append(idxAt2)
-         self.dictNbors[idxAt1] = lst
-         lst = self.dictBonds[idxAt1]
-         lst.append(sBond)
-         self.dictBonds[idxAt1] = lst
-      else:   
-         self.dictNbors[idxAt1] = [idxAt2]      
-         self.dictBonds[idxAt1] = [sBond]  
-
-      if self.dictNbors.has_key(idxAt2):
-         lst = self.dictNbors[idxAt2]
-         lst.append(idxAt1)
-         self.dictNbors[idxAt2] = lst
-         lst = self.dictBonds[idxAt2]
-         lst.append(sBond)
-         self.dictBonds[idxAt2] = lst
-      else:   
-         self.dictNbors[idxAt2] = [idxAt1]      
-         self.dictBonds[idxAt2] = [sBond]  
+   """------------------------------------------------------------------    
+      make_graph_csr: make graph in compressed sparse row format from
+                      the bonds entered with connect_new_atom; the
+      neighbors of each node keep the order in which they were entered
 
-      sPair = '%d,%d' % (idxAt1,idxAt2)
-      self.dictPairs[sPair] = sBond
-      sPair = '%d,%d' % (idxAt2,idxAt1)
-      self.dictPairs[sPair] = sBond
+      EXAMPLE: ethanal, entered as CC=O:
+               self.arrOffset = [0, 1, 3, 4]
+               self.arrNbor   = [1, 0, 2, 1]
+               self.arrBond   = [0, 0, 1, 1]   (codes for '-' and '=')
+               self.arrDegree = [1, 2, 1]
 
+      assign: self.arrOffset, self.arrNbor, self.arrBond, self.arrDegree
+   """
+   def make_graph_csr(self):
+
+      nNodes = self.nNodes
+      arrEdge = self.arrEdge
+      arrEdgeBond = self.arrEdgeBond
+
+      arrDegree = array.array('i',[0]) * nNodes
+      for idxAt in arrEdge:
+         arrDegree[idxAt] += 1
+
+      arrOffset = array.array('i',[0]) * (nNodes+1)
+      for idxAt in range(nNodes):
+         arrOffset[idxAt+1] = arrOffset[idxAt] + arrDegree[idxAt]
+
+      arrNbor = array.array('i',[0]) * len(arrEdge)
+      arrBond = array.array('b',[0]) * len(arrEdge)
+      arrNext = arrOffset[:nNodes] # next free position per node
+      for k in range(len(arrEdgeBond)):
+         idxAt1 = arrEdge[2*k]
+         idxAt2 = arrEdge[2*k+1]
+         nCode  = arrEdgeBond[k]
+         iPos = arrNext[idxAt1]
+         arrNbor[iPos] = idxAt2
+         arrBond[iPos] = nCode
+         arrNext[idxAt1] = iPos + 1
+         iPos = arrNext[idxAt2]
+         arrNbor[iPos] = idxAt1
+         arrBond[iPos] = nCode
+         arrNext[idxAt2] = iPos + 1
+
+      self.arrOffset = arrOffset
+      self.arrNbor   = arrNbor
+      self.arrBond   = arrBond
+      self.arrDegree = arrDegree
+      self.arrEdge     = None
+      self.arrEdgeBond = None
+
+   """------------------------------------------------------------------    
+      nbors: return array with indexes of neighbor nodes of node idxAt
+   """
+   def nbors(self,idxAt):
+      return self.arrNbor[self.arrOffset[idxAt]:self.arrOffset[idxAt+1]]
+
+   """------------------------------------------------------------------    
+      nbor_rows: return list with one tuple of neighbor indexes per node
+                 (CSR graph unpacked for repeated traversal)
+   """
+   def nbor_rows(self):
+      arrOffset = self.arrOffset
+      arrNbor = self.arrNbor
+      return [tuple(arrNbor[arrOffset[idxAt]:arrOffset[idxAt+1]])
+              for idxAt in range(len(arrOffset)-1)]
+
+   """------------------------------------------------------------------    
+      find_nbor: return position of node idxAt2 among the neighbors of
+                 node idxAt1 in self.arrNbor (also, in self.arrBond),
+                 or -1 if not adjacent or index out of range
+   """
+   def find_nbor(self,idxAt1,idxAt2):
+      if idxAt1 < 0 or idxAt1 >= len(self.arrOffset)-1:
+         return -1
+      arrNbor = self.arrNbor
+      for iPos in range(self.arrOffset[idxAt1],self.arrOffset[idxAt1+1]):
+         if arrNbor[iPos] == idxAt2:
+            return iPos
+      return -1
+
+   """------------------------------------------------------------------    
+      make_dicts: make dictNbors, dictBonds and dictPairs from CSR graph
+                  unless already done (these dictionaries are kept
+                  for compatibility; CSR graph is used internally)
+   """
+   def make_dicts(self):
+      if self.dictNbors != None:
+         return
+      self.dictNbors = {}
+      self.dictBonds = {}
+      self.dictPairs = {}
+      for idxAt in range(len(self.arrOffset)-1):
+         lstNbors = []
+         lstBonds = []
+         for iPos in range(self.arrOffset[idxAt],self.arrOffset[idxAt+1]):
+            idxNbor = self.arrNbor[iPos]
+            sBond = sBondSymbols[self.arrBond[iPos]]
+            lstNbors.append(idxNbor)
+            lstBonds.append(sBond)
+            self.dictPairs['%d,%d' % (idxAt,idxNbor)] = sBond
+         self.dictNbors[idxAt] = lstNbors
+         self.dictBonds[idxAt] = lstBonds
 
    """------------------------------------------------------------------    
       count_tonode_valence_bonds: count the number of valence bonds
@@ -800,28 +1085,33 @@ class AnnotatedSmiles:
                 2. pyridine: c1nc1ccn1                            
                              each C or N atom has 3 valence bonds
       
-      assign: self.lstNbors and self.lstNvbors         
+      assign: columns arrNbors and arrNvbors of self.oAtomTable         
    """
    def count_tonode_valence_bonds(self):
 
       """
-          dictionary with bond-symbol/valence-count values
+          valence-count values per bond code
           (values are doubled to avoid floating point numbers for
-           bonds in aromatic rings)  
+           bonds in aromatic rings; see lstBondValence2)  
       """
-      dictVB = {'-' : 2, '=' : 4, '#' : 6, '$' : 8, ':' : 3}
+      lstVB = lstBondValence2
+      arrOffset = self.arrOffset
+      arrBond = self.arrBond
+      oAtomTable = self.oAtomTable
 
-      for idxAt in range(self.nAtoms):
-         lstBonds = self.dictBonds[idxAt] 
-         lstAtCrl = self.lstAaaEntr[idxAt]
+      # number of neigbor nodes
+      oAtomTable.arrNbors = array.array('h',self.arrDegree)
 
-         self.lstNbors.append(len(lstBonds))  # number of neigbor nodes
+      arrNvbors = array.array('h',[0]) * self.nAtoms
+      for idxAt in range(self.nAtoms):
+         lstAtCrl = oAtomTable.lstAaaEntr[idxAt]
 
          nVbors = 0 # valence bonds connecting to neighbors
-         for sBond in lstBonds: # for each bond to a neighbor node
+         for iPos in range(arrOffset[idxAt],arrOffset[idxAt+1]):
             
-            if dictVB.has_key(sBond):
-               nVbors += dictVB[sBond]
+            nVB = lstVB[arrBond[iPos]]
+            if nVB != None:
+               nVbors += nVB
             else:
                nVbors = None
                break
@@ -829,16 +1119,14 @@ class AnnotatedSmiles:
          # count open valence bonds given in annotations
          if nVbors != None:
             for oCrl in lstAtCrl:
-               sAM  = oCrl.annotation_marker()
-               nCor = self.oDataFace.hcount_correction(sAM)
-               nVbors += nCor                        
+               nVbors += oCrl.marker_props()[csm_dataface.MP_HCOR]
 
-         # update self.lstNvbors
+         # update arrNvbors
          if nVbors != None:      
             nVbors /= 2
-            self.lstNvbors.append(nVbors)
-         else:
-            self.lstNvbors.append(0)
+            arrNvbors[idxAt] = nVbors
+
+      oAtomTable.arrNvbors = arrNvbors
 
 
    """------------------------------------------------------------------    
@@ -854,18 +1142,21 @@ class AnnotatedSmiles:
          (d) atoms in other states and  non-organic-subset atoms
              have explicit H-counts given in square brackets
 
-      assign: self.lstHcount and self.nHterm
+      assign: column arrHcount of self.oAtomTable and self.nHterm
    """
    def count_non_node_hatoms(self):
       
+      oAtomTable = self.oAtomTable
+      arrAtNumb  = oAtomTable.arrNumb
+      arrAromat  = oAtomTable.arrAromat
+      arrHcount  = oAtomTable.arrHcount
       for idxAt in range(self.nAtoms):
-         nAtNumb  = self.lstAtNumb[idxAt]
-         sAtSymb  = self.lstAtSymb[idxAt]
-         nNbors   = self.lstNbors[idxAt]
-         nNvbors  = self.lstNvbors[idxAt]
+         nAtNumb  = arrAtNumb[idxAt]
+         nNbors   = oAtomTable.arrNbors[idxAt]
+         nNvbors  = oAtomTable.arrNvbors[idxAt]
 
-         if self.lstHcount[idxAt] != None:
-            self.nHterm += self.lstHcount[idxAt]
+         if arrHcount[idxAt] != nUnassigned:
+            self.nHterm += arrHcount[idxAt]
          else:   
             nDiff = 0 # difference between expected and obtained
                       # values for number of valence bonds
@@ -882,7 +1173,7 @@ class AnnotatedSmiles:
             elif nAtNumb == 53:            # iodine
                nDiff = 1 - nNvbors
             elif nAtNumb == 7:             # nitrogen
-               if self.lstAromat[idxAt]:
+               if arrAromat[idxAt]:
                   if nNvbors >= 3:   # such as in pyridine-N-oxide 
                      nDiff = 0       # or in N-substituted 5-ring
                   else:
@@ -893,12 +1184,12 @@ class AnnotatedSmiles:
                   else:
                      nDiff = 3 - nNvbors
             elif nAtNumb == 8:             # oxygen
-               if self.lstAromat[idxAt]:
+               if arrAromat[idxAt]:
                   nDiff = 0
                else:
                   nDiff = 2 - nNvbors              
             elif nAtNumb == 15:            # phosphorus
-               if self.lstAromat[idxAt]:
+               if arrAromat[idxAt]:
                   if nNvbors >= 4:
                      nDiff = 0       # in P-substituted 5-ring
                   else:
@@ -906,8 +1197,8 @@ class AnnotatedSmiles:
                elif nNbors == 0:
                      nDiff = 3       # PH3
                elif nNbors == 1:
-                  lstNbors = self.dictNbors[idxAt]
-                  nAtNumbNbor = self.lstAtNumb[lstNbors[0]] 
+                  idxNbor = self.arrNbor[self.arrOffset[idxAt]]
+                  nAtNumbNbor = arrAtNumb[idxNbor] 
                   if nNvbors == 1:
                      nDiff = 2       # H2P-PH2, R-PH2, X-PH2
                   elif nNvbors == 2:
@@ -927,13 +1218,13 @@ class AnnotatedSmiles:
                # else  any neutral PH, PH2  with 3 or more neighbors?  
 
             elif nAtNumb == 16:             # sulfur
-               if self.lstAromat[idxAt]:
+               if arrAromat[idxAt]:
                   nDiff = 0
                elif nNbors == 0:
                   nDiff = 2                 # H2S
                elif nNbors == 1:
-                  lstNbors = self.dictNbors[idxAt]
-                  nAtNumbNbor = self.lstAtNumb[lstNbors[0]] 
+                  idxNbor = self.arrNbor[self.arrOffset[idxAt]]
+                  nAtNumbNbor = arrAtNumb[idxNbor] 
                   if nNvbors == 1:
                      nDiff = 1              # example: HS-R 
                   # elif nNvbors == 2:
@@ -953,53 +1244,103 @@ class AnnotatedSmiles:
                   if nNvbors < 6:
                      nDiff = 6 - nNvbors    
             else:
-               sMsg  = 'csm_subnotation.applyValenceRule: "%s"' % sAtSymb
+               sMsg  = 'csm_subnotation.applyValenceRule: "%s"' % \
+                       oAtomTable.symb(idxAt)
                sMsg += ' not in organic subset, hence explicit Hcount'
                sMsg += ' assignment expected' 
                self.lstErrors.append(sMsg)             
                return 0            
             
-            self.lstHcount[idxAt] = nDiff
+            arrHcount[idxAt] = nDiff
             self.nHterm += nDiff
 
+   #===================================================================#
+   # TOPOLOGY on demand                                                #
+   #===================================================================#
+   """------------------------------------------------------------------
+      ensure_adj_mat: make lstIdxMat and lstAdjMat unless already made
+                      (nothing is made before parse() has completed
+                       the molecular graph)
+   """
+   def ensure_adj_mat(self):
+      if self.bAdjMat or not self.bTopoReady:
+         return
+      self.make_adj_mat()
+      self.bAdjMat = 1
+
+   """------------------------------------------------------------------
+      ensure_dist_mat: make lstDistMat (and its prerequisites) unless
+                       already made
+   """
+   def ensure_dist_mat(self):
+      if self.bDistMat or not self.bTopoReady:
+         return
+      self.ensure_adj_mat()
+      self.make_dist_mat()
+      self.bDistMat = 1
+
+   """------------------------------------------------------------------
+      ensure_path_count_mat: make lstPathCountMat unless already made
+                             (distance matrix is made again with it,
+      if made before without path counts)
+   """
+   def ensure_path_count_mat(self):
+      if self.bPathCountMat or not self.bTopoReady:
+         return
+      self.bPathCounts = 1
+      self.ensure_adj_mat()
+      self.make_dist_mat()
+      self.bDistMat = 1
+
+   """------------------------------------------------------------------
+      ensure_rings: perceive rings and assign remaining ring data
+                    (lstRingLength, lstRingAromat, lstRingCharge,
+      lstRingMap, nRings) unless already done
+   """
+   def ensure_rings(self):
+      if self.bRings or not self.bTopoReady:
+         return
+      self.bRings = 1
+
+      # smallest set of smallest rings
+      self.make_rings()
+
+      # revisit rings to assign remaining ring data
+      self.revisit_rings()
+
    #===================================================================#
    # TOPOLOGICAL MATRICES                                              #
    #===================================================================#
-   """------------------------------------------------------------------       
-      make_adj_mat: make adjacency matrix:
+   """------------------------------------------------------------------
+      make_adj_mat: make adjacency matrix as TriangularMatrix with
+                    entries 1 for bound and 0 for unbound atom pairs
 
                   lstIdxMat = [(0, 1), (0, 2),...,(nNodes-2,nNodes-1)]
-                  lstIdxMat is a list of pairs (idxRow,idxCol) to
-                            look up  
-      k = 0 # index for lstIdxMat, k=0,1,2,...,nNodes*(nNodes-1)/2                   
+                  lstIdxMat is a view of pairs (idxRow,idxCol) to
+                            look up (computed on access, see
+                            TriangularIndexView)
+      k = 0 # index for lstIdxMat, k=0,1,2,...,nNodes*(nNodes-1)/2
    """
    def make_adj_mat(self):
 
-      self.lstIdxMat  = []
-      nRowLength = self.nNodes-1  # length of row in upper triangle
-      for idxRow in range(self.nNodes-1):
-         for idxCol in range(nRowLength): 
-            self.lstIdxMat.append( (idxRow,idxCol+idxRow+1) )
-         nRowLength -= 1   
-
-      self.lstAdjMat = []
-      for (i,j) in self.lstIdxMat:
-         if self.are_connected(i,j):
-            self.lstAdjMat.append(1)
-         else:   
-            self.lstAdjMat.append(0)
-      
-   """------------------------------------------------------------------                
-      make_dist_mat: make topological distance matrix:
-                   based on lstAdjMat, calculate lstDistMat using
-                   a published algorithm:
+      self.lstIdxMat = TriangularIndexView(self.nNodes)
+
+      self.lstAdjMat = TriangularMatrix(self.nNodes,'B')
+      for idxAt in range(self.nNodes):
+         for idxNbor in self.nbors(idxAt):
+            if idxNbor > idxAt:
+               self.lstAdjMat.set(idxAt,idxNbor,1)
 
-                   W. R. Mueller, K. Szymanski, J. V. Knop and
-                   N. Trinajstic:
-                   An Algorithm for Construction of the Molecular
-                   Distance Matrix.
-                   J. Comp. Chem. 1987, 8(2), pp. 170-173.
-                   Table I therein contains the algorithm in FORTRAN.
+   """------------------------------------------------------------------
+      make_dist_mat: make topological distance matrix:
+                   run one breadth-first search per node over the
+                   CSR graph (see make_graph_csr) and serialize the
+                   distances to nodes with higher index row by row
+                   into lstDistMat (O(V*E) instead of the O(V^3 log V)
+                   doubling scheme of Mueller, Szymanski, Knop and
+                   Trinajstic, J. Comp. Chem. 1987, 8(2), pp. 170-173,
+                   used previously); a node that cannot be reached
+                   gets the distance value self.nAtoms
 
       Example: 2-methylbutane, entered as CC(C)CC:
       
@@ -1018,40 +1359,129 @@ class AnnotatedSmiles:
                lstAdjMat  = [1,0,0,0,1,1,0,0,0,1]
                lstDistMat = [1,2,2,3,1,1,2,2,3,1]
                idxK(i,j):    0 1 2 3 4 5 6 7 8 9                   
+
+      With self.bPathCounts = 1, the number of shortest paths between
+      each pair is counted in the same searches and serialized into
+      lstPathCountMat (floating point values, exact up to 2**53).
    """
    def make_dist_mat(self):
 
       # no distance matrix if no adjacency matrix
-      if self.lstAdjMat == None: 
-         return None         
+      if self.lstAdjMat == None:
+         return None
+
+      # row idxAt of the upper triangle holds the distances from atom
+      # idxAt to the atoms idxAt+1,...,nNodes-1
+      sTypeCode = 'H'
+      if self.nAtoms > 65535:
+         sTypeCode = 'L'
+
+      # numpy backend: serialize dense matrix
+      if self.sBackend == 'numpy' and not self.bPathCounts:
+         self.lstDistMat = triangular_from_dense(self.dense_dist_mat(),
+                                                 sTypeCode)
+         return self.lstDistMat
+
+      self.lstDistMat = TriangularMatrix(self.nNodes,sTypeCode)
+      lstNborRows = self.nbor_rows()
+      if self.bPathCounts:
+         self.lstPathCountMat = TriangularMatrix(self.nNodes,'d')
+         for idxAt in range(self.nNodes-1):
+            (lstDist,lstCount) = self.bfs_path_counts(idxAt,lstNborRows)
+            self.lstDistMat.set_row(idxAt,lstDist[idxAt+1:])
+            self.lstPathCountMat.set_row(idxAt,lstCount[idxAt+1:])
+         self.bPathCountMat = 1
+         return self.lstDistMat
+
+      for idxAt in range(self.nNodes-1):
+         lstDist = self.bfs_distances(idxAt,lstNborRows)
+         self.lstDistMat.set_row(idxAt,lstDist[idxAt+1:])
 
-      # initialize distance matrix
-      self.lstDistMat = []
-      for nEntry in self.lstAdjMat:
-         if nEntry == 1:   
-            self.lstDistMat.append(1)
-         else:
-            self.lstDistMat.append(self.nAtoms)
-
-      # algorithm of Mueller, Szymanski, Knop, and Trinajstic
-      L = 1
-      while L < self.nNodes-1:
-         for J in range(self.nNodes):
-            for I in range(self.nNodes):
-               if I==J:
-                  continue
-               idxK = self.idxK(I,J)
-               if self.lstDistMat[idxK] == L:
-                  for K in range(self.nNodes):
-                     idxKI = self.idxK(K,I)
-                     iakj = self.lstDistMat[idxKI] + L
-                     idxKJ = self.idxK(K,J)
-                     if self.lstDistMat[idxKJ] > iakj:
-                        self.lstDistMat[idxKJ] = iakj
-         L += L
-         
       return self.lstDistMat
 
+   """------------------------------------------------------------------
+      bfs_distances: breadth-first search starting at node idxAt
+                     (lstNborRows as returned by nbor_rows, made here
+                      if not given)
+      return: lstDist, list with the topological distance from idxAt
+              to each node (self.nAtoms for nodes not reachable)
+   """
+   def bfs_distances(self,idxAt,lstNborRows=None):
+      if lstNborRows == None:
+         lstNborRows = self.nbor_rows()
+      lstDist = [self.nAtoms] * self.nNodes
+      lstDist[idxAt] = 0
+      lstFront = [idxAt]
+      nDist = 0
+      while lstFront:
+         nDist += 1
+         lstNext = []
+         for idxFront in lstFront:
+            for idxNbor in lstNborRows[idxFront]:
+               if lstDist[idxNbor] > nDist:
+                  lstDist[idxNbor] = nDist
+                  lstNext.append(idxNbor)
+         lstFront = lstNext
+      return lstDist
+
+   """------------------------------------------------------------------
+      bfs_path_counts: breadth-first search starting at node idxAt
+                       that also counts the shortest paths to each
+      node: the count of a node is the sum of the counts of its
+      predecessors, the neighbors one step closer to idxAt
+      return: (lstDist,lstCount), lists with the topological distance
+              from idxAt (as in bfs_distances) and the number of
+              shortest paths (0 for nodes not reachable)
+   """
+   def bfs_path_counts(self,idxAt,lstNborRows=None):
+      if lstNborRows == None:
+         lstNborRows = self.nbor_rows()
+      lstDist = [self.nAtoms] * len(lstNborRows)
+      lstCount = [0] * len(lstNborRows)
+      lstDist[idxAt] = 0
+      lstCount[idxAt] = 1
+      lstFront = [idxAt]
+      nDist = 0
+      while lstFront:
+         nDist += 1
+         lstNext = []
+         for idxFront in lstFront:
+            nCount = lstCount[idxFront]
+            for idxNbor in lstNborRows[idxFront]:
+               if lstDist[idxNbor] > nDist:
+                  lstDist[idxNbor] = nDist
+                  lstCount[idxNbor] = nCount
+                  lstNext.append(idxNbor)
+               elif lstDist[idxNbor] == nDist:
+                  lstCount[idxNbor] += nCount
+         lstFront = lstNext
+      return (lstDist,lstCount)
+
+   """------------------------------------------------------------------
+      dense_adj_mat: make (once) and return adjacency matrix as dense
+                     numpy array of order nNodes (numpy backend)
+      return: self.matAdj
+   """
+   def dense_adj_mat(self):
+      if self.matAdj is None:
+         nNodes = len(self.arrDegree)
+         self.matAdj = numpy.zeros((nNodes,nNodes),dense_dtype(self.nAtoms))
+         arrRows = numpy.repeat(numpy.arange(nNodes),list(self.arrDegree))
+         arrCols = numpy.array(self.arrNbor,dtype=numpy.intp)
+         self.matAdj[arrRows,arrCols] = 1
+      return self.matAdj
+
+   """------------------------------------------------------------------
+      dense_dist_mat: make (once) and return distance matrix as dense
+                      numpy array of order nNodes (numpy backend),
+                      see dense_distances
+      return: self.matDist
+   """
+   def dense_dist_mat(self):
+      if self.matDist is None:
+         self.matDist = dense_distances(self.dense_adj_mat(),self.nAtoms)
+      return self.matDist
+
    """------------------------------------------------------------------ 
       idxK: return index k of serialized upper triangle for entry i,j
             in square symmetric adjacency or distance matrix 
@@ -1066,21 +1496,17 @@ class AnnotatedSmiles:
       elif i==j:
          return -1
       elif i < j:
-         ii = j
-         jj = i
+         return triangle_index(self.nNodes,i,j)
       else:
-         ii = i
-         jj = j
-      k = 0
-      for kk in range(jj):
-         k += (self.nNodes-1) - kk
-      return (k+ii-jj)-1
+         return triangle_index(self.nNodes,j,i)
 
    """------------------------------------------------------------------ 
       return topological distance between atoms i and j for any values
              of i and j between 0 and nAtoms-1
    """
    def dist(self,i,j):
+      if not self.bDistMat:
+         self.ensure_dist_mat()
       if i==j:
          return 0
       else:
@@ -1094,172 +1520,203 @@ class AnnotatedSmiles:
    # EVALUATE RINGS                                                    #
    #===================================================================#
    """------------------------------------------------------------------    
-      make_rings: recognize rings based on dictRingData with format:
-
-      dictRingData  = sAtPair: [lstBrnchPnts1,lstBrnchPnts2],...}
-                         sAtPair = 'i,j' with i and j indexes of
-                                     ring closure atoms, i < j
-                         lstBrnchPnts1 = branch points for atom i
-                         lstBrnchPnts2 = branch points for atom j
-      
+      make_rings: perceive the smallest set of smallest rings (SSSR)
+                  from the CSR graph:
+         (1) a ring closure to itself (C11) yields a 1-membered ring,
+             a repeated bond between the same two atoms (C1C1) a
+             2-membered ring;
+         (2) bonds that are not part of any ring (bridges) are removed
+             and each remaining connected ring system is evaluated
+             by sssr_ring_system
+      Each ring is a list of member indexes in ring order, starting
+      with the lowest index and continuing with its lower-index
+      neighbor; rings are sorted by their member lists.
+
+      EXAMPLE: 1-phenylnaphthalene, entered as c1ccccc1-c2cccc3ccccc23
+               self.lstRings = [[0, 1, 2, 3, 4, 5],
+                                [6, 7, 8, 9, 10, 15],
+                                [10, 11, 12, 13, 14, 15]]
       assign: self.lstRings
    """
-   def make_rings(self,dictRingData):
+   def make_rings(self):
 
       self.lstRings = []
-
-      for sAtPair in dictRingData.keys():
-         lstPair = sAtPair.split(',')
-         idxAt1 = int(lstPair[0])
-         idxAt2 = int(lstPair[1])
-         [lstBrnchPnts1,lstBrnchPnts2] = dictRingData[sAtPair]           
-         nDepth1 = self.lstAtDepth[idxAt1] 
-         nDepth2 = self.lstAtDepth[idxAt2] 
-
-         lstMembers = []
-         if nDepth1 == 0 and nDepth2 == 0:
-            for k in range((idxAt2-idxAt1)+1):
-                idxBetween = idxAt1 + k
-                if self.lstAtDepth[idxBetween] == 0:
-                   lstMembers.append(idxBetween) 
-         else:
-            # minDepth = min(nDepth1,nDepth2)
-            # For each ring closing get ring members down to branch point
-            # with depth value equal to minDepth
-            [idxLeftMost,lstRight] = \
-            self.ring_members_right_to_left(idxAt1,idxAt2,lstBrnchPnts1,lstBrnchPnts2)
-#            print 'idxAt1=',idxAt1,'lstBrnchPnts1:', lstBrnchPnts1
-#            print 'idxAt2=',idxAt2,'lstBrnchPnts2:', lstBrnchPnts2            
-#            print '### lstRight:', lstRight
-            lstRight.sort()
-#            print '#### idxLeftMost=',idxLeftMost,', idxAt1=',idxAt1
-            
-            if idxLeftMost == idxAt1:
-               lstMembers = lstRight               
-            elif idxLeftMost in lstBrnchPnts1:
-               lstLeft = self.ring_members_left_to_right(idxLeftMost,idxAt1)            
-               lstMembers = lstLeft + lstRight
+      nNodes = len(self.arrDegree)
+
+      # simple graph; loops and repeated bonds as 1- and 2-membered rings
+      lstSimpleNbors = []
+      for idxAt in range(nNodes):
+         lstNbors = []
+         for idxNbor in self.nbors(idxAt):
+            if idxNbor == idxAt:
+               if lstNbors.count(idxAt) == 0:
+                  self.lstRings.append([idxAt])
+               lstNbors.append(idxAt) # loop listed twice, skip second
+            elif idxNbor in lstNbors:
+               if idxNbor > idxAt:
+                  self.lstRings.append([idxAt,idxNbor])
             else:
-               lstMembers = [idxAt1] + lstRight
+               lstNbors.append(idxNbor)
+         lstSimpleNbors.append(filter(lambda i: i != idxAt, lstNbors))
 
-         self.lstRings.append(lstMembers)
-         
-   """------------------------------------------------------------------
-      ring_members_right_to_left:
-      return: [idxLeftMost,lstRight]
-               idxLeftMost = index of left most atom that is ring rember
-               lstRight    = list of ring members between idxLeftMost and idxAt2
-   """
-   def ring_members_right_to_left(self,idxAt1,idxAt2,lstBrnchPnts1,lstBrnchPnts2):
-      idxLeftMost = -1
-      lstRight = [idxAt2]
-      nDepthMemb = len(lstBrnchPnts2)-1
-
-      idxPrevMemb = idxAt2 # previous ring member atom
-      for k in range(1,idxAt2+1):  
-         idxAt = idxAt2 - k
-         if self.are_connected(idxAt,idxPrevMemb):
-            lstRight.append(idxAt)
-            if idxAt == idxAt1 or idxAt in lstBrnchPnts1:
-               idxLeftMost = idxAt
-               break
-            idxPrevMemb = idxAt
+      # rings of each ring system
+      lstRingNbors = self.ring_bond_nbors(lstSimpleNbors)
+      for lstSystem in self.ring_systems(lstRingNbors):
+         self.lstRings += self.sssr_ring_system(lstSystem,lstRingNbors)
 
-      return [idxLeftMost,lstRight]
+      self.lstRings.sort()
 
    """------------------------------------------------------------------
-      ring_members_left_to_right
+      ring_bond_nbors: find bridges (bonds not in any ring) of the
+                       simple graph lstSimpleNbors by depth-first
+      search with low links (Tarjan), iteratively to avoid recursion
+      limits on long chains
+      return: lstRingNbors, list with neighbors via ring bonds per node
    """
-   def ring_members_left_to_right(self,idxLeftMost,idxAt1):
-
-      lstLeft = [idxAt1]
-
-      idxPrevMemb = idxAt1 # previous ring member atom
-      for k in range(1,idxAt1):
-         idxAt = idxAt1 - k
-         if idxAt == idxLeftMost:
-            break
-         elif self.are_connected(idxAt,idxPrevMemb):
-            lstLeft.append(idxAt)
-         idxPrevMemb = idxAt
-
-      return lstLeft
-
-   """------------------------------------------------------------------ 
-      shorten_rings: search for short-cuts in current rings
-      update: self.lstRings
-   """
-   def shorten_rings(self):
-
-      idxRing = 0
-      for lstMemb in self.lstRings:
-         lenRing = len(lstMemb)
-         if lenRing > 3:
-
-            lstMembCur = lstMemb[:]
-            for k in range(lenRing-1):
-               lstMembNew = self.get_next_shortcut(lstMembCur)
-               if len(lstMembNew) < len(lstMembCur):
-                  self.lstRings[idxRing] = lstMembNew
-               else:
+   def ring_bond_nbors(self,lstSimpleNbors):
+
+      nNodes = len(lstSimpleNbors)
+      lstDisc = [-1] * nNodes # discovery time
+      lstLow  = [0] * nNodes  # lowest discovery time reachable
+      dictBridges = {}
+      nTime = 0
+      for idxStart in range(nNodes):
+         if lstDisc[idxStart] >= 0:
+            continue
+         lstDisc[idxStart] = lstLow[idxStart] = nTime
+         nTime += 1
+         lstStack = [(idxStart,-1,iter(lstSimpleNbors[idxStart]))]
+         while lstStack:
+            (idxAt,idxParent,iterNbors) = lstStack[-1]
+            bDescend = 0
+            for idxNbor in iterNbors:
+               if idxNbor == idxParent:
+                  continue
+               if lstDisc[idxNbor] < 0:
+                  lstDisc[idxNbor] = lstLow[idxNbor] = nTime
+                  nTime += 1
+                  lstStack.append((idxNbor,idxAt,
+                                   iter(lstSimpleNbors[idxNbor])))
+                  bDescend = 1
                   break
+               elif lstDisc[idxNbor] < lstLow[idxAt]:
+                  lstLow[idxAt] = lstDisc[idxNbor]
+            if bDescend:
+               continue
+            del lstStack[-1]
+            if idxParent >= 0:
+               if lstLow[idxAt] < lstLow[idxParent]:
+                  lstLow[idxParent] = lstLow[idxAt]
+               if lstLow[idxAt] > lstDisc[idxParent]:
+                  dictBridges[(idxParent,idxAt)] = 1
+                  dictBridges[(idxAt,idxParent)] = 1
+
+      lstRingNbors = []
+      for idxAt in range(nNodes):
+         lstRingNbors.append(filter(
+            lambda i: not dictBridges.has_key((idxAt,i)),
+            lstSimpleNbors[idxAt]))
+      return lstRingNbors
 
-               lstMembCur = lstMembNew[:]    
-
-         idxRing += 1
-                  
    """------------------------------------------------------------------
-      get_next_shortcut
-      return: return list with ring members of shortcut ring
+      ring_systems: group nodes connected by ring bonds
+      return: list of ring systems, each a list of node indexes
    """
-   def get_next_shortcut(self,lstMemb):
-      idxLast = len(lstMemb) - 1  # index of last atom in sequence
-
-      idxMemb1 = 0
-      for idxAt1 in lstMemb[idxMemb1:idxLast-1]:
-
-         idxMemb2 = idxMemb1+2
-         for idxAt2 in lstMemb[idxMemb1+2:]:
+   def ring_systems(self,lstRingNbors):
 
-            nDistInRing  = idxMemb2 - idxMemb1
-            nDistFromMat = self.dist(idxAt1,idxAt2)
-
-            if nDistFromMat < nDistInRing:
+      lstSystems = []
+      lstDone = [0] * len(lstRingNbors)
+      for idxStart in range(len(lstRingNbors)):
+         if lstDone[idxStart] or len(lstRingNbors[idxStart]) == 0:
+            continue
+         lstDone[idxStart] = 1
+         lstSystem = [idxStart]
+         for idxAt in lstSystem:   # grows while iterating
+            for idxNbor in lstRingNbors[idxAt]:
+               if not lstDone[idxNbor]:
+                  lstDone[idxNbor] = 1
+                  lstSystem.append(idxNbor)
+         lstSystems.append(lstSystem)
+      return lstSystems
 
-               lstShortcut = []
-               lstShortPaths = self.shortest_paths(idxAt1,idxAt2)
-               if len(lstShortPaths) < 1:
-                  pass # ERROR
-               else:
-                  if nDistFromMat > 1:
-                     lstShortcut = lstShortPaths[0]
-
-               cntNew = 0
-               for idxAtTrial in lstShortcut:
-                  if not idxAtTrial in lstMemb:
-                     cntNew += 1
-
-               isHeadTailPair = 0
-               if (idxAt1 == lstMemb[0] and idxAt2 == lstMemb[idxLast])  or \
-                  (idxAt2 == lstMemb[0] and idxAt1 == lstMemb[idxLast]):
-                  isHeadTailPair = 1
-
-               if cntNew > 0:
-                  lstSmallerRing = lstMemb[0:idxMemb1+1]
-                  lstSmallerRing += lstShortcut
-                  lstSmallerRing += lstMemb[idxMemb2:]   
-                  return (lstSmallerRing)
-               # elif idxAt1 and idxAt2 are adjacent, but not a head-tail pair
-               elif  nDistFromMat == 1 and isHeadTailPair == 0:
-                  lstSmallerRing = lstMemb[0:idxMemb1+1]
-                  lstSmallerRing += lstMemb[idxMemb2:]   
-                  return (lstSmallerRing)               
-      
-            idxMemb2 += 1
+   """------------------------------------------------------------------
+      sssr_ring_system: smallest set of smallest rings of a ring system
+                        (minimum cycle basis, Horton's method):
+         (1) candidate rings: for each root node, take the tree of
+             shortest paths (breadth-first search); each bond (x,y)
+             not in that tree closes the candidate ring
+             root...x-y...root, if the two paths only share the root;
+             a ring is represented by the set of its bonds, coded as
+             bits of a long integer;
+         (2) the number of rings is nBonds - nNodes + 1; rings are
+             taken from the candidates in the order of increasing
+             size, if independent of the rings taken before (Gaussian
+             elimination over GF(2), that is, with XOR of bit sets)
+      return: list of rings, each as list of members in ring order
+   """
+   def sssr_ring_system(self,lstSystem,lstRingNbors):
+
+      # bit for each bond
+      dictBondBit = {}
+      lstBonds = []
+      for idxAt in lstSystem:
+         for idxNbor in lstRingNbors[idxAt]:
+            if idxAt < idxNbor:
+               dictBondBit[(idxAt,idxNbor)] = 1L << len(lstBonds)
+               dictBondBit[(idxNbor,idxAt)] = 1L << len(lstBonds)
+               lstBonds.append((idxAt,idxNbor))
+      nRingsExpected = len(lstBonds) - len(lstSystem) + 1
+
+      # candidate rings: {nBits: nSize}
+      dictCandidates = {}
+      for idxRoot in lstSystem:
+         dictDist   = {idxRoot: 0}
+         dictParent = {idxRoot: -1}
+         dictBranch = {idxRoot: idxRoot} # first node after root on path
+         dictPath   = {idxRoot: 0L}      # bonds of path to root
+         lstQueue = [idxRoot]
+         for idxAt in lstQueue:          # grows while iterating
+            for idxNbor in lstRingNbors[idxAt]:
+               if not dictDist.has_key(idxNbor):
+                  dictDist[idxNbor] = dictDist[idxAt] + 1
+                  dictParent[idxNbor] = idxAt
+                  if idxAt == idxRoot:
+                     dictBranch[idxNbor] = idxNbor
+                  else:
+                     dictBranch[idxNbor] = dictBranch[idxAt]
+                  dictPath[idxNbor] = dictPath[idxAt] | \
+                                      dictBondBit[(idxAt,idxNbor)]
+                  lstQueue.append(idxNbor)
+         for (idxAt1,idxAt2) in lstBonds:
+            if dictParent[idxAt2] == idxAt1 or dictParent[idxAt1] == idxAt2:
+               continue
+            if dictBranch[idxAt1] == dictBranch[idxAt2]:
+               continue
+            nBits = dictPath[idxAt1] | dictPath[idxAt2] | \
+                    dictBondBit[(idxAt1,idxAt2)]
+            dictCandidates[nBits] = dictDist[idxAt1] + dictDist[idxAt2] + 1
+
+      lstCandidates = map(lambda nBits: (dictCandidates[nBits],nBits),
+                          dictCandidates.keys())
+      lstCandidates.sort()
+
+      # independent rings of increasing size
+      lstRings = []
+      dictBasis = {} # {lowest bit: bit set}
+      for (nSize,nBits) in lstCandidates:
+         nReduced = nBits
+         while nReduced:
+            nLowBit = nReduced & -nReduced
+            if dictBasis.has_key(nLowBit):
+               nReduced ^= dictBasis[nLowBit]
+            else:
+               dictBasis[nLowBit] = nReduced
+               lstRings.append(ring_from_bonds(nBits,lstBonds))
+               break
+         if len(lstRings) == nRingsExpected:
+            break
 
-         idxMemb1 += 1
-                    
-      return (lstMemb[:])
+      return lstRings
 
    """------------------------------------------------------------------
       revisit_rings: over all node atoms, sum charge values 
@@ -1278,9 +1735,9 @@ class AnnotatedSmiles:
          # flag aromatic rings and update atom-ring mapping
          isAromat = 1
          for iAtom in lstMemb:
-            if self.lstAromat[iAtom] != 1: 
+            if self.oAtomTable.arrAromat[iAtom] != 1: 
                isAromat = 0
-            self.lstRingMap[iAtom].append(iRing)
+            self.oAtomTable.lstRingMap[iAtom].append(iRing)
             
          self.lstRingAromat.append(isAromat)            
 
@@ -1299,8 +1756,9 @@ class AnnotatedSmiles:
    def local_ring_charge(self, iRing):
       nLocal = 0
       lstMemb = self.lstRings[iRing]
+      arrCharge = self.oAtomTable.arrCharge
       for iAtom in lstMemb:
-         nLocal += self.lstAtCharge[iAtom]
+         nLocal += arrCharge[iAtom]
       return nLocal
 
    """------------------------------------------------------------------
@@ -1316,7 +1774,7 @@ class AnnotatedSmiles:
       lstAnchors = self.aaa_indices()  
       for iAtom in lstMemb:
          if iAtom in lstAnchors:
-            lstCurlies = self.lstAaaEntr[iAtom]
+            lstCurlies = self.oAtomTable.lstAaaEntr[iAtom]
             for oCurly in lstCurlies:          
                dictAnn = oCurly.annotation_dict()
                for sKey in dictAnn.keys():
@@ -1356,8 +1814,7 @@ class AnnotatedSmiles:
       assign: self.nLocal   
    """   
    def sum_local_charges(self):
-      for nCharge in self.lstAtCharge:
-         self.nLocal += nCharge
+      self.nLocal += sum(self.oAtomTable.arrCharge)
    
    """
       sum_deloc_charges: over all node atoms, sum values given by
@@ -1367,7 +1824,7 @@ class AnnotatedSmiles:
    def sum_deloc_charges(self):
 
       iAtom = 0
-      for lstCurlies in self.lstAaaEntr:
+      for lstCurlies in self.oAtomTable.lstAaaEntr:
          for oCurly in lstCurlies:
             # sAM     = oCurly.annotation_marker()
             dictAnn = oCurly.annotation_dict()
@@ -1414,24 +1871,39 @@ class AnnotatedSmiles:
       if self.nHterm > 0:
          dictOfDict['H'] = { 'H': self.nHterm} 
               
-      # 
+      # node atoms: unlabelled ones counted in a vector indexed by
+      # atomic number, labelled ones by labelled symbol
+      arrCount = array.array('l',[0]) * self.oDataFace.numof_atnumbs()
+      lstAtNumbs = [] # atomic numbers in order of first occurrence
       idxAt = 0
-      for sAtSymb in self.lstAtSymb:
-         nLabel   = self.lstAtLabel[idxAt]
-         sLblSymb = sAtSymb
+      arrSymb  = self.oAtomTable.arrSymb
+      arrLabel = self.oAtomTable.arrLabel
+      for nAtNumb in self.oAtomTable.arrNumb:
+         nLabel = arrLabel[idxAt]
          if nLabel > 0:
+            sAtSymb  = lstSymbolPool[arrSymb[idxAt]]
             sLblSymb = '^%d%s' % (nLabel,sAtSymb)            
+            if dictOfDict.has_key(sAtSymb):
+               subdict = dictOfDict[sAtSymb]
+               if subdict.has_key(sLblSymb):
+                  subdict[sLblSymb] = subdict[sLblSymb] + 1
+               else:
+                  subdict[sLblSymb] = 1
+            else:
+               dictOfDict[sAtSymb] = {sLblSymb: 1}
+         else:
+            if arrCount[nAtNumb] == 0:
+               lstAtNumbs.append(nAtNumb)
+            arrCount[nAtNumb] += 1
+         idxAt += 1
 
+      for nAtNumb in lstAtNumbs:
+         sAtSymb = self.oDataFace.symbol_of_atnumb(nAtNumb)
          if dictOfDict.has_key(sAtSymb):
             subdict = dictOfDict[sAtSymb]
-            if subdict.has_key(sLblSymb):
-               subdict[sLblSymb] = subdict[sLblSymb] + 1
-            else:
-               subdict[sLblSymb] = 1
+            subdict[sAtSymb] = subdict.get(sAtSymb,0) + arrCount[nAtNumb]
          else:
-            dictOfDict[sAtSymb] = {sLblSymb: 1}
-
-         idxAt += 1
+            dictOfDict[sAtSymb] = {sAtSymb: arrCount[nAtNumb]}
 
 #      print dictOfDict
 
@@ -1442,7 +1914,7 @@ class AnnotatedSmiles:
       elif nCharge < 0:
          sCharge = '%d-' % ( (-1) * nCharge )
          
-      self.oMf = csm_molform.MolecularFormula(self.oDataFace)
+      self.oMf = csm_pool.oMfPool.acquire(self.oDataFace)
       self.oMf.set_dict_of_dict(dictOfDict,sCharge)
       lstMfErr = self.oMf.evaluate()
       if len(lstMfErr) > 0:
@@ -1462,8 +1934,10 @@ class AnnotatedSmiles:
    """
    def make_atf0(self):
 
+      oAtomTable = self.oAtomTable
       idxAt = 0
-      for sAtSymb in self.lstAtSymb:
+      for nSymbCode in oAtomTable.arrSymb:
+         sAtSymb = lstSymbolPool[nSymbCode]
 
          bSquareBrack = 0 # specifies if SQC encoding is required
 
@@ -1474,8 +1948,8 @@ class AnnotatedSmiles:
          sQuapleBond = ''
          sAromatBond = ''
          sUnspecBond = ''
-         lstBonds = self.dictBonds[idxAt] 
-         for sBond in lstBonds:
+         for iPos in range(self.arrOffset[idxAt],self.arrOffset[idxAt+1]):
+            sBond = sBondSymbols[self.arrBond[iPos]]
             if sBond == '-':
                sSingleBond += '{-}'
             elif sBond == '=':
@@ -1493,30 +1967,32 @@ class AnnotatedSmiles:
                bSquareBrack = 1
 
          # look for open bond contributions in annotations 
-         lstCurlies  = self.lstAaaEntr[idxAt]
+         lstCurlies  = oAtomTable.lstAaaEntr[idxAt]
          for oCurly in lstCurlies:
-            sAM = oCurly.annotation_marker()
-            if self.oDataFace.is_open_single_bond(sAM):
+            tplProps = oCurly.marker_props()
+            sBond = tplProps[csm_dataface.MP_BOND]
+            if sBond == None:
+               continue
+            if sBond == '-':
                sSingleBond += '{-}'
-            elif self.oDataFace.is_open_double_bond(sAM):
+            elif sBond == '=':
                sDoubleBond += '{=}'
-            elif self.oDataFace.is_open_triple_bond(sAM):
+            elif sBond == '#':
                sTripleBond += '{#}'               
-            elif self.oDataFace.is_open_quadruple_bond(sAM):
+            elif sBond == '$':
                sQuapleBond += '{$}'
-               bSquareBrack = 1                
-            elif self.oDataFace.is_open_aromatic_bond(sAM):
+            elif sBond == ':':
                sAromatBond += '{:}'
-               bSquareBrack = 1                
-            elif self.oDataFace.is_open_unspecified_bond(sAM):
+            elif sBond == '~':
                sUnspecBond += '{~}'
-               bSquareBrack = 1                
+            if tplProps[csm_dataface.MP_SQBRACK]:
+               bSquareBrack = 1
 
          # get needed atom attributes
-         nLabel  = self.lstAtLabel[idxAt]
-         nCharge = self.lstAtCharge[idxAt]
-         bAromat = self.lstAromat[idxAt] 
-         nHcount = self.lstHcount[idxAt]
+         nLabel  = oAtomTable.arrLabel[idxAt]
+         nCharge = oAtomTable.arrCharge[idxAt]
+         bAromat = oAtomTable.arrAromat[idxAt] 
+         nHcount = oAtomTable.arrHcount[idxAt]
 
          # generate atomic symbol notation (include label,hcount,charge)
          if (not self.oDataFace.is_in_organic_set(sAtSymb)) or \
@@ -1568,12 +2044,9 @@ class AnnotatedSmiles:
       return: 1 or 0, depending on whether they are or are not.
    """
    def are_connected(self,idxAt1,idxAt2):
-      sPair = '%d,%d' % (idxAt1,idxAt2)
-      if self.dictPairs.has_key(sPair):
-         sBond = self.dictPairs[sPair]
-         if sBond in ['-','=','#','$',':','~']:
-            return 1
-      return 0
+      if self.find_nbor(idxAt1,idxAt2) < 0:
+         return 0
+      return 1
    
    """------------------------------------------------------------------ 
        shortestPaths: find all shortest paths between atoms idxAt1 and
@@ -1585,114 +2058,199 @@ class AnnotatedSmiles:
                           paths between atoms idxAt1 and idxAt2
                           lst = sequence of indexes for atoms starting
                           with idxAt1 neighbor towards idxAt2;
-                          lst is empty if atoms idxAt1 and idxAt2 are
-                          adjacent (or not at all connected via a path)
+                          lstPaths is empty if atoms idxAt1 and idxAt2
+                          are adjacent (or not at all connected via a
+                          path)
                None, if atom indexes out of range         
    """
    def shortest_paths(self,idxAt1,idxAt2):
-      lstPaths = []
-      nDist = self.dist(idxAt1,idxAt2)
-      if nDist < 2:
-         return lstPaths # return empty list if adjacent
-      else:
-         """
-             start with all adjacent atoms, for which the distance to
-             atom idxAt2 is less that the idxAt1-idxAt2 distance
-         """
-         if self.dictNbors.has_key(idxAt1):
-            lstNbors =  self.dictNbors[idxAt1]
-            for iNbor in lstNbors:
-               if self.dist(iNbor,idxAt2) < nDist: 
-                  lstGrowingPath =  [iNbor]
-                  lstPaths.append(lstGrowingPath)
+      if not self.is_node_pair(idxAt1,idxAt2,'shortest_paths'):
+         return None
+      return list(self.iter_shortest_paths(idxAt1,idxAt2))
+
+   """------------------------------------------------------------------ 
+       iter_shortest_paths: generate the shortest paths between atoms
+                            idxAt1 and idxAt2 one at a time, in the
+       order of shortest_paths, without holding all of them: one
+       breadth-first search from idxAt2 gives the distance of each
+       node to idxAt2; a path is extended from idxAt1 by depth-first
+       search along neighbors one step closer to idxAt2.
+       The yielded list is a new list for each path. 
+   """
+   def iter_shortest_paths(self,idxAt1,idxAt2):
+      if not self.is_node_pair(idxAt1,idxAt2,'iter_shortest_paths'):
+         return
+      lstNborRows = self.nbor_rows()
+      lstDist = self.bfs_distances(idxAt2,lstNborRows)
+      nDist = lstDist[idxAt1]
+      if nDist < 2 or nDist >= self.nAtoms: # adjacent or not connected
+         return
+
+      lstPath = []               # growing path (without end atoms)
+      lstIters = [iter(lstNborRows[idxAt1])] # neighbors still to try
+      while lstIters:
+         nDistNext = nDist - len(lstPath) - 1
+         idxNext = -1
+         for idxNbor in lstIters[-1]:
+            if lstDist[idxNbor] == nDistNext:
+               idxNext = idxNbor
+               break
+         if idxNext < 0:          # no more neighbors: step back
+            del lstIters[-1]
+            if lstPath:
+               del lstPath[-1]
+            continue
+         lstPath.append(idxNext)
+         if nDistNext == 1:       # next to idxAt2: path complete
+            yield lstPath[:]
+            del lstPath[-1]
          else:
-            return None
-      """
-         For distance nDist between atoms idxAt1 and idxAt2 the number
-         of atoms in the shortest-path-sequence is nDist-1.
-      """
-      for k in range(nDist-1):
-         lstPathsTemp = []
-         for lstGrowingPath in lstPaths:
-            lenPath = len(lstGrowingPath) 
-            iEnd = lstGrowingPath[lenPath-1]
-            if self.dictNbors.has_key(iEnd):
-               lstEndNbors = self.dictNbors[iEnd]
-               for iEndNbor in lstEndNbors:
-                  if iEndNbor == iEnd:     # skip backward path
-                     continue
-                  elif iEndNbor == idxAt2: # obtain shortest path
-                     lstPathsTemp.append(lstGrowingPath)
-                  elif self.dist(iEndNbor,idxAt2) > nDist-(k+2): 
-                     continue              # reject any longer path
-                  else:                   
-                     if k < nDist-2:       # still growing
-                        lst = lstGrowingPath[:]
-                        lst.append(iEndNbor)
-                        lstPathsTemp.append(lst)
-            else:
-               # FATAL ERROR: bail out
-               sMsg  = 'csm_subnotation.shortestPaths: atom with index ' 
-               sMsg += '%d not in dictNbors while searching %d-%d paths'\
-                       % (iEnd,idxAt1,idxAt2)
-               self.lstErrors.append(sMsg)             
-               return None
-         lstPaths = lstPathsTemp
-      return lstPaths
+            lstIters.append(iter(lstNborRows[idxNext]))
+
+   """------------------------------------------------------------------ 
+       count_shortest_paths: count the shortest paths between atoms
+                             idxAt1 and idxAt2 without enumerating them
+       (from lstPathCountMat, if made, otherwise by one breadth-first
+        search from idxAt1, see bfs_path_counts)
+       return: number of shortest paths (1 if idxAt1 equals idxAt2,
+               0 if not connected), None if atom indexes out of range 
+   """
+   def count_shortest_paths(self,idxAt1,idxAt2):
+      if not self.is_node_pair(idxAt1,idxAt2,'count_shortest_paths'):
+         return None
+      if idxAt1 == idxAt2:
+         return 1
+      if self.bPathCountMat:
+         return long(self.lstPathCountMat.get(idxAt1,idxAt2))
+      (lstDist,lstCount) = self.bfs_path_counts(idxAt1)
+      return lstCount[idxAt2]
+
+   """------------------------------------------------------------------ 
+       is_node_pair: check that idxAt1 and idxAt2 are node indexes of
+                     the molecular graph; report to lstErrors if not,
+                     naming the calling method sCaller
+       return: 1 or 0
+   """
+   def is_node_pair(self,idxAt1,idxAt2,sCaller):
+      nNodes = len(self.arrDegree)
+      if 0 <= idxAt1 < nNodes and 0 <= idxAt2 < nNodes:
+         return 1
+      sErr  = "%s(%d,%d): exceeding " % (sCaller,idxAt1,idxAt2)
+      sErr += 'allowed index range for nNodes=%d' % nNodes
+      self.lstErrors.append(sErr)
+      return 0
 
    #===================================================================#
    # ACCESS members (instead of direct access)                         #
    #===================================================================#
    def get_sAnnSmi(self):       return self.sAnnSmi
-   def get_lstTokens(self):     return self.lstTokens 
-   def get_lstTokTyp(self):     return self.lstTokTyp 
-   def get_lstDepth(self):      return self.lstDepth  
-   def get_maxDepth(self):      return self.maxDepth  
+   def get_lstTokens(self):
+      self.ensure_tokens()
+      return self.lstTokens
+   def get_lstTokTyp(self):
+      self.ensure_tokens()
+      return self.lstTokTyp
+   def get_lstDepth(self):
+      self.ensure_tokens()
+      return self.lstDepth
+   def get_maxDepth(self):
+      self.ensure_tokens()
+      return self.maxDepth
    def get_nNodes(self):        return self.nNodes
    def get_nAtoms(self):        return self.nAtoms
    def get_nHterm(self):        return self.nHterm 
    def get_nAhold(self):        return self.nAhold     
-   def get_nRings(self):        return self.nRings
+   def get_nRings(self):
+      self.ensure_rings()
+      return self.nRings
    def get_nLocal(self):        return self.nLocal    
    def get_nDeloc(self):        return self.nDeloc 
-   def get_lstAtSymb(self):     return self.lstAtSymb  
-   def get_lstAtNumb(self):     return self.lstAtNumb   
-   def get_lstAtLabel(self):    return self.lstAtLabel 
-   def get_lstAtCharge(self):   return self.lstAtCharge  
-   def get_lstAtDepth(self):    return self.lstAtDepth     
-   def get_lstAromat(self):     return self.lstAromat
-   def get_lstAaaEntr(self):    return self.lstAaaEntr
-   def get_lstHcount(self):     return self.lstHcount
-   def get_lstNbors(self):      return self.lstNbors
-   def get_lstNvbors(self):     return self.lstNvbors
-   def get_lstRingMap(self):    return self.lstRingMap  
+   def get_oAtomTable(self):    return self.oAtomTable
+   def get_lstAtSymb(self):     return self.atom_view('symb_view')
+   def get_lstAtNumb(self):     return self.atom_column('arrNumb')
+   def get_lstAtLabel(self):    return self.atom_view('label_view')
+   def get_lstAtCharge(self):   return self.atom_column('arrCharge')
+   def get_lstAtDepth(self):    return self.atom_column('arrDepth')
+   def get_lstAromat(self):     return self.atom_column('arrAromat')
+   def get_lstAaaEntr(self):    return self.atom_column('lstAaaEntr')
+   def get_lstHcount(self):     return self.atom_view('hcount_view')
+   def get_lstNbors(self):      return self.atom_column('arrNbors')
+   def get_lstNvbors(self):     return self.atom_column('arrNvbors')
+   def get_lstRingMap(self):
+      if self.oAtomTable == None:
+         return None
+      self.ensure_rings()
+      return self.oAtomTable.lstRingMap
    def get_lstCaaEntr(self):    return self.lstCaaEntr
    def get_lstAtf0(self):       return self.lstAtf0      
-   def get_dictNbors(self):     return self.dictNbors 
-   def get_dictBonds(self):     return self.dictBonds 
-   def get_dictPairs(self):     return self.dictPairs 
-   def get_lstRingLength(self): return self.lstRingLength 
-   def get_lstRingAromat(self): return self.lstRingAromat
-   def get_lstRingCharge(self): return self.lstRingCharge
-   def get_lstRings(self):      return self.lstRings
-   def get_lstIdxMat(self):     return self.lstIdxMat
-   def get_lstAdjMat(self):     return self.lstAdjMat
-   def get_lstDistMat(self):    return self.lstDistMat 
+   def get_dictNbors(self):
+      self.make_dicts()
+      return self.dictNbors
+   def get_dictBonds(self):
+      self.make_dicts()
+      return self.dictBonds
+   def get_dictPairs(self):
+      self.make_dicts()
+      return self.dictPairs
+   def get_lstRingLength(self):
+      self.ensure_rings()
+      return self.lstRingLength
+   def get_lstRingAromat(self):
+      self.ensure_rings()
+      return self.lstRingAromat
+   def get_lstRingCharge(self):
+      self.ensure_rings()
+      return self.lstRingCharge
+   def get_lstRings(self):
+      self.ensure_rings()
+      return self.lstRings
+   def get_lstIdxMat(self):
+      self.ensure_adj_mat()
+      return self.lstIdxMat
+   def get_lstAdjMat(self):
+      self.ensure_adj_mat()
+      return self.lstAdjMat
+   def get_lstDistMat(self):
+      self.ensure_dist_mat()
+      return self.lstDistMat
+   def get_lstPathCountMat(self):
+      self.ensure_path_count_mat()
+      return self.lstPathCountMat
    def get_lstErrors(self):     return self.lstErrors
 
    #===================================================================#
    # ACCESS molecular-graph data by atom list methods                  #
+   #   (columns of self.oAtomTable, without copy: typed arrays for     #
+   #    numeric values, AtomColumnView for symbols, isotope labels and #
+   #    H-counts, which may be None; None before parsing)             #
    #===================================================================#
    def atf0(self):          return self.lstAtf0
-   def atoms_aromat(self):  return self.lstAromat
-   def atoms_charge(self):  return self.lstAtCharge
-   def atoms_label(self):   return self.lstAtLabel    
-   def atoms_hcount(self):  return self.lstHcount  
-   def atoms_nbors(self):   return self.lstNbors
-   def atoms_nvbors(self):  return self.lstNvbors   
-   def atoms_numb(self):    return self.lstAtNumb   
-   def atoms_symb(self):    return self.lstAtSymb
-   def atoms_nvbors(self):  return self.lstNvbors   
+   def atoms_aromat(self):  return self.atom_column('arrAromat')
+   def atoms_charge(self):  return self.atom_column('arrCharge')
+   def atoms_label(self):   return self.atom_view('label_view')
+   def atoms_hcount(self):  return self.atom_view('hcount_view')
+   def atoms_nbors(self):   return self.atom_column('arrNbors')
+   def atoms_nvbors(self):  return self.atom_column('arrNvbors')
+   def atoms_numb(self):    return self.atom_column('arrNumb')
+   def atoms_symb(self):    return self.atom_view('symb_view')
+
+   """------------------------------------------------------------------   
+      atom_column: column sColumn of self.oAtomTable (None if there is
+                   no atom table, since the notation was not parsed)
+   """   
+   def atom_column(self,sColumn):
+      if self.oAtomTable == None:
+         return None
+      return getattr(self.oAtomTable,sColumn)
+
+   """------------------------------------------------------------------   
+      atom_view: view returned by method sView of self.oAtomTable
+                 (None if there is no atom table, see atom_column)
+   """   
+   def atom_view(self,sView):
+      if self.oAtomTable == None:
+         return None
+      return getattr(self.oAtomTable,sView)()
 
 
    #===================================================================#
@@ -1710,7 +2268,7 @@ class AnnotatedSmiles:
    """
    def aaa_entries(self,iuAtom):
       if iuAtom > 0 and iuAtom <= self.nNodes:
-         lstObj =  self.lstAaaEntr[iuAtom-1]
+         lstObj =  self.oAtomTable.lstAaaEntr[iuAtom-1]
          lstEntries = []
          for oCurly in lstObj:
             lstEntries.append(oCurly.entry())
@@ -1727,7 +2285,7 @@ class AnnotatedSmiles:
    def aaa_indices(self):
       lstIndices = []
       iAtom = 0
-      for lst in self.lstAaaEntr:
+      for lst in self.oAtomTable.lstAaaEntr:
          if len(lst) > 0:
             lstIndices.append(iAtom)
          iAtom += 1
@@ -1742,7 +2300,7 @@ class AnnotatedSmiles:
    def aaa_indices_iu(self):
       lstIndices = []
       iAtom = 0
-      for lst in self.lstAaaEntr:
+      for lst in self.oAtomTable.lstAaaEntr:
          if len(lst) > 0:
             lstIndices.append(iAtom+1)
          iAtom += 1
@@ -1757,10 +2315,14 @@ class AnnotatedSmiles:
 
    """------------------------------------------------------------------   
       rings: get list of list with indices of ring members
-                (indices between (including) 0 and self.nAtoms-1)
+                (indices between (including) 0 and self.nAtoms-1),
+                sorted by member lists (see make_rings); entries of
+                lstRingLength and lstRingAromat, and ring indexes in
+                lstRingMap, refer to this order
       return:   self.lstRings
    """   
    def rings(self):
+      self.ensure_rings()
       return self.lstRings
 
 
@@ -1770,6 +2332,7 @@ class AnnotatedSmiles:
       return:   self.lstRings_iu
    """   
    def rings_iu(self):
+      self.ensure_rings()
       lstRings_iu = []
       for lstMemb in self.lstRings:
          lstMemb_iu = []
@@ -1784,17 +2347,49 @@ class AnnotatedSmiles:
       return: sBond
    """   
    def atpair_bond(self,iu,ju):
-      sPair = '%d,%d' % (iu-1,ju-1)
-      if self.dictPairs.has_key(sPair):
-         return self.dictPairs[sPair]
-      else:
+      iPos = self.find_nbor(iu-1,ju-1)
+      if iPos < 0:
          return None
+      else:
+         return sBondSymbols[self.arrBond[iPos]]
+
+   """------------------------------------------------------------------   
+      adj_matrix: get adjacency matrix: TriangularMatrix (as returned
+                  by get_lstAdjMat) or, with numpy backend, dense
+                  numpy array (uint16 unless nAtoms > 65535), also
+                  see dmat
+   """   
+   def adj_matrix(self):
+      if self.sBackend == 'numpy' and self.bTopoReady:
+         return self.dense_adj_mat()
+      self.ensure_adj_mat()
+      return self.lstAdjMat
+
+   """------------------------------------------------------------------   
+      graph: get molecular graph of node atoms in compressed sparse
+             row format (arrays indexed from 0); neighbors of node
+             idxAt are arrNbor[arrOffset[idxAt]:arrOffset[idxAt+1]],
+             arrBond holds the codes for the bonds to these neighbors
+             (index of bond symbol in csm_annsmi.sBondSymbols)
+      return: (arrOffset,arrNbor,arrBond,arrDegree)
+   """   
+   def graph(self):
+      return (self.arrOffset,self.arrNbor,self.arrBond,self.arrDegree)
    
    def deloc_charge(self): return self.nDeloc 
-   def dmat(self):         return self.lstDistMat
+   def dmat(self):
+      if self.sBackend == 'numpy' and self.bTopoReady:
+         return self.dense_dist_mat()
+      self.ensure_dist_mat()
+      return self.lstDistMat
+   def pcmat(self):
+      self.ensure_path_count_mat()
+      return self.lstPathCountMat
    def numof_atoms(self):  return self.nAtoms   
    def numof_nodes(self):  return self.nNodes
-   def numof_rings(self):  return self.nRings   
+   def numof_rings(self):
+      self.ensure_rings()
+      return self.nRings
    def msgs_err(self):     return self.lstErrors
 
    #===================================================================#
@@ -1807,4 +2402,530 @@ class AnnotatedSmiles:
    def mf_charge_notation(self):    return self.oMf.charge_notation()
    def mf_charge_number(self):      return self.oMf.charge_number()
    def mf_msgs_err(self):           return self.oMf.msgs_err()
-   
+   def mf_object(self):             return self.oMf
+
+
+#======================================================================#
+# RINGS                                                                #
+#======================================================================#
+"""
+   ring_from_bonds: turn a ring given as bit set of bonds (bit k for
+                    bond lstBonds[k] = (idxAt1,idxAt2)) into the list
+   of its members in ring order, starting with the lowest index and
+   continuing with its lower-index neighbor
+"""
+def ring_from_bonds(nBits,lstBonds):
+   dictRingNbors = {}
+   k = 0
+   while nBits:
+      if nBits & 1:
+         (idxAt1,idxAt2) = lstBonds[k]
+         dictRingNbors.setdefault(idxAt1,[]).append(idxAt2)
+         dictRingNbors.setdefault(idxAt2,[]).append(idxAt1)
+      nBits >>= 1
+      k += 1
+
+   idxFirst = min(dictRingNbors.keys())
+   lstMemb = [idxFirst]
+   idxPrev = idxFirst
+   idxAt = min(dictRingNbors[idxFirst])
+   while idxAt != idxFirst:
+      lstMemb.append(idxAt)
+      (idxNext1,idxNext2) = dictRingNbors[idxAt]
+      if idxNext1 == idxPrev:
+         (idxPrev,idxAt) = (idxAt,idxNext2)
+      else:
+         (idxPrev,idxAt) = (idxAt,idxNext1)
+   return lstMemb
+
+#======================================================================#
+# MATRIX BACKEND                                                       #
+#======================================================================#
+"""
+   set_matrix_backend: select matrix backend for AnnotatedSmiles
+                       objects created from here on:
+      'array' = adjacency and distance matrices as TriangularMatrix
+                objects (default)
+      'numpy' = dmat() and adj_matrix() return dense numpy arrays;
+                distances computed by vectorized frontier expansion
+                (requires NumPy)
+   return: 1 if successful, 0 otherwise (unknown backend or NumPy
+           not installed)
+"""
+def set_matrix_backend(sBackend):
+   global sMatrixBackend
+   if sBackend == 'numpy' and numpy == None:
+      return 0
+   elif sBackend not in ['array','numpy']:
+      return 0
+   sMatrixBackend = sBackend
+   return 1
+
+#======================================================================#
+# DENSE matrices (numpy backend)                                       #
+#======================================================================#
+"""
+   dense_dtype: numpy type for dense matrices of a structure with
+                nAtoms atoms (uint16 as far as possible)
+"""
+def dense_dtype(nAtoms):
+   if nAtoms > 65535:
+      return numpy.uint32
+   return numpy.uint16
+
+"""
+   dense_distances: compute topological distances from (a stack of)
+                    dense adjacency matrices by frontier expansion:
+      the frontier of nodes at distance d+1 is obtained for all start
+      nodes at once as boolean product of the frontier at distance d
+      with the adjacency matrix, minus the nodes reached before
+
+      matAdj: array of shape (n,n) or (nStack,n,n), entries > 0 for
+              bound node pairs
+      nUnreached: distance value for nodes that cannot be reached
+   return: matDist, array with the same shape as matAdj
+"""
+def dense_distances(matAdj,nUnreached):
+   nOrder = matAdj.shape[-1]
+   arrDiag = numpy.arange(nOrder)
+   matStep = (matAdj > 0).astype(numpy.float32)
+   matReached = numpy.zeros(matAdj.shape,numpy.bool_)
+   matReached[...,arrDiag,arrDiag] = True
+   matFront = matReached.astype(numpy.float32)
+   matDist = numpy.empty(matAdj.shape,dense_dtype(nUnreached))
+   matDist.fill(nUnreached)
+   matDist[...,arrDiag,arrDiag] = 0
+   nDist = 0
+   while 1:
+      nDist += 1
+      matNext = numpy.matmul(matFront,matStep) > 0
+      matNext &= ~matReached
+      if not matNext.any():
+         break
+      matDist[matNext] = nDist
+      matReached |= matNext
+      matFront = matNext.astype(numpy.float32)
+   return matDist
+
+"""
+   triangular_from_dense: return TriangularMatrix with the upper
+                          triangle of dense matrix matDense
+"""
+def triangular_from_dense(matDense,sTypeCode):
+   nOrder = matDense.shape[0]
+   oMat = TriangularMatrix(nOrder,sTypeCode)
+   arrUpper = matDense[numpy.triu_indices(nOrder,1)]
+   oMat.arrData = array.array(sTypeCode)
+   oMat.arrData.fromstring(
+      arrUpper.astype('u%d' % oMat.arrData.itemsize).tobytes())
+   return oMat
+
+"""
+   batch_matrices: make dense adjacency and distance matrices for a
+                   list of parsed AnnotatedSmiles objects in one call;
+      components are sorted by size and stacked (zero-padded) in
+      chunks of nChunk, and the distances of each chunk are computed
+      with one frontier expansion; the matrices are kept in each
+      object (returned by later calls of adj_matrix and dmat with
+      numpy backend). Without NumPy, the matrices returned by
+      adj_matrix() and dmat() of each object are collected instead.
+   return: [(matAdj,matDist),...] in the order of lstObjSmi
+           ((None,None) for objects without complete molecular graph)
+"""
+def batch_matrices(lstObjSmi,nChunk=256):
+
+   if numpy == None:
+      return map(lambda oSmi: (oSmi.adj_matrix(),oSmi.dmat()), lstObjSmi)
+
+   lstMatrices = [(None,None)] * len(lstObjSmi)
+   lstOrder = filter(lambda i: lstObjSmi[i].bTopoReady,
+                     range(len(lstObjSmi)))
+   lstOrder.sort(key=lambda i: len(lstObjSmi[i].arrDegree))
+
+   for iStart in range(0,len(lstOrder),nChunk):
+      lstChunk = lstOrder[iStart:iStart+nChunk]
+      nMax = max(map(lambda i: len(lstObjSmi[i].arrDegree), lstChunk))
+      nMaxAtoms = max(map(lambda i: lstObjSmi[i].nAtoms, lstChunk))
+      nUnreached = max(nMax,nMaxAtoms)
+      tnsAdj = numpy.zeros((len(lstChunk),nMax,nMax),
+                           dense_dtype(nUnreached))
+      iStack = 0
+      for i in lstChunk:
+         matAdj = lstObjSmi[i].dense_adj_mat()
+         nNodes = matAdj.shape[0]
+         tnsAdj[iStack,:nNodes,:nNodes] = matAdj
+         iStack += 1
+      tnsDist = dense_distances(tnsAdj,nUnreached)
+
+      iStack = 0
+      for i in lstChunk:
+         oSmi = lstObjSmi[i]
+         nNodes = len(oSmi.arrDegree)
+         matDist = tnsDist[iStack,:nNodes,:nNodes].astype(
+                      dense_dtype(oSmi.nAtoms))
+         matDist[matDist == nUnreached] = oSmi.nAtoms
+         oSmi.matDist = matDist
+         lstMatrices[i] = (oSmi.matAdj,matDist)
+         iStack += 1
+
+   return lstMatrices
+
+#======================================================================#
+# SERIALIZED upper triangle of a symmetric matrix                      #
+#======================================================================#
+"""
+   triangle_index: return index k of entry (i,j), i < j, in the
+                   row-wise serialized upper triangle (diagonal
+                   excluded) of a square matrix of order nOrder
+
+   EXAMPLE: nOrder = 4
+            (i,j): (0,1) (0,2) (0,3) (1,2) (1,3) (2,3)
+            k:       0     1     2     3     4     5
+"""
+def triangle_index(nOrder,i,j):
+   return (i*(2*nOrder-i-1))/2 + j-i-1
+
+"""
+   triangle_pair: inverse of triangle_index
+   return: (i,j) for index k of the serialized upper triangle
+"""
+def triangle_pair(nOrder,k):
+   n2 = 2*nOrder-1
+   i = int((n2 - math.sqrt(n2*n2 - 8*k))/2)
+   # guard against rounding of the square root
+   while i > 0 and (i*(n2-i))/2 > k:
+      i -= 1
+   while ((i+1)*(n2-i-1))/2 <= k:
+      i += 1
+   return (i,k-(i*(n2-i))/2+i+1)
+
+class TriangularMatrix:
+   """
+      TriangularMatrix: serialized upper triangle (diagonal excluded)
+                        of a symmetric square matrix of order nOrder,
+      stored in a typed array ('B' for adjacency, 'H' for distances).
+      Entries are addressed with the serial index k (as with the lists
+      previously used for lstAdjMat and lstDistMat, so indexing,
+      slicing, len() and iteration work unchanged) or with a pair of
+      row and column indexes via get(i,j) and set(i,j,nValue).
+   """
+   def __init__(self,nOrder,sTypeCode='H',nInit=0):
+      self.nOrder = nOrder
+      nEntries = 0
+      if nOrder > 1:
+         nEntries = (nOrder*(nOrder-1))/2
+      self.arrData = array.array(sTypeCode,[nInit]) * nEntries
+
+   def __len__(self):           return len(self.arrData)
+   def __iter__(self):          return iter(self.arrData)
+   def __getitem__(self,k):     return self.arrData[k]
+   def __setitem__(self,k,nValue): self.arrData[k] = nValue
+   def __repr__(self):
+      return 'TriangularMatrix(%d,%r)' % (self.nOrder,self.arrData.tolist())
+
+   """------------------------------------------------------------------
+      get: return entry for row i and column j (0 on the diagonal)
+   """
+   def get(self,i,j):
+      if i < j:
+         return self.arrData[triangle_index(self.nOrder,i,j)]
+      elif i > j:
+         return self.arrData[triangle_index(self.nOrder,j,i)]
+      else:
+         return 0
+
+   """------------------------------------------------------------------
+      set: assign entry for row i and column j (i != j)
+   """
+   def set(self,i,j,nValue):
+      if i < j:
+         self.arrData[triangle_index(self.nOrder,i,j)] = nValue
+      else:
+         self.arrData[triangle_index(self.nOrder,j,i)] = nValue
+
+   """------------------------------------------------------------------
+      set_row: assign the entries (i,i+1),...,(i,nOrder-1) from the
+               sequence seqValues
+   """
+   def set_row(self,i,seqValues):
+      k = triangle_index(self.nOrder,i,i+1)
+      self.arrData[k:k+self.nOrder-i-1] = \
+         array.array(self.arrData.typecode,seqValues)
+
+   """------------------------------------------------------------------
+      row: return entries (i,0),...,(i,nOrder-1) of full row i
+   """
+   def row(self,i):
+      lstRow = []
+      for j in range(self.nOrder):
+         lstRow.append(self.get(i,j))
+      return lstRow
+
+   def typecode(self): return self.arrData.typecode
+   def tolist(self):   return self.arrData.tolist()
+
+class TriangularIndexView:
+   """
+      TriangularIndexView: read-only sequence of the (i,j) pairs,
+                           i < j, for the serial indexes of a
+      TriangularMatrix of order nOrder; pairs are computed on access
+      instead of being stored.
+   """
+   def __init__(self,nOrder):
+      self.nOrder = nOrder
+
+   def __len__(self):
+      if self.nOrder < 2:
+         return 0
+      return (self.nOrder*(self.nOrder-1))/2
+
+   def __getitem__(self,k):
+      nLen = len(self)
+      if isinstance(k,slice):
+         lstPairs = []
+         for kk in range(*k.indices(nLen)):
+            lstPairs.append(triangle_pair(self.nOrder,kk))
+         return lstPairs
+      if k < 0:
+         k += nLen
+      if k < 0 or k >= nLen:
+         raise IndexError('TriangularIndexView index out of range')
+      return triangle_pair(self.nOrder,k)
+
+   def __iter__(self):
+      for i in range(self.nOrder-1):
+         for j in range(i+1,self.nOrder):
+            yield (i,j)
+
+   def index(self,pair):
+      (i,j) = pair
+      if i < 0 or j >= self.nOrder or i >= j:
+         raise ValueError('%r not in TriangularIndexView' % (pair,))
+      return triangle_index(self.nOrder,i,j)
+
+#======================================================================#
+# COLUMNAR atom table                                                  #
+#======================================================================#
+"""
+   lstSymbolPool, dictSymbolCode: atomic symbols interned for all
+                                  AtomTable objects (code = index in
+   lstSymbolPool)
+"""
+lstSymbolPool  = []
+dictSymbolCode = {}
+
+"""
+   symbol_code: return code of atomic symbol sAtSymb (added to the
+                pool if new)
+"""
+def symbol_code(sAtSymb):
+   if dictSymbolCode.has_key(sAtSymb):
+      return dictSymbolCode[sAtSymb]
+   nCode = len(lstSymbolPool)
+   lstSymbolPool.append(intern(sAtSymb))
+   dictSymbolCode[sAtSymb] = nCode
+   return nCode
+
+class AtomTable:
+   """
+      AtomTable: node-atom attributes of an AnnotatedSmiles object, one
+                 column per attribute and one row per node atom.
+      Numeric columns are typed arrays:
+         arrSymb   ('H') code of atomic symbol (see symbol_code)
+         arrNumb   ('B') atomic number
+         arrLabel  ('i') isotope label, nUnassigned if none
+         arrCharge ('h') charge value
+         arrDepth  ('i') nesting depth
+         arrAromat ('b') 1 = aromatic-ring atom, 0 otherwise
+         arrHcount ('h') number of adjacent non-node H-atoms,
+                         nUnassigned if not (yet) assigned
+         arrNbors  ('h') number of neighbor nodes and
+         arrNvbors ('h') number of valence bonds to neighbor nodes (both
+                         assigned as a whole by AnnotatedSmiles.
+                         count_tonode_valence_bonds)
+      lstAaaEntr and lstRingMap hold one list per row (CurlyAnnotation
+      objects of atom-anchored annotations and indices of the rings the
+      atom is a member of).
+      The columns filled by add_atom are allocated for nCapacity rows
+      and doubled in size when full; trim() cuts them to the number of
+      rows, after which the arrays can be handed out without copying.
+   """
+   lstRowColumns = ['arrSymb','arrNumb','arrLabel','arrCharge','arrDepth',
+                    'arrAromat','arrHcount']
+
+   def __init__(self,nCapacity=16):
+      self.nRows     = 0
+      self.nCapacity = max(1,nCapacity)
+      self.arrSymb   = array.array('H',[0])  * self.nCapacity
+      self.arrNumb   = array.array('B',[0])  * self.nCapacity
+      self.arrLabel  = array.array('i',[nUnassigned]) * self.nCapacity
+      self.arrCharge = array.array('h',[0])  * self.nCapacity
+      self.arrDepth  = array.array('i',[0])  * self.nCapacity
+      self.arrAromat = array.array('b',[0])  * self.nCapacity
+      self.arrHcount = array.array('h',[nUnassigned]) * self.nCapacity
+      self.arrNbors  = array.array('h')
+      self.arrNvbors = array.array('h')
+      self.lstAaaEntr = []
+      self.lstRingMap = []
+
+   def __len__(self):  return self.nRows
+
+   """------------------------------------------------------------------
+      add_atom: append row for node atom (nLabel and nHcount may be
+                None)
+      return: row index
+   """
+   def add_atom(self,sAtSymb,nAtNumb,nLabel,nCharge,nDepth,bAromat,nHcount):
+      if self.nRows == self.nCapacity:
+         self.grow()
+      i = self.nRows
+      nCode = dictSymbolCode.get(sAtSymb)
+      if nCode == None:
+         nCode = symbol_code(sAtSymb)
+      self.arrSymb[i]   = nCode
+      self.arrNumb[i]   = nAtNumb
+      if nLabel != None:
+         self.arrLabel[i] = nLabel
+      self.arrCharge[i] = nCharge
+      self.arrDepth[i]  = nDepth
+      self.arrAromat[i] = bAromat
+      if nHcount != None:
+         self.arrHcount[i] = nHcount
+      self.lstAaaEntr.append([])
+      self.lstRingMap.append([])
+      self.nRows += 1
+      return i
+
+   """------------------------------------------------------------------
+      grow: double capacity of the columns filled by add_atom
+   """
+   def grow(self):
+      for sColumn in self.lstRowColumns:
+         arrColumn = getattr(self,sColumn)
+         nDefault = 0
+         if sColumn in ['arrLabel','arrHcount']:
+            nDefault = nUnassigned
+         arrColumn.extend(array.array(arrColumn.typecode,[nDefault]) *
+                          self.nCapacity)
+      self.nCapacity *= 2
+
+   """------------------------------------------------------------------
+      clear: remove all rows, keeping the columns for reuse
+   """
+   def clear(self):
+      self.arrLabel[:self.nRows]  = array.array('i',[nUnassigned]) * self.nRows
+      self.arrHcount[:self.nRows] = array.array('h',[nUnassigned]) * self.nRows
+      del self.arrNbors[:]
+      del self.arrNvbors[:]
+      del self.lstAaaEntr[:]
+      del self.lstRingMap[:]
+      self.nRows = 0
+
+   """------------------------------------------------------------------
+      trim: cut the columns filled by add_atom to the number of rows
+   """
+   def trim(self):
+      if self.nCapacity == self.nRows:
+         return
+      for sColumn in self.lstRowColumns:
+         del getattr(self,sColumn)[self.nRows:]
+      self.nCapacity = self.nRows
+
+   """------------------------------------------------------------------
+      symb, label, hcount: values of row i (label and hcount None if
+                           not assigned)
+   """
+   def symb(self,i):
+      return lstSymbolPool[self.arrSymb[i]]
+   def label(self,i):
+      return decode_unassigned(self.arrLabel[i])
+   def hcount(self,i):
+      return decode_unassigned(self.arrHcount[i])
+
+   """------------------------------------------------------------------
+      symb_view, label_view, hcount_view: columns as sequences of
+                                          atomic symbols, isotope
+      labels and H-counts (None if not assigned), decoded on access
+   """
+   def symb_view(self):
+      return AtomColumnView(self.arrSymb,self.nRows,lstSymbolPool.__getitem__)
+   def label_view(self):
+      return AtomColumnView(self.arrLabel,self.nRows,decode_unassigned)
+   def hcount_view(self):
+      return AtomColumnView(self.arrHcount,self.nRows,decode_unassigned)
+
+   """------------------------------------------------------------------
+      column: typed array of column sColumn (such as 'arrCharge'), not
+              a copy
+   """
+   def column(self,sColumn):
+      return getattr(self,sColumn)
+
+   """------------------------------------------------------------------
+      nbytes: number of bytes taken by the typed-array columns
+   """
+   def nbytes(self):
+      nBytes = 0
+      for sColumn in self.lstRowColumns + ['arrNbors','arrNvbors']:
+         arrColumn = getattr(self,sColumn)
+         nBytes += len(arrColumn) * arrColumn.itemsize
+      return nBytes
+
+"""
+   decode_unassigned: None for column value nUnassigned
+"""
+def decode_unassigned(nValue):
+   if nValue == nUnassigned:
+      return None
+   return nValue
+
+class AtomColumnView:
+   """
+      AtomColumnView: read-only sequence of the first nRows entries
+                      of a typed AtomTable column, decoded on access
+      with fnDecode (as with the lists previously used for lstAtSymb,
+      lstAtLabel and lstHcount, so indexing, slicing, len(), iteration
+      and comparison with lists work unchanged)
+   """
+   def __init__(self,arrColumn,nRows,fnDecode):
+      self.arrColumn = arrColumn
+      self.nRows     = nRows
+      self.fnDecode  = fnDecode
+
+   def __len__(self):  return self.nRows
+
+   def __getitem__(self,k):
+      if isinstance(k,slice):
+         return map(self.fnDecode,
+                    self.arrColumn[slice(*k.indices(self.nRows))])
+      if k < 0:
+         k += self.nRows
+      if k < 0 or k >= self.nRows:
+         raise IndexError('AtomColumnView index out of range')
+      return self.fnDecode(self.arrColumn[k])
+
+   def __iter__(self):
+      fnDecode = self.fnDecode
+      arrColumn = self.arrColumn
+      for k in range(self.nRows):
+         yield fnDecode(arrColumn[k])
+
+   def __eq__(self,other):
+      try:
+         return self.tolist() == list(other)
+      except TypeError:
+         return 0
+   def __ne__(self,other):
+      return not self.__eq__(other)
+   def __repr__(self):
+      return 'AtomColumnView(%r)' % self.tolist()
+
+   def tolist(self):
+      return map(self.fnDecode,self.arrColumn[:self.nRows])
+
+"""
+   oSmilesPool: process-wide pool of AnnotatedSmiles objects, recycled
+                by Notation objects for SMILES components that no
+   cache refers to (see Notation.reset)
+"""
+oSmilesPool = csm_pool.ObjectPool(AnnotatedSmiles,16)
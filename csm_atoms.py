@@ -8,7 +8,10 @@
 
    Python module csm_atoms is intended to be used to
    look-up atomic data in the context of SMILES and
-   CurlySMILES notations.
+   CurlySMILES notations. The element tables are made once, at
+   import, and shared by all AtomicData objects: symbols with integer
+   atomic numbers, tuples indexed by atomic number and frozensets for
+   the organic set and the one-letter symbols.
 
    Copyright (C) 2010  Axel Drefahl
 
@@ -28,12 +31,18 @@
    along with the CurlySMILES package.
    If not, see <http://www.gnu.org/licenses/>.
 """
+import array
+
 class AtomicData:
     
    def __init__(self):
-      self.dictSymbolData      = init_dict_symbol_data()
-      self.tplOneLetterSymbols = self.init_tpl_one_letter_symbols()      
-      self.tplOrganicSet       = self.init_tpl_organic_set()
+      self.dictSymbolData      = dictSymbolData # shared, see below
+      self.tplOneLetterSymbols = tplOneLetterSymbols
+      self.tplOrganicSet       = tplOrganicSet
+
+      # lookup(sAtSymb): atomic number (int) or None; bind it locally
+      # in loops, e.g. fnAtNumb = oAtoms.lookup
+      self.lookup = lookup
       
    #===================================================================#
    # MAKE tuples with special atomic symbols                           #
@@ -44,8 +53,7 @@ class AtomicData:
                                    consisting of one letter
    """
    def init_tpl_one_letter_symbols(self):
-      tpl = ('H','B','C','N','O','F','P','S','K','V','Y','I','U')
-      return tpl
+      return tplOneLetterSymbols
 
    """
       init_tpl_organic_set: initialize and return tuple with symbols
@@ -55,8 +63,7 @@ class AtomicData:
                             brackets in SMILES notations)
    """
    def init_tpl_organic_set(self):
-      tpl = ('B','C','N','O','F','P','S','Cl','Br','I')
-      return tpl
+      return tplOrganicSet
 
    #===================================================================#
    # ACCESS member objects                                             #
@@ -85,13 +92,7 @@ class AtomicData:
          return None
       
    def atnumb_as_int(self,sAtSymb):
-      if sAtSymb == '*':
-         return 0
-      elif self.dictSymbolData.has_key(sAtSymb):
-         sAtNumb = self.dictSymbolData[sAtSymb][0]
-         return int(sAtNumb)
-      else:
-         return None
+      return dictAtNumbOf.get(sAtSymb)
 
    def ground_state_electron_configuration(self,sAtSymb):
       if self.dictSymbolData.has_key(sAtSymb):
@@ -103,13 +104,32 @@ class AtomicData:
    # QUERY tplOneLetterSymbols                                         #
    #===================================================================#
    def is_valid_one_letter_symbol(self,sAtSymb):
-      return sAtSymb in self.tplOneLetterSymbols
+      return sAtSymb in fsetOneLetterSymbols
 
    #===================================================================#
    # QUERY tplOrganicSet                                               #
    #===================================================================#
    def is_in_organic_set(self,sAtSymb):
-      return sAtSymb in self.tplOrganicSet
+      return sAtSymb in fsetOrganicSet
+
+   #===================================================================#
+   # QUERY by atomic number                                            #
+   #===================================================================#
+   """
+      symbol_of_atnumb: atomic symbol (interned) for atomic number nZ
+                        ('*' for 0)
+   """
+   def symbol_of_atnumb(self,nZ):
+      return tplSymbolOfZ[nZ]
+
+   def gsec_of_atnumb(self,nZ):
+      return tplGsecOfZ[nZ]
+
+   def is_organic_atnumb(self,nZ):
+      return arrOrganicOfZ[nZ]
+
+   def numof_atnumbs(self):
+      return len(tplSymbolOfZ) # atomic numbers 0,...,max.
 
 
 #======================================================================#
@@ -238,3 +258,56 @@ def init_dict_symbol_data():
          'Mt':  ( '109', '[Rn]5f^{14}6d^77s^2' )         
       }
       return dictAt
+
+#======================================================================#
+# MAKE tables indexed by atomic number                                 #
+#======================================================================#
+"""
+      init_z_tables: make tables for the atomic numbers of the symbols
+                     in dictSymbolData (placeholder '*' has number 0)
+      return: (dictAtNumbOf,tplSymbolOfZ,tplGsecOfZ), where
+              dictAtNumbOf = {sAtSymb: nZ,...}, with interned symbols,
+              tplSymbolOfZ[nZ] = sAtSymb and tplGsecOfZ[nZ] = gsec
+"""
+def init_z_tables(dictSymbolData):
+   dictAtNumbOf = {}
+   nMaxZ = 0
+   for (sAtSymb,tplData) in dictSymbolData.items():
+      nZ = 0
+      if sAtSymb != '*':
+         nZ = int(tplData[0])
+      dictAtNumbOf[intern(sAtSymb)] = nZ
+      nMaxZ = max(nMaxZ,nZ)
+   lstSymbolOfZ = [None] * (nMaxZ+1)
+   lstGsecOfZ   = [None] * (nMaxZ+1)
+   for (sAtSymb,nZ) in dictAtNumbOf.items():
+      lstSymbolOfZ[nZ] = sAtSymb
+      lstGsecOfZ[nZ]   = dictSymbolData[sAtSymb][1]
+   return (dictAtNumbOf,tuple(lstSymbolOfZ),tuple(lstGsecOfZ))
+
+"""
+      flags_of_z: array('B') indexed by atomic number, 1 for the atomic
+                  numbers of the symbols in tplSymbols, else 0
+"""
+def flags_of_z(tplSymbols):
+   arrFlags = array.array('B',[0]) * len(tplSymbolOfZ)
+   for sAtSymb in tplSymbols:
+      arrFlags[dictAtNumbOf[sAtSymb]] = 1
+   return arrFlags
+
+# one-letter symbols and organic set (atoms not in the organic set
+# always need to be encoded inside square brackets in SMILES notations)
+tplOneLetterSymbols = ('H','B','C','N','O','F','P','S','K','V','Y','I','U')
+tplOrganicSet       = ('B','C','N','O','F','P','S','Cl','Br','I')
+
+dictSymbolData = init_dict_symbol_data()
+(dictAtNumbOf,tplSymbolOfZ,tplGsecOfZ) = init_z_tables(dictSymbolData)
+
+fsetOneLetterSymbols = frozenset(tplOneLetterSymbols)
+fsetOrganicSet       = frozenset(tplOrganicSet)
+arrOrganicOfZ        = flags_of_z(tplOrganicSet)
+
+"""
+      lookup: atomic number (int) of atomic symbol, None if not valid
+"""
+lookup = dictAtNumbOf.get
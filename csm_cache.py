@@ -0,0 +1,245 @@
+"""
+   This file:     csm_cache.py
+   Last modified: October 18, 2026
+   Package:       CurlySMILES Version 1.0.1
+   Author:        Axel Drefahl
+   E-mail:        axeleratio@yahoo.com
+   Internet:      http://www.axeleratio.com/csm/proj/main.htm
+
+   Python module csm_cache implements a bounded cache with
+   least-recently-used eviction for parse results of CurlySMILES
+   notations (see Notation.set_result_cache). A cache may be shared
+   by threads: lookups and changes are serialized by a lock.
+
+   Copyright (C) 2010  Axel Drefahl
+
+   This file is part of the CurlySMILES package.
+
+   The CurlySMILES package is free software: you can redistribute it
+   and/or modify it under the terms of the GNU General Public License
+   as published by the Free Software Foundation, either version 3 of
+   the License, or (at your option) any later version.
+
+   The CurlySMILES package is distributed in the hope that it will be
+   useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+   of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with the CurlySMILES package.
+   If not, see <http://www.gnu.org/licenses/>.
+"""
+try:
+   from hashlib import md5
+except ImportError:   # Python 2.4
+   from md5 import new as md5
+try:
+   import threading
+except ImportError:   # Python built without thread support
+   import dummy_threading as threading
+
+"""
+   fingerprint: hex digest identifying the contents of the given
+                dictionaries (such as client annotations and client
+   aliases); equal contents give equal fingerprints, independent of
+   insertion order
+"""
+def fingerprint(*tplDicts):
+   oDigest = md5()
+   for dictX in tplDicts:
+      lstItems = dictX.items()
+      lstItems.sort()
+      oDigest.update(repr(lstItems))
+      oDigest.update('\n')
+   return oDigest.hexdigest()
+
+# positions in a link [prev, next, key, value] of the recency list
+PREV = 0
+NEXT = 1
+KEY  = 2
+VALUE = 3
+
+class LruCache:
+
+   def __init__(self,nCapacity=1024):
+
+      self.nCapacity = max(1,nCapacity) # maximum number of entries
+      self.dictLinks = {}   # {key: link}, see PREV, NEXT, KEY, VALUE
+      self.lstRoot = [None,None,None,None] # sentinel of circular,
+      self.lstRoot[PREV] = self.lstRoot    # doubly linked list:
+      self.lstRoot[NEXT] = self.lstRoot    # most recent next to root
+      self.oLock = threading.RLock() # guards links and statistics
+
+      # statistics
+      self.nHits = 0          # lookups served from the cache
+      self.nMisses = 0        # lookups not served
+      self.nEvictions = 0     # entries dropped for lack of capacity
+      self.nInvalidations = 0 # entries dropped by invalidate
+
+   #===================================================================#
+   # LOOKUP and STORE                                                  #
+   #===================================================================#
+   """------------------------------------------------------------------
+      get: look up value stored for key and mark it as most recently
+           used
+      return: value or None, if not in cache
+   """
+   def get(self,key):
+      self.oLock.acquire()
+      try:
+         lstLink = self.dictLinks.get(key)
+         if lstLink == None:
+            self.nMisses += 1
+            return None
+         self.nHits += 1
+         self.unlink(lstLink)
+         self.link_first(lstLink)
+         return lstLink[VALUE]
+      finally:
+         self.oLock.release()
+
+   """------------------------------------------------------------------
+      put: store value for key as most recently used entry, evicting
+           the least recently used entry if the cache is full
+   """
+   def put(self,key,value):
+      self.oLock.acquire()
+      try:
+         lstLink = self.dictLinks.get(key)
+         if lstLink != None:
+            lstLink[VALUE] = value
+            self.unlink(lstLink)
+            self.link_first(lstLink)
+            return
+         lstLink = [None,None,key,value]
+         self.dictLinks[key] = lstLink
+         self.link_first(lstLink)
+         self.evict(self.nCapacity)
+      finally:
+         self.oLock.release()
+
+   """------------------------------------------------------------------
+      has_key: 1 if key is in cache, else 0 (does not count as lookup
+               and does not change recency)
+   """
+   def has_key(self,key):
+      return self.dictLinks.has_key(key)
+
+   #===================================================================#
+   # CAPACITY and INVALIDATION                                         #
+   #===================================================================#
+   """------------------------------------------------------------------
+      set_capacity: change maximum number of entries, evicting least
+                    recently used entries as needed
+   """
+   def set_capacity(self,nCapacity):
+      self.oLock.acquire()
+      try:
+         self.nCapacity = max(1,nCapacity)
+         self.evict(self.nCapacity)
+      finally:
+         self.oLock.release()
+
+   """------------------------------------------------------------------
+      evict: drop least recently used entries until at most nKeep
+             are left
+   """
+   def evict(self,nKeep):
+      self.oLock.acquire()
+      try:
+         while len(self.dictLinks) > nKeep:
+            lstLink = self.lstRoot[PREV]
+            self.unlink(lstLink)
+            del self.dictLinks[lstLink[KEY]]
+            self.nEvictions += 1
+      finally:
+         self.oLock.release()
+
+   """------------------------------------------------------------------
+      invalidate: drop all entries, or only those whose key satisfies
+                  fnMatch(key), e.g. after client annotations or
+      aliases have changed (see Notation.invalidate_client_vocab)
+      return: number of dropped entries
+   """
+   def invalidate(self,fnMatch=None):
+      self.oLock.acquire()
+      try:
+         lstKeys = self.dictLinks.keys()
+         if fnMatch != None:
+            lstKeys = filter(fnMatch,lstKeys)
+         for key in lstKeys:
+            self.unlink(self.dictLinks[key])
+            del self.dictLinks[key]
+         self.nInvalidations += len(lstKeys)
+         return len(lstKeys)
+      finally:
+         self.oLock.release()
+
+   """------------------------------------------------------------------
+      clear: drop all entries and reset statistics
+   """
+   def clear(self):
+      self.oLock.acquire()
+      try:
+         self.dictLinks.clear()
+         self.lstRoot[PREV] = self.lstRoot
+         self.lstRoot[NEXT] = self.lstRoot
+         self.nHits = self.nMisses = 0
+         self.nEvictions = self.nInvalidations = 0
+      finally:
+         self.oLock.release()
+
+   #===================================================================#
+   # HELPER METHODS                                                    #
+   #===================================================================#
+   def unlink(self,lstLink):
+      lstLink[PREV][NEXT] = lstLink[NEXT]
+      lstLink[NEXT][PREV] = lstLink[PREV]
+
+   def link_first(self,lstLink):
+      lstLink[PREV] = self.lstRoot
+      lstLink[NEXT] = self.lstRoot[NEXT]
+      self.lstRoot[NEXT][PREV] = lstLink
+      self.lstRoot[NEXT] = lstLink
+
+   #===================================================================#
+   # MISCELLANEOUS REQUESTS                                            #
+   #===================================================================#
+   def __len__(self):           return len(self.dictLinks)
+   def capacity(self):          return self.nCapacity
+   def numof_entries(self):     return len(self.dictLinks)
+   def numof_hits(self):        return self.nHits
+   def numof_misses(self):      return self.nMisses
+   def numof_evictions(self):   return self.nEvictions
+
+   """------------------------------------------------------------------
+      keys: keys from most to least recently used
+   """
+   def keys(self):
+      self.oLock.acquire()
+      try:
+         lstKeys = []
+         lstLink = self.lstRoot[NEXT]
+         while lstLink is not self.lstRoot:
+            lstKeys.append(lstLink[KEY])
+            lstLink = lstLink[NEXT]
+         return lstKeys
+      finally:
+         self.oLock.release()
+
+   """------------------------------------------------------------------
+      stats: dictionary with entries, capacity, hits, misses,
+             evictions, invalidations and hit_ratio
+   """
+   def stats(self):
+      nLookups = self.nHits + self.nMisses
+      fHitRatio = 0.0
+      if nLookups > 0:
+         fHitRatio = float(self.nHits) / nLookups
+      return {'entries':       len(self.dictLinks),
+              'capacity':      self.nCapacity,
+              'hits':          self.nHits,
+              'misses':        self.nMisses,
+              'evictions':     self.nEvictions,
+              'invalidations': self.nInvalidations,
+              'hit_ratio':     fHitRatio}
@@ -36,15 +36,35 @@ class CurlyAnnotation:
       self.sContent  = sContent # content inside curly braces
       self.sAM     = None # annotation marker (one- or two-char)
       self.sAMtype = None # annotation marker type   
+      self.tplProps = None # marker properties, see marker_props
       self.dictAnn = None # annotation dictionary      
       self.lstErrors = [] # list of strings with reported error 
 
+   #===================================================================#
+   # RESET                                                             #
+   #===================================================================#
+   """------------------------------------------------------------------
+      reset: reinitialize for new annotation sContent, as done by the
+             constructor, but reusing the error list (see
+      csm_pool.ObjectPool); an annotation dictionary handed out
+      before (see entry) stays untouched
+   """
+   def reset(self,oDataFace=None,sContent=None):
+      self.oDataFace = oDataFace
+      self.sContent  = sContent
+      self.sAM     = None
+      self.sAMtype = None
+      self.tplProps = None
+      self.dictAnn = None
+      del self.lstErrors[:]
+
    #===================================================================#
    # PARSE annotation                                                         #
    #===================================================================#
 
    """------------------------------------------------------------------
-      parse: parse self.sContent and assign self.sAM and self.dictAnn
+      parse: parse self.sContent and assign self.sAM, its properties
+             and self.dictAnn
       return: self.lstErrors
    """
    def parse(self):
@@ -64,7 +84,9 @@ class CurlyAnnotation:
                    sDict
             self.lstErrors.append(sMsg)
    
-      self.sAMtype = self.oDataFace.marker_type(self.sAM)
+      self.tplProps = self.oDataFace.marker_props(self.sAM)
+      if self.tplProps != None:
+         self.sAMtype = self.tplProps[csm_dataface.MP_TYPE]
       if self.sAMtype == None:
          sMsg = "parse: unknown descriptor or marker: '%s'" % self.sAM
          self.lstErrors.append(sMsg)
@@ -127,8 +149,7 @@ class CurlyAnnotation:
             iCurlyDepth -= 1
 
       if iCurlyDepth != 0:
-         sErr = 'csm_curlycode.splitAtTopLevel [%s]: ' % self.sIndexes
-         sErr = 'unbalanced curly entry: "%s"' % sStr
+         sErr = 'split_at_top_level: unbalanced curly entry: "%s"' % sStr
          self.lstErrors.append(sErr)      
       else:
          lstParts.append(sSub) # append final part
@@ -163,6 +184,7 @@ class CurlyAnnotation:
    def content(self):                 return self.sContent
    def annotation_marker(self):       return self.sAM
    def annotation_marker_type(self):  return self.sAMtype   
+   def marker_props(self):            return self.tplProps # or None
    def annotation_dict(self):         return self.dictAnn 
    def msgs_err(self):                return self.lstErrors 
 
@@ -9,6 +9,9 @@
    Python module csm_dataface is intended to be used to
    create a singleton object for look-up of data as nedded
    during parsing and evaluating a CurlySMILES notation.
+   Function get_shared returns such an object, frozen and shared
+   process-wide per CurlySMILES directory; class DataFaceOverlay
+   adds tenant aliases to a shared object without copying it.
 
    Copyright (C) 2010  Axel Drefahl
 
@@ -29,12 +32,18 @@
    If not, see <http://www.gnu.org/licenses/>.
 """
 import os
-import csm_atoms, csm_aliases
+import csm_atoms, csm_aliases, csm_cache
+try:
+   import threading
+except ImportError:   # Python built without thread support
+   import dummy_threading as threading
 
 class DataFace:
     
    def __init__(self,sReroute=None):
 
+      self.bFrozen = 0 # 1 after freeze: no more assignments
+
       self.sCsmpyDir = os.getcwd()
       if sReroute != None:
          self.sCsmpyDir = sReroute
@@ -109,6 +118,9 @@ class DataFace:
                         '+R': 2, '+X': 2, '+Y': 2, '+n': 2, '+r': 2
                       }
 
+      # marker properties: {sMarker: tplProps,...}, see MP_TYPE etc.
+      self.dictMarkerProps = self.make_marker_props()
+
       self.dictAliases = None
       self.lstMsgs = []
      
@@ -121,6 +133,8 @@ class DataFace:
          (if not, place report into self.lstMsgs)
    """
    def assess_data_availability(self):      
+      if self.bFrozen:
+         return # assessed by freeze
       (lstAmbig,dictAliases) = self.oAliases.makeAliasDict()
       if len(lstAmbig) > 0:
          self.lstMsgs += lstAmbig
@@ -135,6 +149,51 @@ class DataFace:
    def getDataMissReport(self):
       return self.lstMsgs
 
+   #===================================================================#
+   # FREEZE for sharing                                                #
+   #===================================================================#
+   """------------------------------------------------------------------
+      freeze: assess data availability and build the alias index now,
+              turn the marker lists into tuples and refuse any further
+      attribute assignment; from here on the object is only read, so
+      that it can be shared by threads (see get_shared)
+   """
+   def freeze(self):
+      if self.bFrozen:
+         return
+      self.assess_data_availability()
+      for sName in lstFrozenLists:
+         setattr(self,sName,tuple(getattr(self,sName)))
+      self.bFrozen = 1
+
+   def is_frozen(self):
+      return self.bFrozen
+
+   """------------------------------------------------------------------
+      cache_identity: identity of this object in the keys of a result
+                      cache shared by Notation objects (see
+      Notation.result_cache_key): CurlySMILES directory and object id
+   """
+   def cache_identity(self):
+      return (self.sCsmpyDir,id(self))
+
+   """------------------------------------------------------------------
+      shared_data: DataFace object with the data read by components
+                   (atomic data and markers) that may be referred to
+      by the process-wide component cache (see
+      Notation.parsed_component): this object, if frozen (see
+      get_shared), else None
+   """
+   def shared_data(self):
+      if self.bFrozen:
+         return self
+      return None
+
+   def __setattr__(self,sName,value):
+      if self.__dict__.get('bFrozen'):
+         raise AttributeError('DataFace is frozen, cannot set %s' % sName)
+      self.__dict__[sName] = value
+
       
    #===================================================================#
    # QUERY oAtoms                                                      #
@@ -156,6 +215,20 @@ class DataFace:
       
    def is_in_organic_set(self,sAtSymb):
       return self.oAtoms.is_in_organic_set(sAtSymb)
+
+   """------------------------------------------------------------------
+      atnumb_lookup: function returning the atomic number (int) of an
+                     atomic symbol, None if not valid; to be bound to
+      a local name before a loop over many symbols
+   """
+   def atnumb_lookup(self):
+      return self.oAtoms.lookup
+
+   def symbol_of_atnumb(self,nZ):
+      return self.oAtoms.symbol_of_atnumb(nZ)
+
+   def numof_atnumbs(self):
+      return self.oAtoms.numof_atnumbs()
    
    #===================================================================#
    # QUERY oAliases                                                    #
@@ -199,49 +272,87 @@ class DataFace:
       return sStr in self.lstMIAMs
 
    def marker_type(self,sStr):
-      if self.is_stereodescriptor(sStr):
-         return 'SD'
-      elif self.is_bond_symbol(sStr):
-         return 'BS'
-      elif self.is_GEAM(sStr):
-         return 'GEAM'
-      elif self.is_MDAM(sStr):
-         return 'MDAM'
-      elif self.is_OPAM(sStr):
-         return 'OPAM'
-      elif self.is_SSAM(sStr):
-         return 'SSAM'
-      elif self.is_MIAM(sStr):
-         return 'MIAM'      
-      else:
+      tplProps = self.dictMarkerProps.get(sStr)
+      if tplProps == None:
          return None
+      return tplProps[MP_TYPE]
 
    def is_aaa(self,sStr):
-      sMarkerType = self.marker_type(sStr)
-      return sMarkerType in ['SD','BS','GEAM','MDAM','OPAM']
+      tplProps = self.dictMarkerProps.get(sStr)
+      return tplProps != None and tplProps[MP_ANCHOR] == 'AAA'
 
    def is_caa(self,sStr):
-      sMarkerType = self.marker_type(sStr)
-      return sMarkerType in ['SSAM','MIAM']
+      tplProps = self.dictMarkerProps.get(sStr)
+      return tplProps != None and tplProps[MP_ANCHOR] == 'CAA'
 
    def is_open_single_bond(self,sAM):
-      return sAM in ['-','-R','-X','-Y','-|',
-                     '+R','+X','+Y','+n','+r']
+      return dictOpenBondOf.get(sAM) == '-'
 
    def is_open_double_bond(self,sAM):
-      return sAM in ['=','=Y']
+      return dictOpenBondOf.get(sAM) == '='
 
    def is_open_triple_bond(self,sAM):
-      return sAM in ['#','#Y']
+      return dictOpenBondOf.get(sAM) == '#'
 
    def is_open_quadruple_bond(self,sAM):
-      return sAM in ['$','$Y']
+      return dictOpenBondOf.get(sAM) == '$'
 
    def is_open_aromatic_bond(self,sAM):
-      return sAM in [':',':Y']
+      return dictOpenBondOf.get(sAM) == ':'
 
    def is_open_unspecified_bond(self,sAM):
-      return sAM in ['~','~|']
+      return dictOpenBondOf.get(sAM) == '~'
+
+   #===================================================================#
+   # MARKER PROPERTIES                                                 #
+   #===================================================================#
+   """------------------------------------------------------------------
+      make_marker_props: table with the properties of all descriptors
+                         and annotation markers, made once, so that
+      an annotation needs one look-up instead of a scan of each
+      marker list (see CurlyAnnotation.marker_props)
+      return: {sMarker: tplProps,...}, tplProps with the fields at
+              MP_TYPE:     marker type ('SD','BS','GEAM','MDAM',
+                           'OPAM','SSAM' or 'MIAM')
+              MP_ANCHOR:   'AAA' (atom-anchored) or 'CAA' (component-
+                           anchored)
+              MP_BOND:     symbol of open bond ('-','=','#','$',':'
+                           or '~') or None
+              MP_HCOR:     H-count correction (see hcount_correction)
+              MP_SQBRACK:  1 if atom with this open bond needs square
+                           brackets, else 0
+   """
+   def make_marker_props(self):
+      dictProps = {}
+      for (sType,lstMarkers) in [('SD',  self.lstStereoDescr),
+                                 ('BS',  self.lstBondSymbols),
+                                 ('GEAM',self.lstGEAMs),
+                                 ('MDAM',self.lstMDAMs),
+                                 ('OPAM',self.lstOPAMs),
+                                 ('SSAM',self.lstSSAMs),
+                                 ('MIAM',self.lstMIAMs)]:
+         sAnchor = 'AAA'
+         if sType in ['SSAM','MIAM']:
+            sAnchor = 'CAA'
+         for sMarker in lstMarkers:
+            if dictProps.has_key(sMarker):
+               continue # type of first list wins
+            sBond = dictOpenBondOf.get(sMarker)
+            bSquareBrack = 0
+            if sBond in ['$',':','~']:
+               bSquareBrack = 1
+            dictProps[sMarker] = (sType,sAnchor,sBond,
+                                  self.hcount_correction(sMarker),
+                                  bSquareBrack)
+      return dictProps
+
+   """------------------------------------------------------------------
+      marker_props: properties of descriptor or marker sStr
+      return: tplProps (see make_marker_props) or None, if sStr is
+              not a descriptor or marker
+   """
+   def marker_props(self,sStr):
+      return self.dictMarkerProps.get(sStr)
       
    #===================================================================#
    # QUERY annotation dictionary keys                                  #
@@ -262,3 +373,146 @@ class DataFace:
          return self.dictHcor[sAM]
       else:
          return 0
+
+"""
+   init_dict_open_bond_of: map each bond symbol or annotation marker
+                           that stands for an open bond to the symbol
+                           of that bond
+   return: {sMarker: sBond,...}
+"""
+def init_dict_open_bond_of():
+   dictOpenBondOf = {}
+   for (sBond,lstMarkers) in [('-',['-','-R','-X','-Y','-|',
+                                    '+R','+X','+Y','+n','+r']),
+                              ('=',['=','=Y']),
+                              ('#',['#','#Y']),
+                              ('$',['$','$Y']),
+                              (':',[':',':Y']),
+                              ('~',['~','~|'])]:
+      for sMarker in lstMarkers:
+         dictOpenBondOf[sMarker] = sBond
+   return dictOpenBondOf
+
+dictOpenBondOf = init_dict_open_bond_of()
+
+# positions in a tuple of marker properties (see make_marker_props)
+MP_TYPE    = 0
+MP_ANCHOR  = 1
+MP_BOND    = 2
+MP_HCOR    = 3
+MP_SQBRACK = 4
+
+"""
+   lstFrozenLists: DataFace attributes turned into tuples by freeze
+"""
+lstFrozenLists = ['lstStereoDescr','lstBondSymbols','lstGEAMs','lstMDAMs',
+                  'lstOPAMs','lstSSAMs','lstMIAMs','lstAnnDictKeys',
+                  'lstMsgs']
+
+#======================================================================#
+# SHARED DataFace objects                                              #
+#======================================================================#
+dictShared  = {} # {sCsmpyDir: frozen DataFace object}
+oSharedLock = threading.Lock()
+
+"""
+   get_shared: frozen DataFace object for the CurlySMILES directory
+               sReroute (default: current working directory), made on
+   first request and returned to all later ones, from any thread;
+   use it in place of DataFace(sReroute) for Notation, AnnotatedSmiles,
+   CurlyAnnotation and MolecularFormula objects
+
+   EXAMPLE: oNotation = csm_notation.Notation(csm_dataface.get_shared())
+"""
+def get_shared(sReroute=None):
+   sCsmpyDir = sReroute
+   if sCsmpyDir == None:
+      sCsmpyDir = os.getcwd()
+   sKey = os.path.abspath(sCsmpyDir)
+   oDataFace = dictShared.get(sKey)
+   if oDataFace != None:
+      return oDataFace
+   oSharedLock.acquire()
+   try:
+      oDataFace = dictShared.get(sKey) # made meanwhile by other thread?
+      if oDataFace == None:
+         oDataFace = DataFace(sCsmpyDir)
+         oDataFace.freeze()
+         dictShared[sKey] = oDataFace
+   finally:
+      oSharedLock.release()
+   return oDataFace
+
+"""
+   clear_shared: forget all shared DataFace objects (e.g. after alias
+                 modules have changed); objects handed out before stay
+   valid for their holders
+"""
+def clear_shared():
+   oSharedLock.acquire()
+   try:
+      dictShared.clear()
+   finally:
+      oSharedLock.release()
+
+class DataFaceOverlay(DataFace):
+   """
+      DataFaceOverlay: DataFace object of a tenant, with its own aliases
+                       dictTenantAli = {sAlias: sCompntNotation,...}
+      looked up before those of the shared DataFace object oBase;
+      everything else (atomic data, markers, built-in aliases) is read
+      from oBase, nothing is copied
+
+      EXAMPLE: oTenant = DataFaceOverlay(csm_dataface.get_shared(),
+                                         {'MyCat': '[Na+]'},'acme')
+               oNotation = csm_notation.Notation(oTenant)
+
+      Notations parsed with different overlays may share a result
+      cache: its keys tell overlays apart by tenant and tenant aliases
+      (see cache_identity).
+   """
+   def __init__(self,oBase,dictTenantAli=None,sTenant='tenant'):
+      self.bFrozen = 0
+      self.oBase   = oBase
+      if dictTenantAli == None:
+         dictTenantAli = {}
+      self.dictTenantAli = dictTenantAli
+      self.sTenant = sTenant # group id reported for tenant aliases
+
+   """------------------------------------------------------------------
+      __getattr__: attributes not set on the overlay are those of oBase
+   """
+   def __getattr__(self,sName):
+      if sName[:2] == '__' or sName == 'oBase':
+         raise AttributeError(sName)
+      return getattr(self.oBase,sName)
+
+   def assess_data_availability(self):
+      self.oBase.assess_data_availability()
+
+   """------------------------------------------------------------------
+      cache_identity: identity of oBase, tenant and fingerprint of the
+                      current tenant aliases
+   """
+   def cache_identity(self):
+      return (self.oBase.cache_identity(),self.sTenant,
+              csm_cache.fingerprint(self.dictTenantAli))
+
+   def shared_data(self):
+      return self.oBase.shared_data()
+
+   """------------------------------------------------------------------
+      add_alias: add (or replace) tenant alias
+   """
+   def add_alias(self,sAlias,sCompntNotation):
+      self.dictTenantAli[sAlias] = sCompntNotation
+
+   def compnt_notation_by_alias(self,sAlias):
+      if self.dictTenantAli.has_key(sAlias):
+         return self.dictTenantAli[sAlias]
+      return self.oBase.compnt_notation_by_alias(sAlias)
+
+   def compnt_notation_and_groupid_by_alias(self,sAlias):
+      if self.dictTenantAli.has_key(sAlias):
+         return (self.dictTenantAli[sAlias],self.sTenant)
+      return self.oBase.compnt_notation_and_groupid_by_alias(sAlias)
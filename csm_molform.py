@@ -79,6 +79,24 @@ class MolecularFormula:
          self.iCharge = -2
       """
 
+   #===================================================================#
+   # RESET                                                             #
+   #===================================================================#
+   """
+      reset: reinitialize for new formula sMf, as done by the
+             constructor, but emptying and reusing list of pairs,
+      dictionary of dictionaries and error list (see
+      csm_pool.ObjectPool)
+   """
+   def reset(self,oDataFace=None,sMf=None):
+      self.oDataFace = oDataFace
+      self.sMf = sMf
+      del self.lstOfPairs[:]
+      self.dictOfDict.clear()
+      self.sCharge = None
+      self.iCharge = None
+      del self.lstErrors[:]
+
    #===================================================================#
    # ASSIGNMENT of member variable by application                      #
    #===================================================================#
@@ -28,7 +28,247 @@
    If not, see <http://www.gnu.org/licenses/>.
 """
 import csm_dataface, csm_annsmi, csm_molform, csm_sfn, csm_curlyann
-import re
+import csm_cache, csm_pool
+import bisect, copy, re
+
+"""
+   dictRecordFields: record fields for Notation.parse_many,
+                     {field name: name of Notation method}
+"""
+dictRecordFields = {
+   'notation':         'user_notation',
+   'work_notation':    'work_notation',
+   'numof_components': 'numof_components',
+   'type_components':  'type_components',
+   'mf_total':         'mf_total',
+   'msgs_err':         'msgs_err'
+}
+
+"""
+   lstSnapshotFields: Notation members holding the result of parse,
+                      as kept in a result cache (see make_snapshot)
+   lstSnapshotDeep: members of lstSnapshotFields with nested lists or
+                    dictionaries, which are copied in full when stored
+   and, after a restore, when handed out (see Notation.nested_result)
+"""
+lstSnapshotFields = ['sWorkNotation', 'lstWorkParts', 'nCompnt',
+                     'lstCompnt', 'lstTypes', 'lstObjSmi', 'lstObjSfn',
+                     'lstMfHill', 'nCpsParts', 'lstCpsParts', 'lstCpsTypes',
+                     'lstObjSmiCps', 'lstObjSfnCps', 'lstMfHillCps',
+                     'lstCaaCps', 'lstErrCps', 'lstCompntAnn',
+                     'lstAccFail', 'lstErrors']
+lstSnapshotDeep = ['lstCaaCps', 'lstErrCps', 'lstCompntAnn'] # copied
+
+"""
+   nCpsParallelChars: default minimum number of characters of all parts
+                      of a composite for parsing them in worker
+   processes (see Notation.set_cps_parser)
+"""
+nCpsParallelChars = 2000
+
+"""
+   oComponentCache: process-wide cache of parsed component objects,
+                    shared by all Notation objects (see
+   set_component_cache and Notation.parsed_component) with a frozen
+   DataFace object (see csm_dataface.get_shared); components longer
+   than nComponentMaxChars are not cached, so that the memory held by
+   the cache stays small
+"""
+nComponentCacheSize = 4096
+nComponentMaxChars  = 256
+oComponentCache = csm_cache.LruCache(nComponentCacheSize)
+
+"""
+   set_component_cache: replace the process-wide component cache by
+                        oCache (csm_cache.LruCache) or turn it off
+   with None
+"""
+def set_component_cache(oCache):
+   global oComponentCache
+   oComponentCache = oCache
+
+"""
+   component_cache: process-wide component cache (or None)
+"""
+def component_cache():
+   return oComponentCache
+
+"""
+   reAtSymbCount: atomic symbol (optionally isotope-labelled) that
+               reads back unchanged from a Hill-format formula (see
+   Notation.mf_total_by_counts)
+"""
+reAtSymbCount = re.compile(r'(\^[0-9]+)?[A-Z][a-z]?$')
+
+"""
+   reScanStrict: characters of a user notation that Notation.scan_parts
+                 has to look at: curly braces and dots, which delimit
+   components, plus backslash, blank and invalid characters, which
+   leave a notation to the stepwise preprocessing
+   reScanCurlyDot: curly braces and dots only (for replacement code)
+"""
+reScanStrict   = re.compile(r'[{}.\\ <>"\']')
+reScanCurlyDot = re.compile(r'[{}.]')
+reScanCurly    = re.compile(r'[{}]')
+
+"""
+   join_backslash_parts: remove backslashes from sNotation together
+                         with the white space around them
+"""
+def join_backslash_parts(sNotation):
+   lstParts = sNotation.split('\\')
+   if len(lstParts) < 2:
+      return sNotation
+   sJoined = lstParts[0].strip()
+   for sPart in lstParts[1:]:
+      sJoined += sPart.strip()
+   return sJoined
+
+"""
+   scan_end_curlies: find the pairs of curly braces that follow each
+                     other up to the right end of sText (annotations,
+   multiplier) in one forward pass, matching each '}' with the
+   nearest unmatched '{' before it (as splitOffRightEndCurly does,
+   applied again and again, for unbalanced text as well)
+
+   EXAMPLE: for sText = '{*SiO2}{cr}{IMa=Cu}'
+            return: [(0,6), (7,10), (11,18)]
+
+   return: list of spans (iOpen, iClose) from left to right
+           (empty, if sText does not end with a matched '}')
+"""
+def scan_end_curlies(sText):
+   lstOpen = []      # positions of unmatched '{'
+   dictOpenOf = {}   # {iClose: iOpen} of matched pairs
+   for oMatch in reScanCurly.finditer(sText):
+      i = oMatch.start()
+      if sText[i] == '{':
+         lstOpen.append(i)
+      elif len(lstOpen) > 0:
+         dictOpenOf[i] = lstOpen.pop()
+
+   lstSpans = []
+   iClose = len(sText) - 1
+   while dictOpenOf.has_key(iClose):
+      iOpen = dictOpenOf[iClose]
+      lstSpans.append((iOpen,iClose))
+      iClose = iOpen - 1
+   lstSpans.reverse()
+   return lstSpans
+
+class RunLengthList:
+   """
+      RunLengthList: read-only list kept as runs of equal values, such
+                     as the entries of a component with multiplier
+      (X{n}), which are stored once with their run length instead of
+      n times; indices are resolved by bisection over the run ends
+
+      EXAMPLE: lstX = RunLengthList()
+               lstX.append('smi',6)
+               lstX.append('sfn')
+               len(lstX) => 7, lstX[5] => 'smi', lstX.runs() =>
+               [('smi',6), ('sfn',1)]
+   """
+   def __init__(self):
+      self.lstValues = [] # one value per run
+      self.lstEnds   = [] # index after last entry of run (cumulative)
+
+   """------------------------------------------------------------------
+      append: add run of nTimes entries equal to value (not merged
+              with a preceding run of the same value)
+   """
+   def append(self,value,nTimes=1):
+      if nTimes < 1:
+         return
+      nEnd = nTimes
+      if len(self.lstEnds) > 0:
+         nEnd += self.lstEnds[-1]
+      self.lstValues.append(value)
+      self.lstEnds.append(nEnd)
+
+   """------------------------------------------------------------------
+      clear: remove all runs (also done by del lstX[:])
+   """
+   def clear(self):
+      del self.lstValues[:]
+      del self.lstEnds[:]
+
+   """------------------------------------------------------------------
+      irun: index of run containing entry idx (0 <= idx < len)
+   """
+   def irun(self,idx):
+      return bisect.bisect_right(self.lstEnds,idx)
+
+   def __len__(self):
+      if len(self.lstEnds) == 0:
+         return 0
+      return self.lstEnds[-1]
+
+   def __getitem__(self,idx):
+      if isinstance(idx,slice):
+         return self.tolist()[idx]
+      nLen = len(self)
+      if idx < 0:
+         idx += nLen
+      if idx < 0 or idx >= nLen:
+         raise IndexError('RunLengthList index out of range')
+      return self.lstValues[self.irun(idx)]
+
+   def __getslice__(self,iStart,iEnd):
+      return self.tolist()[iStart:iEnd]
+
+   def __delslice__(self,iStart,iEnd):
+      if iStart > 0 or iEnd < len(self):
+         raise TypeError('RunLengthList supports del lstX[:] only')
+      self.clear()
+
+   def __iter__(self):
+      nStart = 0
+      for i in range(len(self.lstValues)):
+         for j in xrange(self.lstEnds[i] - nStart):
+            yield self.lstValues[i]
+         nStart = self.lstEnds[i]
+
+   def __eq__(self,other):
+      if isinstance(other,RunLengthList):
+         return self.runs() == other.runs()
+      return self.tolist() == other
+
+   def __ne__(self,other):
+      return not self.__eq__(other)
+
+   def __repr__(self):
+      return 'RunLengthList(%s)' % repr(self.runs())
+
+   """------------------------------------------------------------------
+      runs: list of pairs (value, run length)
+   """
+   def runs(self):
+      lstRuns = []
+      nStart = 0
+      for i in range(len(self.lstValues)):
+         lstRuns.append((self.lstValues[i],self.lstEnds[i] - nStart))
+         nStart = self.lstEnds[i]
+      return lstRuns
+
+   """------------------------------------------------------------------
+      tolist: expanded list with one item per entry
+   """
+   def tolist(self):
+      lstX = []
+      for (value,nTimes) in self.runs():
+         lstX.extend([value] * nTimes)
+      return lstX
+
+   """------------------------------------------------------------------
+      copy: new RunLengthList with the same runs (values not copied)
+   """
+   def copy(self):
+      oCopy = RunLengthList()
+      oCopy.lstValues = self.lstValues[:]
+      oCopy.lstEnds   = self.lstEnds[:]
+      return oCopy
+
 class Notation:
     
    def __init__(self,oDataFace=None,sUserNotation=None):
@@ -38,19 +278,37 @@ class Notation:
       self.dictClientAnn  = {}   # dictionary with client annotations
       self.dictClientAli  = {}   # dictionary with client aliases
 
+      # parsing options
+      self.bLazyTopo = 0 # if 1, topology of SMILES components is made
+                         # on first access (see set_lazy_topology)
+      self.sLevel = 'full' # analysis level of SMILES components:
+                           #    'full' or 'formula' (see parse)
+      self.oResultCache = None # csm_cache.LruCache with snapshots of
+                               # parse results (see set_result_cache)
+      self.sClientPrint = None # fingerprint of client annotations and
+                               # aliases (see client_fingerprint)
+      self.oCpsParser = None # csm_parallel.ParallelParser for parts
+                             # of large composites (see set_cps_parser)
+      self.nCpsMinChars = nCpsParallelChars
+
       # notations
       self.sUserNotation = sUserNotation
       self.sWorkNotation = None
+      self.lstWorkParts  = [] # pairs (subnotation, multiplier) from
+                              # which the work notation is made on
+                              # request (see work_notation)
 
-      # components of work notation
+      # components of work notation; a component with multiplier
+      # (X{n}) is one run of n entries (see RunLengthList)
       self.nCompnt    = None # number of components in work notation
       self.lstCompnt  = [] # list of component notation
-      self.lstTypes   = [] # list of component types: 'cps', 'sfn', 
-                             #    'smi', or 'ali' 
-      self.lstObjSmi  = [] # list of SMILES notation objects
-      self.lstObjSfn  = [] # list of SFN notation objects
-      self.lstMfHill = [] # list with molecular formulae of compnents
-                          # (if 'smi' or 'sfn', else None) in Hill format
+      self.lstTypes   = RunLengthList() # component types: 'cps', 'sfn', 
+                                        #    'smi', or 'ali' 
+      self.lstObjSmi  = RunLengthList() # SMILES notation objects
+      self.lstObjSfn  = RunLengthList() # SFN notation objects
+      self.lstMfHill  = RunLengthList() # molecular formulae of
+                          # components (if 'smi' or 'sfn', else None)
+                          # in Hill format
 
       # parts of composite notation: sComposite = self.lstCompnt[0]
       self.nCpsParts    = [] # number of composite parts      
@@ -59,23 +317,92 @@ class Notation:
                                 # 'smi' or 'sfn'
       self.lstObjSmiCps = [] # list of SMILES obj for composite parts
       self.lstObjSfnCps = [] # list of SFN obj for composite parts
+                             # (None, if parsed in worker process)
+      self.lstMfHillCps = [] # list with molecular formulae of parts
+                             # (None, if with errors) in Hill format
+      self.lstCaaCps    = [] # list with annotations of parts
+      self.lstErrCps    = [] # list with error lists of parts
 
       # component-anchored annotations
-      self.lstCompntAnn = [] # list of dictionaries with
+      self.lstCompntAnn = RunLengthList() # dictionaries with
                                # component-anchored dictionaries
+      self.bSharedNested = 0 # 1 if the nested lists of lstSnapshotDeep
+                             # are shared with a cached snapshot
        
+      # SMILES objects of components made for this object only (not
+      # in a cache), returned to csm_annsmi.oSmilesPool by reset
+      self.lstOwnedSmi = []
+
+      # total molecular formula, made on first request (see mf_total)
+      self.bMfTotal = 0
+      self.sMfTotal = None
+
       # status information and error reports derived while parsing
       self.lstAccFail = [] # list of strings with access failure notes
       self.lstErrors  = [] # list of strings with reported error 
 
+   #===================================================================#
+   # RESET                                                             #
+   #===================================================================#
+   """------------------------------------------------------------------
+      reset: reinitialize for new user notation, as done by the
+             constructor, but emptying and reusing all lists (see
+      csm_pool.ObjectPool); lists handed out before (such as
+      msgs_err() or type_components()) are emptied as well
+   """
+   def reset(self,oDataFace=None,sUserNotation=None):
+      self.oDataFace = oDataFace
+      self.dictClientAnn = {}
+      self.dictClientAli = {}
+      self.bLazyTopo = 0
+      self.sLevel = 'full'
+      self.oResultCache = None
+      self.sClientPrint = None
+      self.oCpsParser = None
+      self.nCpsMinChars = nCpsParallelChars
+      self.clear_result()
+      self.sUserNotation = sUserNotation
+
+   """------------------------------------------------------------------
+      clear_result: drop notation and parse result, emptying and
+                    reusing all lists (see reset), but keeping DataFace
+      object, client data and options
+   """
+   def clear_result(self):
+      self.sUserNotation = None
+      self.sWorkNotation = None
+      self.nCompnt = None
+      self.nCpsParts = []
+      self.bMfTotal = 0
+      self.sMfTotal = None
+      self.bSharedNested = 0
+      self.release_owned_smi()
+      for sField in ['lstCompnt','lstTypes','lstObjSmi','lstObjSfn',
+                     'lstMfHill','lstCpsParts','lstCpsTypes',
+                     'lstObjSmiCps','lstObjSfnCps','lstMfHillCps',
+                     'lstCaaCps','lstErrCps','lstCompntAnn',
+                     'lstWorkParts','lstAccFail','lstErrors']:
+         del getattr(self,sField)[:]
+
+   """------------------------------------------------------------------
+      release_owned_smi: return SMILES objects made for this object
+                         only (self.lstOwnedSmi) to csm_annsmi.oSmilesPool
+   """
+   def release_owned_smi(self):
+      for oSmi in self.lstOwnedSmi:
+         csm_annsmi.oSmilesPool.release(oSmi)
+      del self.lstOwnedSmi[:]
+
    #===================================================================#
    # SET data needed in parsing a CurlySMILES notation                 #
    #===================================================================#
    """------------------------------------------------------------------
-      set_user_notation: assign or reassign self.sUserNotation 
+      set_user_notation: assign or reassign self.sUserNotation, after
+                         dropping the previous parse result (see
+      clear_result; lists handed out before are emptied)
    """
    def set_user_notation(self,sUserNotation):
-      self.__init__(self.oDataFace)
+      self.clear_result()
       self.sUserNotation = sUserNotation
       
    """------------------------------------------------------------------
@@ -83,12 +410,65 @@ class Notation:
    """
    def set_client_ann(self,dictClientAnn):
       self.dictClientAnn = dictClientAnn
+      self.sClientPrint = None
 
    """------------------------------------------------------------------
       set_client_aliases: assign self.dictClientAliases 
    """
    def set_client_ali(self,dictClientAli):
       self.dictClientAli = dictClientAli
+      self.sClientPrint = None
+
+   """------------------------------------------------------------------
+      set_lazy_topology: if bLazyTopo is 1, SMILES components parsed
+                         from here on make adjacency and distance
+      matrices and rings only when first requested (e.g. by
+      dmat_compnt or rings_compnt); callers who only need formulas,
+      atom lists or annotations skip that work; error messages from
+      ring perception are then reported by msgs_err_compnt only
+   """
+   def set_lazy_topology(self,bLazyTopo):
+      self.bLazyTopo = bLazyTopo
+
+   """------------------------------------------------------------------
+      set_result_cache: assign oResultCache (csm_cache.LruCache, may be
+                        shared by several Notation objects, also with
+      different DataFace objects) or None; from here on parse serves a
+      notation it has already seen, with the same client annotations,
+      client aliases and parsing options, from a snapshot of the
+      earlier result (see make_snapshot); the SMILES and SFN objects
+      of components are shared between such results and must not be
+      modified by the caller
+   """
+   def set_result_cache(self,oResultCache):
+      self.oResultCache = oResultCache
+
+   """------------------------------------------------------------------
+      set_cps_parser: assign oCpsParser (csm_parallel.ParallelParser)
+                      or None; from here on, the parts of a composite
+      with nMinChars or more characters in all are parsed concurrently
+      in the worker processes of oCpsParser, which send back their
+      formulae, annotations and errors (the SMILES and SFN objects of
+      such parts are None, see lstObjSmiCps)
+   """
+   def set_cps_parser(self,oCpsParser,nMinChars=nCpsParallelChars):
+      self.oCpsParser = oCpsParser
+      self.nCpsMinChars = nMinChars
+
+   """------------------------------------------------------------------
+      invalidate_client_vocab: to be called after self.dictClientAnn or
+                               self.dictClientAli have been modified
+      in place; drops cached results this object has made with the
+      previous contents (set_client_ann and set_client_ali need no
+      such call, since new contents give a new client fingerprint)
+   """
+   def invalidate_client_vocab(self):
+      sPrevPrint = self.sClientPrint
+      self.sClientPrint = None
+      if self.oResultCache != None and sPrevPrint != None:
+         # client fingerprint: 4th entry of key (see result_cache_key)
+         self.oResultCache.invalidate(lambda tplKey:
+                                      tplKey[3] == sPrevPrint)
 
 
    #===================================================================#
@@ -100,68 +480,392 @@ class Notation:
              preprocessing: turn user into work notation
              evaluating:
 
-      argument: sUserNotation, to be assigned to self.sUserNotation
-                               unless done with self.set_user_notation
+      arguments: sUserNotation, to be assigned to self.sUserNotation
+                                unless done with self.set_user_notation
+                 sLevel, analysis level of SMILES components:
+                    'full'    = complete molecular graph with rings,
+                                topological matrices and atom fragments
+                    'formula' = only as much as needed for molecular
+                                formula and charge (mf_compnt, mf_total,
+                                atom lists, annotations); see
+                                AnnotatedSmiles.parse_formula 
 
       return: error_msgs
    """
-   def parse(self, sUserNotation=None):
+   def parse(self, sUserNotation=None, sLevel='full'):
 
       # assign user notation unless already done
       if self.sUserNotation == None:
          self.sUserNotation = sUserNotation
 
       # check for fatal errors of highest level
+      if sLevel not in ['full','formula']:
+         sMsg = "parse: unknown analysis level '%s'" % sLevel
+         self.lstErrors.append(sMsg)
+         return self.lstErrors
+      self.sLevel = sLevel
+      self.bMfTotal = 0
+      self.sMfTotal = None
+
       if self.sUserNotation == None: # if still None
          sMsg = 'parse: sUserNotation equals None'
          self.lstErrors.append(sMsg)
          return self.lstErrors
       elif len(self.sUserNotation) < 1:         
          return self.lstErrors      
-      else:   
+
+      # Scan notation in one pass: components of plain notations,
+      # None for those in need of stepwise preprocessing
+      lstDescr = self.scan_parts(self.sUserNotation,1)
+      if lstDescr == None:
          for ch in self.sUserNotation:
             if ch in ['<','>','"',"'"]:
                sMsg  = "Notation.parse: invalid char in notation: '%s'" % ch
                self.lstErrors.append(sMsg)
                return self.lstErrors
 
-      # Preprocess
-      sModified = self.replace_client_ann(self.sUserNotation)
+      # Serve from result cache, if seen before
+      tplKey = None
+      if self.oResultCache != None and len(self.lstErrors) == 0:
+         tplKey = self.result_cache_key()
+         tplSnapshot = self.oResultCache.get(tplKey)
+         if tplSnapshot != None:
+            self.restore_snapshot(tplSnapshot)
+            return self.lstErrors
+
+      # Replace aliases in scanned components
+      if lstDescr != None:
+         lstDescr = self.replace_ali_scanned(lstDescr)
+
+      if lstDescr != None:
+         sModified = '.'.join(map(lambda tplDescr: tplDescr[0],lstDescr))
+         self.make_work_notation(sModified,lstDescr)
+      else:
+         # Preprocess
+         sModified = self.replace_client_ann(self.sUserNotation)
 
-      # Eliminate white space
-      sModified = self.eliminate_backslashes_and_white_space(sModified)
+         # Eliminate white space
+         sModified = self.eliminate_backslashes_and_white_space(sModified)
 
-      # Replace aliases based on dict given by client
-      sModified = self.replace_client_ali(sModified)
+         # Replace aliases based on dict given by client
+         sModified = self.replace_client_ali(sModified)
 
-      # Replace aliases based on dict in /aliases and /secalia
-      sModified = self.replace_builtin_ali(sModified)
+         # Replace aliases based on dict in /aliases and /secalia
+         sModified = self.replace_builtin_ali(sModified)
 
-      # Make work notation and associated parameters
-      self.make_work_notation(sModified)
+         # Make work notation and associated parameters
+         self.make_work_notation(sModified)
 
-      # loop over components to grap error messages
+      # loop over components to grap error messages (repeated for
+      # each entry of a multiplied component)
       iCompnt = 0
-      for sType in self.lstTypes:
+      for (sType,nTimes) in self.lstTypes.runs():
 
          lstErr = []
          if cmp(sType,'smi') == 0:
             oSmi = self.lstObjSmi[iCompnt]
             lstErr = oSmi.msgs_err()
-            for sErr in lstErr:
-               sMsg  = 'Notation.parse: %d. component '\
-                       % (iCompnt+1)
-               sMsg += '< %s' % sErr
-               self.lstErrors.append(sMsg)
+            if len(lstErr) > 0:
+               for i in range(iCompnt,iCompnt+nTimes):
+                  for sErr in lstErr:
+                     sMsg  = 'Notation.parse: %d. component '\
+                             % (i+1)
+                     sMsg += '< %s' % sErr
+                     self.lstErrors.append(sMsg)
                
          elif cmp(sType,'sfn') == 0:            
             oSfn = self.lstObjSfn[iCompnt]
-            lstErr = oSfn.msgs_err()
+            if oSfn != None: # None, if sfn is missing "}"
+               lstErr = oSfn.msgs_err()
 
-         iCompnt += 1
+         iCompnt += nTimes
+
+      if tplKey != None:
+         self.oResultCache.put(tplKey,self.make_snapshot())
+         del self.lstOwnedSmi[:] # now referred to by the snapshot
       
       return self.lstErrors      
 
+   #===================================================================#
+   # RESULT CACHE                                                      #
+   #===================================================================#
+   """------------------------------------------------------------------
+      client_fingerprint: fingerprint of the contents of
+                          self.dictClientAnn and self.dictClientAli
+      (computed once after set_client_ann, set_client_ali or
+      invalidate_client_vocab)
+   """
+   def client_fingerprint(self):
+      if self.sClientPrint == None:
+         self.sClientPrint = csm_cache.fingerprint(self.dictClientAnn,
+                                                   self.dictClientAli)
+      return self.sClientPrint
+
+   """------------------------------------------------------------------
+      result_cache_key: key of parse result for self.sUserNotation in
+                        the result cache: the user notation after
+      eliminating backslashes and white space, the parsing options,
+      the client fingerprint, the identity of the DataFace object
+      (see DataFace.cache_identity) and the matrix backend of SMILES
+      components (see csm_annsmi.set_matrix_backend); a notation with inline or client
+      annotations ('\\\\' or '{$') is kept as is, since its
+      backslashes and white space are significant
+   """
+   def result_cache_key(self):
+      sNotation = self.sUserNotation
+      if sNotation.find('\\\\') < 0 and sNotation.find('{$') < 0:
+         sNotation = join_backslash_parts(sNotation)
+      return (sNotation, self.sLevel, self.bLazyTopo,
+              self.client_fingerprint(), self.oDataFace.cache_identity(),
+              csm_annsmi.sMatrixBackend)
+
+   """------------------------------------------------------------------
+      make_snapshot: immutable copy of the parse result (members in
+                     lstSnapshotFields), with lists turned into tuples
+                     and run-length lists copied
+      return: tuple with one value per name in lstSnapshotFields
+   """
+   def make_snapshot(self):
+      lstSnapshot = []
+      for sField in lstSnapshotFields:
+         value = getattr(self,sField)
+         if sField in lstSnapshotDeep:
+            value = copy.deepcopy(value)
+         elif isinstance(value,RunLengthList):
+            value = value.copy()
+         if isinstance(value,list):
+            value = tuple(value)
+         lstSnapshot.append(value)
+      return tuple(lstSnapshot)
+
+   """------------------------------------------------------------------
+      restore_snapshot: assign parse result from tplSnapshot (see
+                        make_snapshot), with fresh lists, so that
+      changes to them (such as access failure notes) do not reach
+      the snapshot; the nested lists of lstSnapshotDeep are shared
+      with the snapshot and copied only when handed out (see
+      nested_result)
+   """
+   def restore_snapshot(self,tplSnapshot):
+      for i in range(len(lstSnapshotFields)):
+         value = tplSnapshot[i]
+         if isinstance(value,tuple):
+            value = list(value)
+         elif isinstance(value,RunLengthList):
+            value = value.copy()
+         setattr(self,lstSnapshotFields[i],value)
+      self.bSharedNested = 1
+
+   """------------------------------------------------------------------
+      nested_result: entry of a member of lstSnapshotDeep, as handed
+                     out by the access methods: a copy, if shared with
+      a cached snapshot (see restore_snapshot)
+   """
+   def nested_result(self,value):
+      if self.bSharedNested:
+         return copy.deepcopy(value)
+      return value
+
+   """------------------------------------------------------------------
+      parse_many: parse the notations from iterNotations one after the
+                  other with this object (and its DataFace object),
+      generating one record per notation; nothing is kept from one
+      notation to the next, except client annotations, client aliases
+      and parsing options, so that memory stays bounded for input of
+      any length (such as lines read from a file)
+
+      arguments: iterNotations, any iterable of notation strings
+                 lstFields, names of record fields (see
+                    dictRecordFields), default:
+                    ['notation','work_notation','mf_total','msgs_err']
+                 sLevel, analysis level (see parse)
+
+      EXAMPLE: for (sNotation,sMfTotal) in oNotation.parse_many(
+                           open('notations.txt'),['notation','mf_total']):
+                  ...
+
+      return: generator of tuples with one value per name in lstFields
+              (mf_total is None for a notation with errors; lists are
+              copies, since the object reuses its own for the next
+              notation; a notation for which parsing raises an
+              exception gets None for fields other than notation and
+              msgs_err); generates nothing, if a field name is unknown
+              (with message in msgs_err)
+   """
+   def parse_many(self, iterNotations, lstFields=None, sLevel='full'):
+
+      if lstFields == None:
+         lstFields = ['notation','work_notation','mf_total','msgs_err']
+      for sField in lstFields:
+         if not dictRecordFields.has_key(sField):
+            sMsg = "parse_many: unknown record field '%s'" % sField
+            self.lstErrors.append(sMsg)
+            return
+      lstMethods = map(lambda sField: dictRecordFields[sField], lstFields)
+
+      if self.oResultCache != None:
+         self.client_fingerprint() # once, kept by set_user_notation
+      for sNotation in iterNotations:
+         self.set_user_notation(sNotation.strip())
+         try:
+            lstRecord = self.make_record(lstMethods,sLevel)
+         except Exception, e:
+            sMsg = 'parse_many: %s: %s' % (e.__class__.__name__,e)
+            self.lstErrors.append(sMsg)
+            lstRecord = []
+            for sMethod in lstMethods:
+               if sMethod == 'user_notation':
+                  lstRecord.append(self.sUserNotation)
+               elif sMethod == 'msgs_err':
+                  lstRecord.append(list(self.lstErrors))
+               else:
+                  lstRecord.append(None)
+         yield tuple(lstRecord)
+
+   """------------------------------------------------------------------
+      make_record: parse self.sUserNotation at level sLevel and return
+                   the list of values of the methods named in
+      lstMethods (see parse_many)
+   """
+   def make_record(self,lstMethods,sLevel):
+      lstErrors = self.parse(None,sLevel)
+      lstRecord = []
+      for sMethod in lstMethods:
+         if sMethod == 'mf_total' and len(lstErrors) > 0:
+            lstRecord.append(None)
+            continue
+         value = getattr(self,sMethod)()
+         if isinstance(value,RunLengthList):
+            value = value.copy()
+         elif isinstance(value,list):
+            value = list(value)
+         lstRecord.append(value)
+      return lstRecord
+
+   #===================================================================#
+   # SCAN notation                                                     #
+   #===================================================================#
+   """------------------------------------------------------------------
+      scan_parts: split sText into dot-separated components (ignoring
+                  dots inside curly braces) in a single pass over the
+      curly braces and dots of sText, noting for each component where
+      its first curly brace closes and where the curly brace at its
+      right end opens (for aliases and multipliers);
+      if bStrict is 1, sText is a user notation and the scan gives up
+      on backslashes, blanks, invalid characters and client
+      annotations ('{$*' or '{$$'), which are left to the stepwise
+      preprocessing (replace_client_ann to replace_builtin_ali)
+
+      EXAMPLE: for sText = 'O{6}.{NTf2(1-)}'
+               return: [('O{6}',3,1), ('{NTf2(1-)}',9,0)]
+
+      return: list of component descriptors
+                 (sCompnt, iFirstClose, iEndOpen)
+              with positions in sCompnt (-1, if no such curly brace),
+              or None if curly braces are unbalanced or (if bStrict)
+              the scan gives up
+   """
+   def scan_parts(self,sText,bStrict=0):
+      reScan = reScanCurlyDot
+      if bStrict:
+         reScan = reScanStrict
+      lstDescr = []
+      iStart = 0          # start of current component
+      iFirstClose = -1    # first '}' in current component
+      iTopOpen = iTopClose = -1 # last curly pair at top level
+      lstOpen = []        # positions of unclosed '{'
+      for oMatch in reScan.finditer(sText):
+         iPos = oMatch.start()
+         c = sText[iPos]
+         if c == '{':
+            if bStrict and sText[iPos+1:iPos+2] == '$' and \
+               sText[iPos+2:iPos+3] in ['*','$']:
+               return None
+            lstOpen.append(iPos)
+         elif c == '}':
+            if len(lstOpen) == 0:
+               return None
+            iOpen = lstOpen.pop()
+            if iFirstClose < 0:
+               iFirstClose = iPos - iStart
+            if len(lstOpen) == 0:
+               iTopOpen  = iOpen
+               iTopClose = iPos
+         elif c == '.':
+            if len(lstOpen) == 0:
+               lstDescr.append(self.part_descr(sText,iStart,iPos,
+                                  iFirstClose,iTopOpen,iTopClose))
+               iStart = iPos + 1
+               iFirstClose = iTopOpen = iTopClose = -1
+         else:
+            return None
+      if len(lstOpen) > 0:
+         return None
+      lstDescr.append(self.part_descr(sText,iStart,len(sText),
+                                      iFirstClose,iTopOpen,iTopClose))
+      return lstDescr
+
+   """------------------------------------------------------------------
+      part_descr: component descriptor for sText[iStart:iEnd] (see
+                  scan_parts)
+   """
+   def part_descr(self,sText,iStart,iEnd,iFirstClose,iTopOpen,iTopClose):
+      iEndOpen = -1
+      if iTopClose == iEnd - 1 and iTopClose >= 0:
+         iEndOpen = iTopOpen - iStart
+      return (sText[iStart:iEnd],iFirstClose,iEndOpen)
+
+   """------------------------------------------------------------------
+      replace_ali_scanned: replace client aliases and then built-in
+                           aliases in the components of lstDescr (see
+      scan_parts) as done by replace_client_ali and
+      replace_builtin_ali with the dot-joined notation
+      return: list of component descriptors or None, if replacement
+              code has unbalanced curly braces or a component is empty
+              (which is left to the stepwise preprocessing)
+   """
+   def replace_ali_scanned(self,lstDescr):
+
+      # client aliases
+      lstClient = []
+      for tplDescr in lstDescr:
+         (sSub,iFirstClose,iEndOpen) = tplDescr
+         if sSub[0:2] == '{$':
+            if len(sSub) < 4:
+               return None # error reported by replace_client_ali
+            sAli = sSub[1:iFirstClose]
+            if self.dictClientAli.has_key(sAli): # replacement code found
+               lstNew = self.scan_parts(self.dictClientAli[sAli] + \
+                                        sSub[iFirstClose+1:])
+               if lstNew == None:
+                  return None
+               lstClient += lstNew
+               continue
+         lstClient.append(tplDescr)
+
+      # built-in aliases
+      lstBuiltin = []
+      for tplDescr in lstClient:
+         (sSub,iFirstClose,iEndOpen) = tplDescr
+         if len(sSub) >= 4 and sSub[0] == '{' and sSub[1].isalpha() \
+            and iFirstClose > 2:
+            sCompnt = self.oDataFace.compnt_notation_by_alias(
+                                                     sSub[1:iFirstClose])
+            if sCompnt != None:
+               lstNew = self.scan_parts(sCompnt + sSub[iFirstClose+1:])
+               if lstNew == None:
+                  return None
+               lstBuiltin += lstNew
+               continue
+         lstBuiltin.append(tplDescr)
+
+      # empty components are left to the stepwise preprocessing
+      for tplDescr in lstBuiltin:
+         if len(tplDescr[0]) == 0:
+            return None
+
+      return lstBuiltin
+
    #===================================================================#
    # REPLACE client notations                                          #
    #===================================================================#
@@ -260,12 +964,7 @@ class Notation:
    """
    def eliminate_backslashes_and_white_space(self,sCurrNotation):
 
-      sModified = sCurrNotation
-      lstParts  = sCurrNotation.split('\\')
-      if len(lstParts) > 1:
-         sModified = lstParts[0].strip()
-         for sPart in lstParts[1:]:
-            sModified += sPart.strip()
+      sModified = join_backslash_parts(sCurrNotation)
                
       # check for blanks
       ipos = sModified.find(' ')
@@ -401,30 +1100,28 @@ class Notation:
                    self.lstCpsTypes        
                    self.lstObjSmiCps 
                    self.lstObjSfnCps
-                   
-      assign: self.sWorkNotation     
-      return: self.sWorkNotation
-   """
-   def make_work_notation(self,sCurrNotation):
 
-      if len(sCurrNotation) < 2:
+      lstDescr: components of sCurrNotation, if already split by
+                scan_parts
 
-         # check if upper-case letter for element symbol
-         if sCurrNotation.isupper():
+      A component with multiplier (X{n}) is parsed once and entered
+      as one run of n entries into the lists above (see
+      RunLengthList); the work notation, with X repeated n times, is
+      only made on request (see work_notation).
+                   
+      assign: self.sWorkNotation (composites)
+              self.lstWorkParts (dot-separated components)
+      return: self.sWorkNotation (None for dot-separated components)
+   """
+   def make_work_notation(self,sCurrNotation,lstDescr=None):
 
-            self.sWorkNotation = sCurrNotation
-            self.nCompnt = 1  
-            self.lstCompnt.append(sCurrNotation)  
-            self.lstTypes.append('smi')
-            oSmi = csm_annsmi.AnnotatedSmiles(sCurrNotation)
-            self.lstObjSmi.append(oSmi)
-            self.lstObjSfn.append(None)
-            return self.sWorkNotation
-         else:
-            sMsg  = 'make_work_notation: one-char notation has to' 
-            sMsg += ' consist of upper-case letter for organic-set atom'
-            self.lstErrors.append(sMsg)                              
-            return None
+      # one-char notation: upper-case letter for element symbol,
+      # parsed as SMILES component below
+      if len(sCurrNotation) < 2 and not sCurrNotation.isupper():
+         sMsg  = 'make_work_notation: one-char notation has to' 
+         sMsg += ' consist of upper-case letter for organic-set atom'
+         self.lstErrors.append(sMsg)                              
+         return None
 
       # Composites and interface-connected structures
       if sCurrNotation[0]=='{' and  sCurrNotation[1]=='/':
@@ -433,12 +1130,27 @@ class Notation:
          return self.sWorkNotation
 
       # apply multiplier and assign remaining variables
-      lstCompntTemp = self.split_into_parts(sCurrNotation,'.')
+      if lstDescr == None:
+         lstCompntTemp = self.split_into_parts(sCurrNotation,'.')
+      else:
+         lstCompntTemp = lstDescr
       self.lstCompnt = []
       iCompnt = 0
-      self.sWorkNotation = ''          
+      self.sWorkNotation = None
       for sCompntTemp in lstCompntTemp:
-         (sCompnt,sMulti) = self.splitOffRightEndCurly(sCompntTemp)
+         if lstDescr == None:
+            sCompnt = sMulti = None
+            lstSpans = scan_end_curlies(sCompntTemp)
+            if len(lstSpans) > 0 and lstSpans[-1][0] > 0:
+               iEndOpen = lstSpans[-1][0]
+               sCompnt = sCompntTemp[:iEndOpen]
+               sMulti  = sCompntTemp[iEndOpen+1:-1]
+         else:
+            (sCompntTemp,iFirstClose,iEndOpen) = sCompntTemp
+            sCompnt = sMulti = None
+            if iEndOpen > 0: # end curly cannot start at position 0
+               sCompnt = sCompntTemp[:iEndOpen]
+               sMulti  = sCompntTemp[iEndOpen+1:-1]
 
          nMulti = 1       
          if sMulti != None:
@@ -448,71 +1160,122 @@ class Notation:
          if nMulti > 1:
             sSubnotation = sCompnt
          sType = self.evaluate_composite_type(sSubnotation,iCompnt)
-         oSmi = oSfn = None         
-         for i in range(0,nMulti):
-            
-            self.lstTypes.append(sType)            
-
-            if cmp(sType,'smi') == 0:
-               if i == 0:
-                  oSmi = csm_annsmi.AnnotatedSmiles(self.oDataFace,sSubnotation)
-                  oSmi.parse()                  
-               self.lstObjSmi.append(oSmi)
-               self.lstObjSfn.append(None)
-               if len(oSmi.msgs_err()) == 0:
-                  sMfHill = oSmi.mf_hill_format()
-                  self.lstMfHill.append(sMfHill)
-               else:
-                  self.lstMfHill.append(None)
-
-               self.lstCompntAnn.append(oSmi.caa_entries())
-                  
-            elif cmp(sType,'sfn') == 0:  
-               if i == 0:
-
-                  # split at first '}' to separate sfn from annotations
-                  pair = sSubnotation.split('}',1)
-                  if len(pair) != 2 or len(pair[0]) < 4:
-                     sMsg  = 'make_work_notation: missing "}" in sfn ' 
-                     sMsg += '%s (%d. subnotation)' % (sSubnotation,iCompnt)
-                     self.lstErrors.append(sMsg)               
-                     continue
-                  sSfn = pair[0][2:]
-
-                  lstCaa = None
-                  # if annotations...
-                  if len(pair[1]) > 3:                      
-                     lstCaa = self.convert_annseq(pair[1])
-                  self.lstCompntAnn.append(lstCaa)
-                  
-                  oSfn = csm_sfn.StoichFormNotation(self.oDataFace,sSfn)    
-                  oSfn.parse()                 
-               self.lstObjSmi.append(None)
-               self.lstObjSfn.append(oSfn)             
-               if len(oSfn.msgs_err()) == 0:
-                  sMfHill = oSfn.mf_hill_format()
-                  self.lstMfHill.append(sMfHill)
-               else:
-                  self.lstMfHill.append(None)
-            elif cmp(sType,'ali') == 0:
-               self.lstObjSmi.append(None)
-               self.lstObjSfn.append(None)                           
-               self.lstMfHill.append(None)
-               self.lstCompntAnn.append(None)
+         self.lstTypes.append(sType,nMulti)
+
+         if cmp(sType,'smi') == 0:
+            oSmi = self.parsed_component('smi',sSubnotation)
+            self.lstObjSmi.append(oSmi,nMulti)
+            self.lstObjSfn.append(None,nMulti)
+            if len(oSmi.msgs_err()) == 0:
+               sMfHill = oSmi.mf_hill_format()
+               self.lstMfHill.append(sMfHill,nMulti)
             else:
-               self.lstCompntAnn.append(None)
+               self.lstMfHill.append(None,nMulti)
 
+            self.lstCompntAnn.append(oSmi.caa_entries(),nMulti)
+               
+         elif cmp(sType,'sfn') == 0:  
+
+            # split at first '}' to separate sfn from annotations
+            pair = sSubnotation.split('}',1)
+            if len(pair) != 2 or len(pair[0]) < 4:
+               sMsg  = 'make_work_notation: missing "}" in sfn ' 
+               sMsg += '%s (%d. subnotation)' % (sSubnotation,iCompnt)
+               self.lstErrors.append(sMsg)               
+               self.append_no_component(nMulti)
+            else:
+               sSfn = pair[0][2:]
 
-            if iCompnt > 0:
-               self.sWorkNotation += '.'            
-            self.sWorkNotation += sSubnotation
+               lstCaa = None
+               # if annotations...
+               if len(pair[1]) > 3:                      
+                  lstCaa = self.convert_annseq(pair[1])
+               self.lstCompntAnn.append(lstCaa,nMulti)
                
-            iCompnt += 1
+               oSfn = self.parsed_component('sfn',sSfn)
+               self.lstObjSmi.append(None,nMulti)
+               self.lstObjSfn.append(oSfn,nMulti)
+               if len(oSfn.msgs_err()) == 0:
+                  sMfHill = oSfn.mf_hill_format()
+                  self.lstMfHill.append(sMfHill,nMulti)
+               else:
+                  self.lstMfHill.append(None,nMulti)
+         else: # alias, or invalid (empty) component
+            self.append_no_component(nMulti)
+
+         self.lstWorkParts.append((sSubnotation,nMulti))
+         iCompnt += nMulti
             
       self.nCompnt = iCompnt
       return self.sWorkNotation
 
 
+   """------------------------------------------------------------------
+      append_no_component: append placeholders (None) for nMulti
+                           components without parsed object, so that
+      all component lists stay in step
+   """
+   def append_no_component(self,nMulti):
+      self.lstObjSmi.append(None,nMulti)
+      self.lstObjSfn.append(None,nMulti)
+      self.lstMfHill.append(None,nMulti)
+      self.lstCompntAnn.append(None,nMulti)
+
+   """------------------------------------------------------------------
+      parsed_component: parsed object for component notation sCompnt
+                        of type sType ('smi' or 'sfn'), taken from the
+      process-wide component cache, if available, else made and
+      stored there (by DataFace object, SMILES objects also by level,
+      lazy mode and matrix backend); only components of a frozen
+      DataFace object, or of an overlay on one, are cached and made
+      with that object (see DataFace.shared_data), so that the cache
+      keeps no other DataFace alive; cached objects are shared (also
+      by equal components within one notation, like those in 'O.O.O')
+      and must not be modified; an object that has collected further
+      error messages after parsing (e.g. from invalid access) is
+      replaced by a new one; a SMILES object that is not cached
+      belongs to this Notation object and is recycled by reset
+
+      return: AnnotatedSmiles or StoichFormNotation object
+   """
+   def parsed_component(self,sType,sCompnt):
+      oCache = None
+      oDataFace = self.oDataFace
+      if oComponentCache != None and len(sCompnt) <= nComponentMaxChars:
+         oShared = self.oDataFace.shared_data()
+         if oShared != None:
+            oCache = oComponentCache
+            oDataFace = oShared
+      tplKey = None
+      if oCache != None:
+         if sType == 'smi':
+            tplKey = (sType,sCompnt,oDataFace.cache_identity(),
+                      self.sLevel,self.bLazyTopo,csm_annsmi.sMatrixBackend)
+         else:
+            tplKey = (sType,sCompnt,oDataFace.cache_identity())
+         tplEntry = oCache.get(tplKey)
+         if tplEntry != None:
+            (oCompnt,nErrors) = tplEntry
+            if len(oCompnt.msgs_err()) == nErrors:
+               return oCompnt
+
+      if sType == 'smi':
+         oCompnt = csm_annsmi.oSmilesPool.acquire(oDataFace,sCompnt,
+                                                  self.bLazyTopo)
+         if tplKey == None:
+            self.lstOwnedSmi.append(oCompnt)
+         if self.sLevel == 'formula':
+            oCompnt.parse_formula()
+         else:
+            oCompnt.parse()
+      else:
+         oCompnt = csm_sfn.StoichFormNotation(oDataFace,sCompnt)
+         oCompnt.parse()
+
+      if tplKey != None:
+         oCache.put(tplKey,(oCompnt,len(oCompnt.msgs_err())))
+      return oCompnt
+
    """------------------------------------------------------------------
       evaluate_component_type: evaluate the component for given
                                component notation
@@ -557,35 +1320,26 @@ class Notation:
    """
    def scan_composite_notation(self,sCurrNotation):
 
-      # get annotations
-      sEnd = '>'
-      sRemainder = sEnd + sCurrNotation
-      lstOfPairs = []
-      for k in range(len(sCurrNotation)):
-         (sRemainder,sStr) = self.splitOffRightEndCurly(sRemainder)
-         if cmp(sEnd,sRemainder) == 0:
-            sRemainder = '{' + sStr + '}'
-            break            
-         
-         oCurly = csm_curlyann.CurlyAnnotation(self.oDataFace,sStr)
-         lstErrorsCurly = oCurly.parse()
-         if len(lstErrorsCurly) == 0:
-            pair = oCurly.entry()
-            lstOfPairs.append(pair)
-                            
+      # get annotations: curly pairs following the composite string
+      lstSpans = scan_end_curlies(sCurrNotation)
+      if len(lstSpans) == 0 or lstSpans[0][0] > 0:
+         sMsg  = 'scan_composite_notation: text outside curly braces '
+         sMsg += 'in %s' % sCurrNotation
+         self.lstErrors.append(sMsg)
+         return None
+      lstOfPairs = self.parsed_annotations(sCurrNotation,lstSpans[1:])
       self.lstCompntAnn.append(lstOfPairs)
      
       # evaluate composite string
+      sRemainder = sCurrNotation[:lstSpans[0][1]+1]
       lstParts = self.split_into_parts(sRemainder[2:-1],'/')
       
       self.nCpsParts = len(lstParts)
       self.lstTypes.append('cps')
 
       sCpsNotation = '{'
-      iPart = 0
       for sPart in lstParts:
          
-         iPart += 1
          sCpsNotation += '/'
             
          if sPart[0] == '{':
@@ -593,9 +1347,6 @@ class Notation:
             if sPart[1] == '*': # SFN 
                self.lstCpsParts.append(sPart)   
                self.lstCpsTypes.append('sfn')
-               oSfn = csm_sfn.StoichFormNotation(sCurrNotation)
-               self.lstObjSmiCps.append(None)
-               self.lstObjSfnCps.append(oSfn)
                sCpsNotation +=  sPart
             else:  # alias
                pass
@@ -603,40 +1354,127 @@ class Notation:
          else: # (annotated) SMILES notation                   
             self.lstCpsParts.append(sPart)   
             self.lstCpsTypes.append('smi')
-            oSmi = csm_annsmi.AnnotatedSmiles(sCurrNotation)
-            self.lstObjSmiCps.append(oSmi)
-            self.lstObjSfnCps.append(None)
             sCpsNotation += sPart
 
       sCpsNotation += '}'
+
+      self.parse_cps_parts()
        
       return sCpsNotation
 
+   """------------------------------------------------------------------
+      parse_cps_parts: parse the parts of a composite (self.lstCpsParts)
+                       like components (see parsed_cps_part), in
+      worker processes, if set_cps_parser was called and the parts are
+      large enough, else in this process
+
+      assignments: self.lstObjSmiCps
+                   self.lstObjSfnCps
+                   self.lstMfHillCps
+                   self.lstCaaCps
+                   self.lstErrCps
+   """
+   def parse_cps_parts(self):
+      lstResults = None
+      if self.oCpsParser != None and len(self.lstCpsParts) > 1 and \
+         self.oCpsParser.is_parallel():
+         nChars = sum(map(len,self.lstCpsParts))
+         if nChars >= self.nCpsMinChars:
+            lstResults = self.oCpsParser.parse_cps_parts(
+                            zip(self.lstCpsTypes,self.lstCpsParts),
+                            self.sLevel,self.bLazyTopo)
+
+      for iPart in range(len(self.lstCpsParts)):
+         sType = self.lstCpsTypes[iPart]
+         if lstResults == None:
+            (oCompnt,sMfHill,lstCaa,lstErr) = \
+               self.parsed_cps_part(sType,self.lstCpsParts[iPart])
+         else: # parsed in worker process
+            oCompnt = None
+            (sMfHill,lstCaa,lstErr) = lstResults[iPart]
+         if cmp(sType,'smi') == 0:
+            self.lstObjSmiCps.append(oCompnt)
+            self.lstObjSfnCps.append(None)
+         else:
+            self.lstObjSmiCps.append(None)
+            self.lstObjSfnCps.append(oCompnt)
+         self.lstMfHillCps.append(sMfHill)
+         self.lstCaaCps.append(lstCaa)
+         self.lstErrCps.append(lstErr)
+         for sErr in lstErr:
+            sMsg  = 'Notation.parse: %d. composite part ' % (iPart+1)
+            sMsg += '< %s' % sErr
+            self.lstErrors.append(sMsg)
+
+   """------------------------------------------------------------------
+      parsed_cps_part: parse composite part sPart of type sType ('smi'
+                       or 'sfn') through the component cache (see
+      parsed_component)
+      return: (oCompnt, sMfHill, lstCaa, lstErr) with the SMILES or
+              SFN object (None, if sPart is no valid SFN), its
+              molecular formula in Hill format (None, if with errors),
+              its annotations and error messages (including those of
+              its annotation sequence, which are not left in
+              self.lstErrors)
+   """
+   def parsed_cps_part(self,sType,sPart):
+      lstAnnErr = []
+      if cmp(sType,'smi') == 0:
+         oCompnt = self.parsed_component('smi',sPart)
+         lstCaa = oCompnt.caa_entries()
+      else:
+         # split at first '}' to separate sfn from annotations
+         pair = sPart.split('}',1)
+         if len(pair) != 2 or len(pair[0]) < 4:
+            sMsg = 'parsed_cps_part: missing "}" in sfn %s' % sPart
+            return (None,None,None,[sMsg])
+         lstCaa = None
+         if len(pair[1]) > 3:
+            nErrors = len(self.lstErrors)
+            lstCaa = self.convert_annseq(pair[1])
+            lstAnnErr = self.lstErrors[nErrors:]
+            del self.lstErrors[nErrors:]
+         oCompnt = self.parsed_component('sfn',pair[0][2:])
+      lstErr = list(oCompnt.msgs_err()) + lstAnnErr
+      sMfHill = None
+      if len(lstErr) == 0:
+         sMfHill = oCompnt.mf_hill_format()
+      return (oCompnt,sMfHill,lstCaa,lstErr)
+
    """------------------------------------------------------------------   
       convert a sequence of annotations in Python structure
 
       EXAMPLE:
          For sAnnSeq = {IMa=Cu}{cr}'
-         return:       [['IM', {'a': 'Cu'}], ['cr', {}]]
+         return:       [['cr', {}], ['IM', {'a': 'Cu'}]]
       
-      return: list of pair, where each pair = [AM, {key: val}] 
+      return: list of pair, where each pair = [AM, {key: val}],
+              from right to left
    """
    def convert_annseq(self, sAnnSeq):
-      lstOfPairs = []
+      lstSpans = scan_end_curlies(sAnnSeq)
+      if len(lstSpans) == 0 or lstSpans[0][0] > 0:
+         sMsg = 'convert_annseq: text outside curly braces in %s' % sAnnSeq
+         self.lstErrors.append(sMsg)
+      return self.parsed_annotations(sAnnSeq,lstSpans)
 
-      sEnd = '>'
-      sRemainder = sEnd + sAnnSeq
-      for k in range(len(sAnnSeq)):
-         (sRemainder,sAnn) = self.splitOffRightEndCurly(sRemainder)
-         oCurly = csm_curlyann.CurlyAnnotation(self.oDataFace,sAnn)
+   """------------------------------------------------------------------
+      parsed_annotations: parse the curly annotations of sText at the
+                          spans in lstSpans (see scan_end_curlies)
+      return: list of pairs [AM, {key: val}] of valid annotations,
+              from right to left
+   """
+   def parsed_annotations(self,sText,lstSpans):
+      lstOfPairs = []
+      for i in range(len(lstSpans)-1,-1,-1):
+         (iOpen,iClose) = lstSpans[i]
+         oCurly = csm_pool.oCurlyPool.acquire(self.oDataFace,
+                                              sText[iOpen+1:iClose])
          lstErrorsCurly = oCurly.parse()
          if len(lstErrorsCurly) == 0:
             pair = oCurly.entry()
             lstOfPairs.append(pair)
-         
-         if cmp(sEnd,sRemainder) == 0:
-            break            
-
+         csm_pool.oCurlyPool.release(oCurly)
       return lstOfPairs
 
    #===================================================================#
@@ -725,6 +1563,12 @@ class Notation:
       self.lstAccFail.append(sMsg)                  
       return None
 
+   def ipart_out_of_range(self,iPart,sMeth):
+      sMsg  = '%s_cps_part(%d): iPart out of range \n' % (sMeth,iPart)
+      sMsg += '   composite has %d parts' % len(self.lstCpsParts)
+      self.lstAccFail.append(sMsg)                  
+      return None
+
    def iatom_out_of_range(self,iCompnt,iAtom,sMeth):
       sMsg  = '%s_compnt(%d): iAtom out of range \n' % (sMeth,iAtom)
       sMsg += '   for %d. components' % iCompnt
@@ -758,6 +1602,8 @@ class Notation:
  
    def aaa_indices_compnt(self,iuCompnt):
       return self.csm_compnt(iuCompnt,'aaa_indices')
+   def adj_matrix_compnt(self,iuCompnt):
+      return self.csm_compnt(iuCompnt,'adj_matrix')
    def aaa_indices_iu_compnt(self,iuCompnt):
       return self.csm_compnt(iuCompnt,'aaa_indices_iu')
    def deloc_charge_compnt(self,iuCompnt):
@@ -817,6 +1663,8 @@ class Notation:
          elif cmp(sAtList,'aaa_indices_iu')==0:
             lst =  self.lstObjSmi[iCompnt].aaa_indices()
             return map(lambda i: i+1, lst)          
+         elif cmp(sAtList,'adj_matrix')==0:
+            return self.lstObjSmi[iCompnt].adj_matrix()
          elif cmp(sAtList,'deloc_charge')==0:
             return self.lstObjSmi[iCompnt].deloc_charge()      
          elif cmp(sAtList,'dmat')==0:
@@ -876,7 +1724,47 @@ class Notation:
          return None
       else:
          iCompnt = iuCompnt - 1
-         return self.lstCompntAnn[iCompnt]
+         return self.nested_result(self.lstCompntAnn[iCompnt])
+
+   #===================================================================#
+   # ACCESS TO COMPOSITE PARTS                                         #
+   # iuPart = iPart + 1 (0 < iuPart <= len(self.lstCpsParts))          #
+   #===================================================================#
+   def aaa_entries_cps_part(self,iuPart,iuAtom):
+      if iuPart < 1 or iuPart > len(self.lstCpsParts):
+         return self.ipart_out_of_range(iuPart,'aaa_entries')
+      oSmi = self.lstObjSmiCps[iuPart-1]
+      if oSmi == None: # SFN, or parsed in worker process
+         sMsg  = 'aaa_entries_cps_part(%d): ' % iuPart
+         sMsg += 'no SMILES object for part'
+         self.lstAccFail.append(sMsg)
+         return None
+      if iuAtom < 1 or iuAtom > oSmi.numof_atoms():
+         sMsg  = 'aaa_entries_cps_part(%d): iAtom out of range \n' % iuAtom
+         sMsg += '   for %d. part' % iuPart
+         self.lstAccFail.append(sMsg)
+         return None
+      return oSmi.aaa_entries(iuAtom)
+
+   def caa_entries_cps_part(self,iuPart):
+      if iuPart < 1 or iuPart > len(self.lstCpsParts):
+         return self.ipart_out_of_range(iuPart,'caa_entries')
+      return self.nested_result(self.lstCaaCps[iuPart-1])
+
+   def mf_cps_part(self,iuPart):
+      if iuPart < 1 or iuPart > len(self.lstCpsParts):
+         return self.ipart_out_of_range(iuPart,'mf')
+      return self.lstMfHillCps[iuPart-1]
+
+   def msgs_err_cps_part(self,iuPart):
+      if iuPart < 1 or iuPart > len(self.lstCpsParts):
+         return self.ipart_out_of_range(iuPart,'msgs_err')
+      return self.nested_result(self.lstErrCps[iuPart-1])
+
+   def notation_cps_part(self,iuPart):
+      if iuPart < 1 or iuPart > len(self.lstCpsParts):
+         return self.ipart_out_of_range(iuPart,'notation')
+      return self.lstCpsParts[iuPart-1]
 
    #===================================================================#
    # MISCELLANEOUS REQUESTS                                            #
@@ -887,7 +1775,27 @@ class Notation:
    def numof_composite_parts(self): return self.nCpsParts
    def type_components(self):       return self.lstTypes
    def type_composite_parts(self):  return self.lstCpsTypes
-   def work_notation(self):         return self.sWorkNotation
+   def user_notation(self):         return self.sUserNotation
+
+   """------------------------------------------------------------------
+      work_notation: work notation, made from self.lstWorkParts on
+                     first request (see make_work_notation)
+   """
+   def work_notation(self):
+      if self.sWorkNotation == None and self.nCompnt != None:
+         lstParts = []
+         for (sSubnotation,nMulti) in self.lstWorkParts:
+            lstParts.extend([sSubnotation] * nMulti)
+         self.sWorkNotation = '.'.join(lstParts)
+      return self.sWorkNotation
+
+   """------------------------------------------------------------------
+      component_runs: list of pairs (type, multiplier), one per
+                      component of the notation before applying
+      multipliers (see RunLengthList.runs)
+   """
+   def component_runs(self):
+      return self.lstTypes.runs()
 
    def mf_compnt(self,iuCompnt):
       if iuCompnt < 1 or iuCompnt > self.nCompnt:
@@ -901,18 +1809,105 @@ class Notation:
          else:
             return None
 
+   """------------------------------------------------------------------
+      mf_total: molecular formula of all components in Hill format
+                (None if a component is neither SMILES nor SFN, such
+      as a composite, whose parts have no stoichiometric ratio; see
+      mf_cps_part, or if a component is empty or invalid), made on first request by mf_total_by_counts
+   """
    def mf_total(self):
-      oMfTotal = csm_molform.MolecularFormula(self.oDataFace)
+      if not self.bMfTotal:
+         self.sMfTotal = self.mf_total_by_counts()
+         self.bMfTotal = 1
+      return self.sMfTotal
+
+   """------------------------------------------------------------------
+      mf_total_by_counts: add up the element/isotope counts and charge
+                          numbers of the components' MolecularFormula
+      objects (a multiplied component, which is one run of the same
+      object, once with its multiplier); components without
+      a valid formula, or with symbols other than (labelled) atomic
+      symbols, such as '*', which mf_total_by_strings drops when
+      reading the linear notation, are left to mf_total_by_strings
+      return: molecular formula in Hill format
+   """
+   def mf_total_by_counts(self):
+      if len(self.lstTypes) == 0:
+         return self.mf_total_by_strings()
+
+      # components as runs of the same object: [oMf, nTimes]
+      lstRuns = []
+      oPrev = None
+      iCompnt = 0
+      for (sType,nTimes) in self.lstTypes.runs():
+         if cmp(sType,'smi') == 0:
+            lstObj = self.lstObjSmi
+         elif cmp(sType,'sfn') == 0:
+            lstObj = self.lstObjSfn
+         else:
+            break
+         if iCompnt + nTimes > len(lstObj) or \
+            lstObj[iCompnt + nTimes - 1] is not lstObj[iCompnt]:
+            return self.mf_total_by_strings()
+         oCompnt = lstObj[iCompnt]
+         if oCompnt == None: # empty or invalid component
+            return None
+         iCompnt += nTimes
+         if oCompnt is oPrev:
+            lstRuns[-1][1] += nTimes
+            continue
+         oPrev = oCompnt
+         oMf = oCompnt.mf_object()
+         if oMf == None or oMf.charge_number() == None or \
+            len(oMf.msgs_err()) > 0 or oMf.linear_notation() == None:
+            return self.mf_total_by_strings()
+         lstRuns.append([oMf,nTimes])
+      if iCompnt < len(self.lstTypes): # neither SMILES nor SFN
+         return None
+
+      dictOfDict = {}
+      iCharge = 0
+      for (oMf,nTimes) in lstRuns:
+         for (sAtSymb,subdict) in oMf.dict_of_dict().items():
+            if not dictOfDict.has_key(sAtSymb):
+               dictOfDict[sAtSymb] = {}
+            subdictTotal = dictOfDict[sAtSymb]
+            for (sSpecific,iSubscript) in subdict.items():
+               if iSubscript < 1 or reAtSymbCount.match(sSpecific) == None:
+                  return self.mf_total_by_strings()
+               subdictTotal[sSpecific] = subdictTotal.get(sSpecific,0) + \
+                                         iSubscript * nTimes
+         iCharge += oMf.charge_number() * nTimes
+
+      sCharge = '0'
+      if iCharge > 0:
+         sCharge = '%d+' % iCharge
+      elif iCharge < 0:
+         sCharge = '%d-' % (-iCharge)
+      oMfTotal = csm_pool.oMfPool.acquire(self.oDataFace)
+      oMfTotal.set_dict_of_dict(dictOfDict,sCharge)
+      sMfTotal = oMfTotal.hill_format()
+      csm_pool.oMfPool.release(oMfTotal)
+      return sMfTotal
+
+   """------------------------------------------------------------------
+      mf_total_by_strings: add up the linear notations of the
+                           components' molecular formulae
+      return: molecular formula in Hill format
+   """
+   def mf_total_by_strings(self):
+      oMfTotal = csm_pool.oMfPool.acquire(self.oDataFace)
       iCompnt = 0
       for sType in self.lstTypes:
          sMf = None
-         if cmp(sType,'smi') == 0:
+         if cmp(sType,'smi') == 0 and self.lstObjSmi[iCompnt] != None:
             oSmi = self.lstObjSmi[iCompnt]
             sMf  = oSmi.mf_linear_notation()
-         elif cmp(sType,'sfn') == 0:
+         elif cmp(sType,'sfn') == 0 and self.lstObjSfn[iCompnt] != None:
             oSfn = self.lstObjSfn[iCompnt]
             sMf  = oSfn.mf_hill_format()
          else:
+            csm_pool.oMfPool.release(oMfTotal)
             return sMf
 
          # set or add
@@ -924,4 +1919,6 @@ class Notation:
          
          iCompnt += 1
 
-      return oMfTotal.hill_format()
+      sMfTotal = oMfTotal.hill_format()
+      csm_pool.oMfPool.release(oMfTotal)
+      return sMfTotal
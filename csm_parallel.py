@@ -0,0 +1,416 @@
+"""
+   This file:     csm_parallel.py
+   Last modified: October 18, 2026
+   Package:       CurlySMILES Version 1.0.1
+   Author:        Axel Drefahl
+   E-mail:        axeleratio@yahoo.com
+   Internet:      http://www.axeleratio.com/csm/proj/main.htm
+
+   Python module csm_parallel implements a class for parsing large
+   numbers of CurlySMILES notations with a pool of worker processes.
+
+   Copyright (C) 2010  Axel Drefahl
+
+   This file is part of the CurlySMILES package.
+
+   The CurlySMILES package is free software: you can redistribute it
+   and/or modify it under the terms of the GNU General Public License
+   as published by the Free Software Foundation, either version 3 of
+   the License, or (at your option) any later version.
+
+   The CurlySMILES package is distributed in the hope that it will be
+   useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+   of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with the CurlySMILES package.
+   If not, see <http://www.gnu.org/licenses/>.
+"""
+import os, time
+import csm_dataface, csm_notation
+
+# multiprocessing is optional (Python 2.6 or higher): without it,
+# ParallelParser parses in the calling process
+try:
+   import multiprocessing
+except ImportError:
+   multiprocessing = None
+
+#======================================================================#
+# RECORDS                                                              #
+#======================================================================#
+"""
+   parse_notations: parse the notations in lstNotations with
+                    oNotation (see Notation.parse_many); a notation
+   for which parsing raises an exception gets an error record
+   return: list of records (tuples with values for lstFields)
+"""
+def parse_notations(oNotation,lstNotations,lstFields,sLevel):
+   lstRecords = []
+   for sNotation in lstNotations:
+      try:
+         lstRecords += list(oNotation.parse_many([sNotation],lstFields,sLevel))
+      except Exception, e:
+         sMsg = 'parse_notations: %s: %s' % (e.__class__.__name__,e)
+         lstRecords.append(error_record(sNotation,lstFields,sMsg))
+   return lstRecords
+
+"""
+   error_record: record for sNotation that could not be parsed, with
+                 error message sMsg (fields other than 'notation' and
+   'msgs_err' are None)
+"""
+def error_record(sNotation,lstFields,sMsg):
+   lstRecord = []
+   for sField in lstFields:
+      if sField == 'notation':
+         lstRecord.append(sNotation.strip())
+      elif sField == 'msgs_err':
+         lstRecord.append([sMsg])
+      else:
+         lstRecord.append(None)
+   return tuple(lstRecord)
+
+"""
+   make_chunks: collect notations from iterNotations in lists of
+                about nChunkChars characters (at most nChunkMax
+   notations), so that chunks of long notations hold fewer of them
+   return: generator of lists of notations
+"""
+def make_chunks(iterNotations,nChunkChars,nChunkMax):
+   lstChunk = []
+   nChars = 0
+   for sNotation in iterNotations:
+      lstChunk.append(sNotation)
+      nChars += len(sNotation)
+      if nChars >= nChunkChars or len(lstChunk) >= nChunkMax:
+         yield lstChunk
+         lstChunk = []
+         nChars = 0
+   if len(lstChunk) > 0:
+      yield lstChunk
+
+#======================================================================#
+# WORKER process                                                       #
+#======================================================================#
+oWorkerNotation = None # Notation object of worker process
+lstWorkerFields = None # record fields
+sWorkerLevel    = None # analysis level
+
+"""
+   init_worker: make DataFace and Notation object of worker process
+                once, at start-up, and warm up with a first parse
+"""
+def init_worker(sCsmPath,dictClientAnn,dictClientAli,lstFields,sLevel):
+   global oWorkerNotation, lstWorkerFields, sWorkerLevel
+   oDataFace = csm_dataface.get_shared(sCsmPath)
+   oWorkerNotation = csm_notation.Notation(oDataFace)
+   oWorkerNotation.set_client_ann(dictClientAnn)
+   oWorkerNotation.set_client_ali(dictClientAli)
+   lstWorkerFields = lstFields
+   sWorkerLevel    = sLevel
+   parse_notations(oWorkerNotation,['CC(=O)O.[Na+]{aq}'],lstFields,sLevel)
+
+"""
+   parse_chunk: parse notations of one chunk in worker process
+   return: list of records
+"""
+def parse_chunk(lstNotations):
+   return parse_notations(oWorkerNotation,lstNotations,lstWorkerFields,
+                          sWorkerLevel)
+
+"""
+   parse_cps_part: parse composite part in worker process (see
+                   Notation.parsed_cps_part); tplPart = (sType, sPart,
+   sLevel, bLazyTopo)
+   return: (sMfHill, lstCaa, lstErr)
+"""
+def parse_cps_part(tplPart):
+   (sType,sPart,sLevel,bLazyTopo) = tplPart
+   oWorkerNotation.sLevel = sLevel
+   oWorkerNotation.set_lazy_topology(bLazyTopo)
+   (oCompnt,sMfHill,lstCaa,lstErr) = \
+      oWorkerNotation.parsed_cps_part(sType,sPart)
+   oWorkerNotation.release_owned_smi()
+   return (sMfHill,lstCaa,lstErr)
+
+#======================================================================#
+# PARALLEL parser                                                      #
+#======================================================================#
+class ParallelParser:
+   """
+      ParallelParser: parse notations with a pool of nWorkers processes
+                      (number of CPUs if None), each with the shared
+      DataFace object of its process, made once at start-up (see
+      csm_dataface.get_shared; from the CurlySMILES directory
+      sCsmPath, current working directory if None).
+      Notations are sent in chunks of about nChunkChars characters;
+      results come back as records (tuples with values for lstFields,
+      see Notation.parse_many), not as Notation objects.
+      If no chunk is completed within tTimeout seconds, the pool is
+      restarted and the pending chunks are sent again (a try is
+      counted for the nWorkers chunks sent first); a chunk that
+      failed more than nRetries times is split into single notations,
+      and a single notation that failed more than nRetries times gets
+      an error record. Without multiprocessing (or with nWorkers=0)
+      notations are parsed in the calling process.
+
+      EXAMPLE: oParser = csm_parallel.ParallelParser(4)
+               for (sNotation,sWork,sMfTotal,lstErrors) in \\
+                     oParser.parse(open('notations.txt')):
+                  ...
+               oParser.close()
+   """
+   def __init__(self,nWorkers=None,sCsmPath=None,lstFields=None,
+                sLevel='full',nChunkChars=20000,nChunkMax=2000,
+                tTimeout=60.0,nRetries=2):
+      if nWorkers == None:
+         nWorkers = 0
+         if multiprocessing != None:
+            nWorkers = multiprocessing.cpu_count()
+      if sCsmPath == None:
+         sCsmPath = os.getcwd()
+      if lstFields == None:
+         lstFields = ['notation','work_notation','mf_total','msgs_err']
+      self.nWorkers    = nWorkers
+      self.sCsmPath    = sCsmPath
+      self.lstFields   = lstFields
+      self.sLevel      = sLevel
+      self.nChunkChars = nChunkChars
+      self.nChunkMax   = nChunkMax
+      self.tTimeout    = tTimeout
+      self.nRetries    = nRetries
+      self.dictClientAnn = {}
+      self.dictClientAli = {}
+      self.oPool = None
+      self.nRestarts = 0 # number of pool restarts (see restart)
+      self.nSubmitted = 0 # number of tasks sent (see submit)
+
+   #===================================================================#
+   # SET data passed to worker processes                               #
+   #===================================================================#
+   def set_client_ann(self,dictClientAnn):
+      self.dictClientAnn = dictClientAnn
+   def set_client_ali(self,dictClientAli):
+      self.dictClientAli = dictClientAli
+
+   #===================================================================#
+   # POOL of worker processes                                          #
+   #===================================================================#
+   """------------------------------------------------------------------
+      is_parallel: 1 if notations are parsed by worker processes,
+                   0 if in the calling process
+   """
+   def is_parallel(self):
+      if multiprocessing == None or self.nWorkers < 1:
+         return 0
+      return 1
+
+   """------------------------------------------------------------------
+      start: start pool of worker processes, unless already started
+   """
+   def start(self):
+      if self.oPool != None or not self.is_parallel():
+         return
+      self.oPool = multiprocessing.Pool(self.nWorkers,init_worker,
+                      (self.sCsmPath,self.dictClientAnn,self.dictClientAli,
+                       self.lstFields,self.sLevel))
+
+   """------------------------------------------------------------------
+      close: terminate worker processes
+   """
+   def close(self):
+      if self.oPool != None:
+         self.oPool.terminate()
+         self.oPool.join()
+         self.oPool = None
+
+   """------------------------------------------------------------------
+      restart: replace pool (with crashed or hanging worker) by a new
+               one
+   """
+   def restart(self):
+      self.close()
+      self.start()
+      self.nRestarts += 1
+
+   #===================================================================#
+   # PARSE                                                             #
+   #===================================================================#
+   """------------------------------------------------------------------
+      parse: parse notations from iterNotations (any iterable of
+             notation strings, read as needed)
+
+      argument: bOrdered, if 1, records are generated in the order of
+                the notations, otherwise in the order chunks are
+                completed
+      return: generator of records, one per notation
+   """
+   def parse(self,iterNotations,bOrdered=1):
+
+      iterChunks = make_chunks(iterNotations,self.nChunkChars,
+                               self.nChunkMax)
+      if not self.is_parallel():
+         oNotation = csm_notation.Notation(
+                        csm_dataface.get_shared(self.sCsmPath))
+         oNotation.set_client_ann(self.dictClientAnn)
+         oNotation.set_client_ali(self.dictClientAli)
+         for lstChunk in iterChunks:
+            for tplRecord in parse_notations(oNotation,lstChunk,
+                                             self.lstFields,self.sLevel):
+               yield tplRecord
+         return
+
+      self.start()
+      nWindow = 2*self.nWorkers # chunks sent or kept for ordered output
+      dictTasks  = {} # {(iChunk,iPart): [lstNotations,oResult,nTries,
+                      #                  iSubmitted]}
+      dictChunks = {} # {iChunk: [nParts,{iPart: lstRecords}]}
+      dictDone   = {} # {iChunk: lstRecords}, completed, not yet generated
+      iChunkNext = 0  # next chunk to be generated (ordered output)
+      nChunks    = 0  # number of chunks read from iterChunks
+      bInputDone = 0
+      tProgress  = time.time()
+      while 1:
+
+         # keep the pool busy, but hold at most nWindow chunks
+         while not bInputDone and len(dictChunks)+len(dictDone) < nWindow:
+            try:
+               lstChunk = iterChunks.next()
+            except StopIteration:
+               bInputDone = 1
+               break
+            dictChunks[nChunks] = [1,{}]
+            self.submit(dictTasks,(nChunks,0),lstChunk,0)
+            nChunks += 1
+         if len(dictTasks) == 0 and len(dictChunks) == 0 and \
+            len(dictDone) == 0:
+            break
+
+         # collect completed tasks
+         lstFinished = []
+         for tplKey in dictTasks.keys():
+            oResult = dictTasks[tplKey][1]
+            if oResult.ready():
+               lstFinished.append(tplKey)
+         for tplKey in lstFinished:
+            (lstChunk,oResult,nTries,iSubmitted) = dictTasks[tplKey]
+            del dictTasks[tplKey]
+            try:
+               lstRecords = oResult.get()
+            except Exception, e:
+               sMsg = 'ParallelParser.parse: %s: %s' % \
+                      (e.__class__.__name__,e)
+               lstRecords = map(lambda sNotation:
+                                error_record(sNotation,self.lstFields,sMsg),
+                                lstChunk)
+            (iChunk,iPart) = tplKey
+            dictChunks[iChunk][1][iPart] = lstRecords
+            tProgress = time.time()
+
+         # generate records of completed chunks
+         for iChunk in dictChunks.keys():
+            (nParts,dictParts) = dictChunks[iChunk]
+            if len(dictParts) < nParts:
+               continue
+            del dictChunks[iChunk]
+            lstRecords = []
+            for iPart in range(nParts):
+               lstRecords += dictParts[iPart]
+            if bOrdered:
+               dictDone[iChunk] = lstRecords
+            else:
+               for tplRecord in lstRecords:
+                  yield tplRecord
+         while dictDone.has_key(iChunkNext):
+            lstRecords = dictDone[iChunkNext]
+            del dictDone[iChunkNext]
+            iChunkNext += 1
+            for tplRecord in lstRecords:
+               yield tplRecord
+
+         if len(lstFinished) > 0 or len(dictTasks) == 0:
+            continue
+
+         # wait, or restart crashed or hanging worker(s)
+         if time.time() - tProgress < self.tTimeout:
+            dictTasks.values()[0][1].wait(0.05)
+            continue
+         self.restart()
+         tProgress = time.time()
+         # only the nWorkers tasks sent first can have been started,
+         # since the pool hands out tasks in the order they were sent;
+         # the others are sent again without counting a try
+         lstPending = map(lambda tplKey: (dictTasks[tplKey][3],tplKey),
+                          dictTasks.keys())
+         lstPending.sort()
+         for iPending in range(len(lstPending)):
+            tplKey = lstPending[iPending][1]
+            (lstChunk,oResult,nTries,iSubmitted) = dictTasks[tplKey]
+            del dictTasks[tplKey]
+            (iChunk,iPart) = tplKey
+            if iPending >= self.nWorkers: # not started
+               self.submit(dictTasks,tplKey,lstChunk,nTries)
+            elif nTries < self.nRetries:
+               self.submit(dictTasks,tplKey,lstChunk,nTries+1)
+            elif len(lstChunk) > 1:
+               # split chunk to isolate the notation(s) that fail
+               dictChunks[iChunk][0] = len(lstChunk)
+               for iPart in range(len(lstChunk)):
+                  self.submit(dictTasks,(iChunk,iPart),[lstChunk[iPart]],0)
+            else:
+               sMsg  = 'ParallelParser.parse: worker crashed or timed out'
+               sMsg += ' (%d tries)' % (nTries+1)
+               dictChunks[iChunk][1][iPart] = \
+                  [error_record(lstChunk[0],self.lstFields,sMsg)]
+
+   """------------------------------------------------------------------
+      submit: send chunk lstChunk to pool as task tplKey
+   """
+   def submit(self,dictTasks,tplKey,lstChunk,nTries):
+      oResult = self.oPool.apply_async(parse_chunk,(lstChunk,))
+      dictTasks[tplKey] = [lstChunk,oResult,nTries,self.nSubmitted]
+      self.nSubmitted += 1
+
+   """------------------------------------------------------------------
+      parse_cps_parts: parse parts of one composite concurrently, one
+                       task per part (see Notation.set_cps_parser)
+
+      arguments: lstTplParts, list of pairs (sType, sPart)
+                 sLevel, bLazyTopo, parsing options of the Notation
+                    object
+      return: list with one (sMfHill, lstCaa, lstErr) per part, or
+              None if a worker failed or did not finish within
+              self.tTimeout seconds (the parts are then to be parsed
+              in the calling process)
+   """
+   def parse_cps_parts(self,lstTplParts,sLevel,bLazyTopo):
+      if not self.is_parallel():
+         return None
+      self.start()
+      lstResults = []
+      for (sType,sPart) in lstTplParts:
+         lstResults.append(self.oPool.apply_async(parse_cps_part,
+                              ((sType,sPart,sLevel,bLazyTopo),)))
+      try:
+         return map(lambda oResult: oResult.get(self.tTimeout),
+                    lstResults)
+      except multiprocessing.TimeoutError:
+         self.restart()
+      except Exception:
+         pass
+      return None
+
+"""
+   parse_parallel: parse notations from iterNotations with a
+                   temporary ParallelParser (for arguments see
+   ParallelParser and ParallelParser.parse)
+   return: list of records
+"""
+def parse_parallel(iterNotations,nWorkers=None,lstFields=None,
+                   sLevel='full',bOrdered=1):
+   oParser = ParallelParser(nWorkers,None,lstFields,sLevel)
+   lstRecords = list(oParser.parse(iterNotations,bOrdered))
+   oParser.close()
+   return lstRecords
@@ -0,0 +1,113 @@
+"""
+   This file:     csm_pool.py
+   Last modified: October 18, 2026
+   Package:       CurlySMILES Version 1.0.1
+   Author:        Axel Drefahl
+   E-mail:        axeleratio@yahoo.com
+   Internet:      http://www.axeleratio.com/csm/proj/main.htm
+
+   Python module csm_pool implements a class for pools of parser
+   objects (Notation, AnnotatedSmiles, CurlyAnnotation,
+   MolecularFormula) that are recycled with their reset() method
+   instead of being made anew.
+
+   Copyright (C) 2010  Axel Drefahl
+
+   This file is part of the CurlySMILES package.
+
+   The CurlySMILES package is free software: you can redistribute it
+   and/or modify it under the terms of the GNU General Public License
+   as published by the Free Software Foundation, either version 3 of
+   the License, or (at your option) any later version.
+
+   The CurlySMILES package is distributed in the hope that it will be
+   useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+   of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with the CurlySMILES package.
+   If not, see <http://www.gnu.org/licenses/>.
+"""
+import csm_curlyann, csm_molform
+
+class ObjectPool:
+   """
+      ObjectPool: pool of recycled instances of class cClass, whose
+                  reset method takes the same arguments as its
+      constructor; at most nMaxFree released instances are kept
+
+      EXAMPLE: oPool = ObjectPool(csm_notation.Notation)
+               for sNotation in lstNotations:
+                  oNotation = oPool.acquire(oDataFace)
+                  oNotation.parse(sNotation)
+                  ...
+                  oPool.release(oNotation)
+
+      An instance must not be used after its release, nor anything
+      it has handed out (lists, arrays or objects), since all of it
+      is cleared for reuse.
+   """
+   def __init__(self,cClass,nMaxFree=16):
+      self.cClass   = cClass
+      self.nMaxFree = nMaxFree
+      self.lstFree  = [] # released instances, ready for reuse
+
+      # statistics
+      self.nMade    = 0 # instances made by acquire
+      self.nReused  = 0 # instances recycled by acquire
+      self.nDropped = 0 # released instances not kept (pool full)
+
+   """------------------------------------------------------------------
+      acquire: recycled instance, reset with tplArgs, or new instance
+               made with tplArgs, if none is available
+   """
+   def acquire(self,*tplArgs):
+      if len(self.lstFree) > 0:
+         oObj = self.lstFree.pop()
+         oObj.reset(*tplArgs)
+         self.nReused += 1
+         return oObj
+      self.nMade += 1
+      return self.cClass(*tplArgs)
+
+   """------------------------------------------------------------------
+      release: return oObj to the pool (kept for reuse unless the pool
+               is full)
+   """
+   def release(self,oObj):
+      if len(self.lstFree) < self.nMaxFree:
+         self.lstFree.append(oObj)
+      else:
+         self.nDropped += 1
+
+   """------------------------------------------------------------------
+      clear: drop all released instances
+   """
+   def clear(self):
+      del self.lstFree[:]
+
+   #===================================================================#
+   # MISCELLANEOUS REQUESTS                                            #
+   #===================================================================#
+   def numof_free(self):      return len(self.lstFree)
+   def numof_made(self):      return self.nMade
+   def numof_reused(self):    return self.nReused
+
+   """------------------------------------------------------------------
+      stats: dictionary with free, made, reused and dropped
+   """
+   def stats(self):
+      return {'free':    len(self.lstFree),
+              'made':    self.nMade,
+              'reused':  self.nReused,
+              'dropped': self.nDropped}
+
+"""
+   oCurlyPool, oMfPool: process-wide pools for the CurlyAnnotation and
+                        MolecularFormula objects made while parsing;
+   temporary objects are released right after use, those kept by an
+   AnnotatedSmiles object when it is reset
+"""
+oCurlyPool = ObjectPool(csm_curlyann.CurlyAnnotation,256)
+oMfPool    = ObjectPool(csm_molform.MolecularFormula,32)
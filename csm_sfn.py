@@ -27,7 +27,7 @@
    along with the CurlySMILES package.
    If not, see <http://www.gnu.org/licenses/>.
 """
-import csm_dataface, csm_molform
+import csm_dataface, csm_molform, csm_pool
 import re
 class StoichFormNotation:
     
@@ -129,6 +129,11 @@ class StoichFormNotation:
          else:
             pairGroup.append(sPart)
 
+      if len(self.lstAtoms) == 0 and len(self.lstGroups) == 0:
+         sMsg = "parse: no atomic symbols in '%s'" % self.sSfn
+         self.lstErrors.append(sMsg)
+         return self.lstErrors
+
       # derive molecular formula by combining atoms and groups 
       self.oMf = csm_molform.MolecularFormula(self.oDataFace)
       if len(self.lstAtoms) > 0:
@@ -138,7 +143,7 @@ class StoichFormNotation:
          for pair in self.lstGroups:
             sGroup = pair[0]
             iSubscript = pair[1]
-            oMfGroup = csm_molform.MolecularFormula(self.oDataFace,sGroup)
+            oMfGroup = csm_pool.oMfPool.acquire(self.oDataFace,sGroup)
             oMfGroup.evaluate()
             lstOfPairs = oMfGroup.lst_of_pairs()
             lstMulti = []
@@ -152,6 +157,7 @@ class StoichFormNotation:
                lstMulti = lstOfPairs
                
             self.oMf.add_lst_of_pairs(lstMulti,'0')
+            csm_pool.oMfPool.release(oMfGroup)
          
 
       return self.lstErrors
@@ -164,7 +170,7 @@ class StoichFormNotation:
    """
    def add_to_lst_atoms(self,sStr):
 
-      oMf = csm_molform.MolecularFormula(self.oDataFace,sStr)
+      oMf = csm_pool.oMfPool.acquire(self.oDataFace,sStr)
       oMf.evaluate()
       lstOfPairs = oMf.lst_of_pairs()
       lstErrors = oMf.msgs_err()
@@ -172,8 +178,10 @@ class StoichFormNotation:
          for sError in lstErrors:
             sMsg  = "add_to_lst_atoms: %s" % sError
             self.lstErrors.append(sMsg)
+         csm_pool.oMfPool.release(oMf)
          return       
       self.lstAtoms += lstOfPairs
+      csm_pool.oMfPool.release(oMf)
       #print self.lstAtoms
       #print 'groups:',self.lstGroups
 
@@ -222,4 +230,11 @@ class StoichFormNotation:
    def mf_dict_of_dict(self):
       return self.oMf.dict_of_dict()
 
+   """------------------------------------------------------------------
+      mf_object: MolecularFormula object of compacted formula
+      return: self.oMf (None before parsing)
+   """
+   def mf_object(self):
+      return self.oMf
+
 
@@ -36,7 +36,8 @@
 #
 # import sys
 # sys.path.append(sCsmPath)
-import csm_dataface, csm_notation 
+import os, time
+import csm_annsmi, csm_dataface, csm_notation, csm_parallel 
 
 def test_notations():
 
@@ -227,15 +228,19 @@ def test_notations():
       '[Ar]{@:ful=C60}':
          ['[Ar]{@:ful=C60}',1,'smi','Ar'],
       'C1CCCCC1{!r$conformation=skew-boat}':
-         ['C1CCCCC1{!r$conformation=skew-boat}',1,'smi','C6H12']
+         ['C1CCCCC1{!r$conformation=skew-boat}',1,'smi','C6H12'],
+      'O':
+         ['O',1,'smi','H2O'],
+      'N':
+         ['N',1,'smi','H3N']
    }
    return dictNotations
 
 def evaluate(sNotation,lstExpected): 
 
-   oDataFace = csm_dataface.DataFace()
+   oDataFace = csm_dataface.get_shared()
    # if sCsmPath was appended above, then replace previous line with:
-   # oDataFace = csm_dataface.DataFace(sCsmPath)
+   # oDataFace = csm_dataface.get_shared(sCsmPath)
 
    sWorkNotationExpected    = lstExpected[0]
    nComponentsExpected      = lstExpected[1]
@@ -282,7 +287,340 @@ def evaluate(sNotation,lstExpected):
 
    return cntDiff
 
+"""
+   test_notations_with_errors: notations that have to be rejected with
+                               the given error messages (and must not
+                               raise an exception)
+"""
+def test_notations_with_errors():
+   dictNotations = {
+      '{/{*{$*x}Ag}/{*SiO2}}':
+         ["Notation.parse: 1. composite part < parse: no atomic " +
+          "symbols in '{$*x'"],
+      '{/N{-}=P{+{12}n}(OCCOCCOC)(OCCOCCOC)/{*Zr{NTf2(1-)}O2}}':
+         ['Notation.parse: 1. composite part < AnnotatedSmiles.parse: ' +
+          'oCurly.split_at_top_level: unbalanced curly entry: "12}n"',
+          "Notation.parse: 1. composite part < AnnotatedSmiles.parse: " +
+          "oCurly.parse: unknown descriptor or marker: '+{'",
+          "Notation.parse: 1. composite part < AnnotatedSmiles.parse: " +
+          "unknown descriptor/annotation marker '+{'"],
+      '.C':
+         ['evaluate_composite_type: 1.component notation has zero length'],
+      'C..C':
+         ['evaluate_composite_type: 2.component notation has zero length'],
+      '.{*TiO2}':
+         ['evaluate_composite_type: 1.component notation has zero length'],
+      '{*TiO2}.{*x}':
+         ['make_work_notation: missing "}" in sfn {*x} (1. subnotation)']
+   }
+   return dictNotations
+
+def evaluate_errors(sNotation,lstExpected):
+
+   oNotation = csm_notation.Notation(csm_dataface.get_shared())
+   lstErrors = oNotation.parse(sNotation)
+   if lstErrors != lstExpected:
+      print 'Error messages differ for %s' % sNotation
+      print '  found:    %s' % lstErrors
+      print '  expected: %s' % lstExpected
+      return 1
+   return 0
+
+"""
+   test_distance_matrices: SMILES notations of one component with the
+                           expected distance matrix (serialized upper
+                           triangle, see dmat_compnt)
+"""
+def test_distance_matrices():
+   dictNotations = {
+      'C1CC(CC(C1)C)C':
+         [1,2,3,2,1,3,3,1,2,3,2,4,2,1,2,3,3,1,1,2,2,2,1,1,3,2,4,4],
+      'N1CCN(CC1)C':
+         [1,2,3,2,1,4,1,2,3,2,3,1,2,3,2,1,2,1,1,2,3]
+   }
+   return dictNotations
+
+def evaluate_dmat(sNotation,lstExpected):
+
+   oNotation = csm_notation.Notation(csm_dataface.get_shared())
+   oNotation.parse(sNotation)
+   lstFound = list(oNotation.dmat_compnt(1))
+   if lstFound != lstExpected:
+      print 'Distance matrices differ for %s' % sNotation
+      print '  found:    %s' % lstFound
+      print '  expected: %s' % lstExpected
+      return 1
+   return 0
+
+"""
+   test_rings: SMILES notations of one component with the expected
+               smallest set of smallest rings (see rings_compnt)
+"""
+def test_rings():
+   dictNotations = {
+      'c1cc2ccc3cccc4ccc(c1)c2c34': # pyrene
+         [[0,1,2,14,12,13],[2,3,4,5,15,14],[5,6,7,8,9,15],
+          [9,10,11,12,14,15]],
+      'c1ccc2ccccc2c1':
+         [[0,1,2,3,8,9],[3,4,5,6,7,8]],
+      'C1CCC2(CC1)CCCC2':
+         [[0,1,2,3,4,5],[3,6,7,8,9]]
+   }
+   return dictNotations
 
+def evaluate_rings(sNotation,lstExpected):
+
+   oNotation = csm_notation.Notation(csm_dataface.get_shared())
+   oNotation.parse(sNotation)
+   lstFound = oNotation.rings_compnt(1)
+   if lstFound != lstExpected:
+      print 'Rings differ for %s' % sNotation
+      print '  found:    %s' % lstFound
+      print '  expected: %s' % lstExpected
+      return 1
+   return 0
+
+"""
+   test_composite_parts: composites with the expected molecular formula
+                         and annotations of each part
+                         [(sMfHill,lstCaa),...]
+"""
+def test_composite_parts():
+   dictNotations = {
+      '{/N{-}=P{+n}(OCCOCCOC)(OCCOCCOC)/{*ZrO2}}':
+         [('C10H22NO6P',[]),('O2Zr',None)],
+      '{/[Ag]/{*SiO2}}':
+         [('Ag',[]),('O2Si',None)],
+      '{/{*Ag}/{*SiO2}}':
+         [('Ag',None),('O2Si',None)],
+      '{/[Ag]/{*SiO2}}{cr}':
+         [('Ag',[]),('O2Si',None)],
+      '{/[Ag]{np}/{*SiO2}{am}{ma}}{cr}':
+         [('Ag',[['np',{}]]),('O2Si',[['ma',{}],['am',{}]])]
+   }
+   return dictNotations
+
+def evaluate_cps_parts(sNotation,lstExpected):
+
+   oNotation = csm_notation.Notation(csm_dataface.get_shared())
+   lstErrors = oNotation.parse(sNotation)
+   lstFound = []
+   for iuPart in range(1,oNotation.numof_composite_parts()+1):
+      lstFound.append((oNotation.mf_cps_part(iuPart),
+                       oNotation.caa_entries_cps_part(iuPart)))
+   if len(lstErrors) > 0 or lstFound != lstExpected:
+      print 'Composite parts differ for %s' % sNotation
+      print '  found:    %s %s' % (lstFound,lstErrors)
+      print '  expected: %s' % lstExpected
+      return 1
+   return 0
+
+"""
+   lstLevelFields: Notation requests that have to give the same results
+                   at analysis levels 'full' and 'formula' (per
+   component, if ending in _compnt)
+"""
+lstLevelFields = ['msgs_err','work_notation','type_components',
+                  'mf_total','mf_compnt','caa_entries_compnt',
+                  'atoms_symb_compnt','atoms_label_compnt',
+                  'atoms_charge_compnt','atoms_hcount_compnt',
+                  'atoms_numb_compnt','numof_atoms_compnt']
+
+"""
+   level_results: results of the requests in lstLevelFields after
+                  parsing sNotation at level sLevel
+"""
+def level_results(sNotation,sLevel):
+   oNotation = csm_notation.Notation(csm_dataface.get_shared())
+   oNotation.parse(sNotation,sLevel)
+   lstResults = []
+   for sField in lstLevelFields:
+      fnRequest = getattr(oNotation,sField)
+      if sField[-7:] != '_compnt':
+         lstResults.append((sField,list_or_value(fnRequest())))
+         continue
+      for iuCompnt in range(1,oNotation.numof_components()+1):
+         lstResults.append(('%s(%d)' % (sField,iuCompnt),
+                            list_or_value(fnRequest(iuCompnt))))
+   return lstResults
+
+def list_or_value(value):
+   if value == None or isinstance(value,(str,int)):
+      return value
+   return list(value)
+
+def evaluate_formula_level(sNotation):
+   lstFull = level_results(sNotation,'full')
+   lstFormula = level_results(sNotation,'formula')
+   cntDiff = 0
+   for i in range(len(lstFull)):
+      if lstFull[i] != lstFormula[i]:
+         print "Level 'formula' differs for %s" % sNotation
+         print '  found:    %s = %s' % lstFormula[i]
+         print '  expected: %s = %s' % lstFull[i]
+         cntDiff += 1
+   return cntDiff
+
+"""
+   evaluate_parse_many: parse lstNotations with Notation.parse_many
+                        (one Notation object) and compare the records,
+   all collected first, with the results of Notation.parse
+   return: number of notations with differing records
+"""
+def evaluate_parse_many(lstNotations):
+   lstFields = ['notation','work_notation','numof_components',
+                'type_components','mf_total','msgs_err']
+   oNotation = csm_notation.Notation(csm_dataface.get_shared())
+   lstRecords = list(oNotation.parse_many(lstNotations,lstFields))
+   cntDiff = 0
+   for i in range(len(lstNotations)):
+      oNotation = csm_notation.Notation(csm_dataface.get_shared())
+      lstErrors = oNotation.parse(lstNotations[i])
+      sMfTotal = None
+      if len(lstErrors) == 0:
+         sMfTotal = oNotation.mf_total()
+      tplExpected = (oNotation.user_notation(),oNotation.work_notation(),
+                     oNotation.numof_components(),
+                     list_or_value(oNotation.type_components()),
+                     sMfTotal,list(lstErrors))
+      tplFound = tuple(map(list_or_value,lstRecords[i]))
+      if tplFound != tplExpected:
+         print 'parse_many record differs for %s' % lstNotations[i]
+         print '  found:    %s' % (tplFound,)
+         print '  expected: %s' % (tplExpected,)
+         cntDiff += 1
+   return cntDiff
+
+"""
+   square_matrix: rows of a TriangularMatrix or of a dense numpy array
+                  as lists of ints, for comparison
+"""
+def square_matrix(mat):
+   if hasattr(mat,'shape'):
+      return map(lambda lstRow: map(int,lstRow), mat.tolist())
+   lstRows = []
+   for i in range(mat.nOrder):
+      lstRows.append(map(lambda j: mat.get(i,j), range(mat.nOrder)))
+   return lstRows
+
+"""
+   backend_matrices: adjacency and distance matrices of the SMILES
+                     components of sNotation parsed with matrix
+   backend sBackend, and the parsed AnnotatedSmiles objects
+   return: ([(lstAdj,lstDist),...],[oSmi,...])
+"""
+def backend_matrices(sNotation,sBackend):
+   csm_annsmi.set_matrix_backend(sBackend)
+   oNotation = csm_notation.Notation(csm_dataface.get_shared())
+   oNotation.parse(sNotation)
+   lstMatrices = []
+   lstObjSmi = []
+   for oSmi in oNotation.lstObjSmi:
+      if oSmi != None:
+         lstMatrices.append((square_matrix(oSmi.adj_matrix()),
+                             square_matrix(oSmi.dmat())))
+         lstObjSmi.append(oSmi)
+   return (lstMatrices,lstObjSmi)
+
+"""
+   evaluate_numpy_backend: compare adj_matrix() and dmat() with numpy
+                           backend, and the matrices of batch_matrices
+   (components of all notations in chunks of nChunk, so that each
+   chunk stacks components of mixed size), with the matrices of the
+   array backend (skipped if NumPy is not installed)
+   return: number of notations with differing matrices
+"""
+def evaluate_numpy_backend(lstNotations,nChunk=16):
+   if csm_annsmi.numpy == None:
+      print 'numpy backend: skipped (NumPy not installed)'
+      return 0
+   cntDiff = 0
+   lstExpected = []
+   lstBatch = []
+   try:
+      for sNotation in lstNotations:
+         (lstArray,lstObjSmi) = backend_matrices(sNotation,'array')
+         (lstNumpy,lstObjSmi) = backend_matrices(sNotation,'numpy')
+         if lstNumpy != lstArray:
+            print 'numpy backend matrices differ for %s' % sNotation
+            cntDiff += 1
+         for i in range(len(lstObjSmi)):
+            lstExpected.append((sNotation,lstArray[i]))
+            lstBatch.append(lstObjSmi[i])
+      lstMatrices = csm_annsmi.batch_matrices(lstBatch,nChunk)
+   finally:
+      csm_annsmi.set_matrix_backend('array')
+
+   dictDiff = {}
+   for i in range(len(lstBatch)):
+      (matAdj,matDist) = lstMatrices[i]
+      if matAdj is None: # no complete molecular graph
+         continue
+      (sNotation,tplMatrices) = lstExpected[i]
+      if (square_matrix(matAdj),square_matrix(matDist)) != tplMatrices:
+         if not dictDiff.has_key(sNotation):
+            print 'batch_matrices differ for %s' % sNotation
+         dictDiff[sNotation] = 1
+   return cntDiff + len(dictDiff)
+
+"""
+   failing_parse_notations: csm_parallel.parse_notations, except that
+                            the worker process exits on notation
+   'BOOM' and hangs on notation 'HANG' (installed before the pool is
+   started, see evaluate_parallel_failures)
+"""
+fnParseNotations = csm_parallel.parse_notations
+def failing_parse_notations(oNotation,lstNotations,lstFields,sLevel):
+   for sNotation in lstNotations:
+      if sNotation == 'BOOM':
+         os._exit(1)
+      elif sNotation == 'HANG':
+         time.sleep(3600)
+   return fnParseNotations(oNotation,lstNotations,lstFields,sLevel)
+
+"""
+   evaluate_parallel_failures: parse lstNotations, with crashing and
+                               hanging notations in every chunk, with
+   a ParallelParser restarting its pool after tTimeout seconds, and
+   compare the records with those of the calling process (an error
+   record for each crashing or hanging notation)
+   return: number of differing records
+"""
+def evaluate_parallel_failures(lstNotations,tTimeout=1.0):
+   if not csm_parallel.ParallelParser(2).is_parallel():
+      print 'parallel failures: skipped (multiprocessing not available)'
+      return 0
+   lstFields = ['notation','work_notation','mf_total','msgs_err']
+   oSerial = csm_parallel.ParallelParser(0,None,lstFields)
+   sMsg = 'ParallelParser.parse: worker crashed or timed out (2 tries)'
+   lstExpected = []
+   for sNotation in lstNotations:
+      if sNotation in ['BOOM','HANG']:
+         lstExpected.append(
+            csm_parallel.error_record(sNotation,lstFields,sMsg))
+      else:
+         lstExpected += list(oSerial.parse([sNotation]))
+
+   csm_parallel.parse_notations = failing_parse_notations
+   try:
+      oParser = csm_parallel.ParallelParser(2,None,lstFields,
+                   nChunkMax=6,tTimeout=tTimeout,nRetries=1)
+      lstFound = list(oParser.parse(lstNotations))
+      oParser.close()
+   finally:
+      csm_parallel.parse_notations = fnParseNotations
+
+   cntDiff = abs(len(lstFound) - len(lstExpected))
+   for i in range(min(len(lstFound),len(lstExpected))):
+      if lstFound[i] != lstExpected[i]:
+         print 'Parallel record differs for %s' % lstExpected[i][0]
+         print '  found:    %s' % (lstFound[i],)
+         print '  expected: %s' % (lstExpected[i],)
+         cntDiff += 1
+   if len(lstFound) != len(lstExpected):
+      print 'Parallel records: %d found, %d expected' % \
+            (len(lstFound),len(lstExpected))
+   return cntDiff
 
 if __name__ == '__main__':
 
@@ -298,6 +636,52 @@ if __name__ == '__main__':
       if cntDiff > 0:
             totalDiff += 1
 
+   dictNotations = test_notations_with_errors()
+   for sNotation in dictNotations.keys():
+      cntNotations += 1
+      if evaluate_errors(sNotation,dictNotations[sNotation]) > 0:
+         totalDiff += 1
+
+   dictNotations = test_distance_matrices()
+   for sNotation in dictNotations.keys():
+      cntNotations += 1
+      if evaluate_dmat(sNotation,dictNotations[sNotation]) > 0:
+         totalDiff += 1
+
+   dictNotations = test_rings()
+   for sNotation in dictNotations.keys():
+      cntNotations += 1
+      if evaluate_rings(sNotation,dictNotations[sNotation]) > 0:
+         totalDiff += 1
+
+   dictNotations = test_composite_parts()
+   for sNotation in dictNotations.keys():
+      cntNotations += 1
+      if evaluate_cps_parts(sNotation,dictNotations[sNotation]) > 0:
+         totalDiff += 1
+
+   # parse at level 'formula', compare with level 'full'
+   for sNotation in test_notations().keys():
+      cntNotations += 1
+      if evaluate_formula_level(sNotation) > 0:
+         totalDiff += 1
+
+   # parse all with Notation.parse_many, compare with Notation.parse
+   lstNotations = test_notations().keys() + \
+                  test_notations_with_errors().keys()
+   cntNotations += len(lstNotations)
+   totalDiff += evaluate_parse_many(lstNotations)
+
+   # numpy backend and batch_matrices, compare with array backend
+   if csm_annsmi.numpy != None:
+      cntNotations += len(test_notations())
+   totalDiff += evaluate_numpy_backend(test_notations().keys())
+
+   # ParallelParser with crashing and hanging worker processes
+   for lstNotations in [['BOOM'],['CCO','O{6}','BOOM','CC','HANG','N']*3]:
+      cntNotations += len(lstNotations)
+      totalDiff += evaluate_parallel_failures(lstNotations)
+
    print 'Number of tested notations: %d' % cntNotations 
    print 'Number of notations with found-vs-expected differences: %d'\
          % totalDiff